@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+"""
+Compare the in-memory and aggregation pipeline joins used when baking
+results.
+
+Each join is run in a separate process so peak memory use can be compared.
+Rows are iterated through, but not written.
+
+Usage:
+
+    python benchmarks/bake_join.py STATE [DATEFILTER] [REPORTING_LEVEL]
+
+For example:
+
+    python benchmarks/bake_join.py md 2012 precinct
+
+"""
+from multiprocessing import Pool
+import resource
+import sys
+import time
+
+from openelex.base.bake import JOIN_CHOICES, ResultRoller
+from openelex.db import init_db
+
+
+def run(args):
+    join, filter_kwargs = args
+    init_db()
+    roller = ResultRoller(join=join)
+    start = time.time()
+    num_rows = 0
+    for row in roller.iter_items(**filter_kwargs):
+        num_rows += 1
+    elapsed = time.time() - start
+    # ru_maxrss is in kilobytes on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return join, num_rows, elapsed, max_rss
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit(__doc__)
+
+    filter_kwargs = {'state': argv[1]}
+    if len(argv) > 2:
+        filter_kwargs['datefilter'] = argv[2]
+    if len(argv) > 3:
+        filter_kwargs['reporting_level'] = argv[3]
+
+    print("%-10s %10s %10s %12s %12s" % ("join", "rows", "seconds",
+        "rows/second", "max RSS (KB)"))
+    for join in JOIN_CHOICES:
+        # Use a fresh process for each run so memory use isn't shared.
+        pool = Pool(1)
+        join, num_rows, elapsed, max_rss = pool.apply(run,
+            ((join, filter_kwargs),))
+        pool.close()
+        pool.join()
+        print("%-10s %10d %10.2f %12.0f %12d" % (join, num_rows, elapsed,
+            num_rows / elapsed if elapsed else 0, max_rss))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Compare the per-row cost of flattening results into dictionaries and
+writing them with a DictWriter with building rows from a precompiled
+RowPlan and writing them with a csv writer.
+
+Synthetic documents are used, so this doesn't need a database.
+
+Usage:
+
+    python benchmarks/bake_rows.py [NUM_ROWS]
+
+NUM_ROWS defaults to 1000000.
+
+"""
+import csv
+from datetime import datetime
+import os
+import sys
+import time
+
+from bson import ObjectId
+from ordered_set import OrderedSet
+from unicodecsv import DictWriter
+
+from openelex.base.bake import ResultRoller, encode_row
+
+
+def make_docs(num_rows):
+    """
+    Returns a list of result documents and a map of related documents,
+    shaped like the ones returned by pymongo.
+    """
+    now = datetime.now()
+    related_map = {'contest': {}, 'candidate': {}}
+    results = []
+    for i in range(100):
+        contest_id = ObjectId()
+        candidate_id = ObjectId()
+        related_map['contest'][str(contest_id)] = {
+            '_id': contest_id,
+            'state': u'MD',
+            'start_date': now,
+            'end_date': now,
+            'election_type': u'general',
+            'result_type': u'certified',
+            'special': False,
+            'office': ObjectId(),
+            'created': now,
+            'updated': now,
+        }
+        related_map['candidate'][str(candidate_id)] = {
+            '_id': candidate_id,
+            'state': u'MD',
+            'full_name': u'Candidate %d' % i,
+            'given_name': u'Candidate',
+            'family_name': unicode(i),
+            'created': now,
+            'updated': now,
+        }
+        for j in range(num_rows // 100):
+            results.append({
+                '_id': ObjectId(),
+                'election_id': u'md-2012-11-06-general',
+                'state': u'MD',
+                'contest': contest_id,
+                'candidate': candidate_id,
+                'reporting_level': u'precinct',
+                'jurisdiction': u'Precinct %d' % j,
+                'ocd_id': u'ocd-division/country:us/state:md/precinct:%d' % j,
+                'party': u'DEM',
+                'votes': j,
+                'total_votes': j,
+                'winner': False,
+                'write_in': False,
+                'created': now,
+                'updated': now,
+            })
+    return results, related_map
+
+
+def bench_dicts(roller, fields, results, related_map, f):
+    roller._fields = OrderedSet(fields)
+    writer = DictWriter(f, fields)
+    writer.writeheader()
+    for primary in results:
+        related = {}
+        for fname in roller._relationships:
+            related[fname] = related_map[fname][str(primary[fname])].copy()
+        flat = roller.flatten(primary.copy(), **related)
+        roller._fields |= flat.keys()
+        writer.writerow(flat)
+
+
+def bench_rows(roller, fields, results, related_map, f):
+    plan = roller.compile_row_plan(fields)
+    relationship_fields = [fname for fname, coll in plan.relationships]
+    writer = csv.writer(f)
+    writer.writerow(encode_row(fields))
+    writer.writerows(encode_row(plan.row(primary,
+                         [related_map[fname][str(primary[fname])]
+                          for fname in relationship_fields]))
+                     for primary in results)
+
+
+def main(num_rows):
+    results, related_map = make_docs(num_rows)
+    roller = ResultRoller()
+    fields = list(OrderedSet(roller.get_fields()))
+    with open(os.devnull, 'w') as f:
+        for name, fn in (('dicts', bench_dicts), ('rows', bench_rows)):
+            start = time.time()
+            fn(roller, fields, results, related_map, f)
+            elapsed = time.time() - start
+            print("%s: %d rows in %.2f seconds, %.2f microseconds/row" % (
+                name, len(results), elapsed, elapsed / len(results) * 1e6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        num_rows = int(sys.argv[1])
+    else:
+        num_rows = 1000000
+    main(num_rows)
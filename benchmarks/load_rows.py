@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Compare the per-row cost of building raw results for a Maryland county
+results file when the election metadata is looked up for every row with
+the cost when it's read from the file's LoadContext.
+
+Synthetic rows and election metadata are used, so this doesn't need a
+database or the OpenElex API.
+
+Usage:
+
+    python benchmarks/load_rows.py [NUM_ROWS]
+
+NUM_ROWS defaults to 100000.
+
+"""
+from datetime import datetime
+import sys
+import time
+
+from openelex.base.load import LoadContext
+from openelex.models import RawResult
+from openelex.us.md.load import MDLoader
+
+ELECTION_ID = 'md-2012-11-06-general'
+
+
+class FakeDatasource(object):
+    """Returns a year's worth of election metadata without the API"""
+
+    def __init__(self):
+        self._elections = {2012: []}
+        for i in range(1, 29):
+            self._elections[2012].append({
+                'slug': 'md-2012-02-%02d-special-general' % i,
+                'start_date': '2012-02-%02d' % i,
+                'end_date': '2012-02-%02d' % i,
+                'race_type': 'general',
+                'primary_type': '',
+                'result_type': 'certified',
+                'special': True,
+            })
+        self._elections[2012].append({
+            'slug': ELECTION_ID,
+            'start_date': '2012-11-06',
+            'end_date': '2012-11-06',
+            'race_type': 'general',
+            'primary_type': '',
+            'result_type': 'certified',
+            'special': False,
+        })
+
+    def elections(self, year=None):
+        return {year: self._elections[year]}
+
+
+def make_rows(num_rows):
+    return [{
+        'Office Name': u'President - Vice Pres',
+        'Office District': u'',
+        'Candidate Name': u'Candidate %d' % (i % 10),
+        'Party': u'DEM',
+        'Winner': u'',
+        'Total Votes': unicode(i),
+    } for i in range(num_rows)]
+
+
+def main(num_rows):
+    loader = MDLoader()
+    loader.datasource = FakeDatasource()
+    mapping = {
+        'generated_filename': '20121106__md__general__allegany.csv',
+        'election': ELECTION_ID,
+        'name': u'Allegany',
+    }
+    loader.mapping = mapping
+    loader.source = mapping['generated_filename']
+    loader.election_id = ELECTION_ID
+    loader.timestamp = datetime.now()
+    loader.context = LoadContext(mapping, loader.state, loader.timestamp,
+        loader._build_election_metadata())
+    rows = make_rows(num_rows)
+
+    def per_row_lookup(row):
+        # What the loaders did before the LoadContext
+        context = LoadContext(mapping, loader.state, loader.timestamp,
+            loader._build_election_metadata())
+        return context.result_kwargs()
+
+    def context_copy(row):
+        return loader.context.result_kwargs()
+
+    def prep_result(row):
+        return RawResult.build_son(loader._prep_county_result(row))
+
+    for name, fn in (('metadata lookup per row', per_row_lookup),
+                     ('load context', context_copy),
+                     ('county result SON', prep_result)):
+        start = time.time()
+        for row in rows:
+            fn(row)
+        elapsed = time.time() - start
+        print("%s: %d rows in %.2f seconds, %.2f microseconds/row" % (
+            name, len(rows), elapsed, elapsed / len(rows) * 1e6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        num_rows = int(sys.argv[1])
+    else:
+        num_rows = 100000
+    main(num_rows)
@@ -1,8 +1,12 @@
 from bson import json_util
-from unicodecsv import DictWriter
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import csv
+import hashlib
 import json
 import os
+import re
+import time
 
 from ordered_set import OrderedSet
 
@@ -12,7 +16,8 @@ from mongoengine.fields import ReferenceField
 from openelex import COUNTRY_DIR
 from openelex.exceptions import UnsupportedFormatError
 from openelex.lib import standardized_filename
-from openelex.models import RawResult, Result, Contest, Candidate
+from openelex.lib.aggregate import iter_aggregate
+from openelex.models import Election, RawResult, Result, Contest, Candidate
 
 
 class FieldTransform(object):
@@ -57,6 +62,62 @@ class CalculatedField(object):
         return self.fn(data)
 
 
+def encode_row(row, encoding='utf-8'):
+    """
+    Returns a list of a row's values with unicode strings encoded so the row
+    can be written by a ``csv.writer``.
+
+    This does the same thing as the writers in unicodecsv, but only checks
+    the type of each value once.  The csv module writes other values with
+    ``str()``, and ``None`` as an empty string.
+    """
+    return [v.encode(encoding) if v.__class__ is unicode else v for v in row]
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def json_default(obj):
+    """
+    Convert objects that the json module can't serialize.
+
+    Datetimes are converted to the same ``{"$date": milliseconds}``
+    representation as ``bson.json_util.default()``, but without first
+    checking for the other BSON types.  Datetimes are the only values in
+    most results that aren't plain JSON, so this is called for one or more
+    fields of every row.  Other values are passed on to
+    ``json_util.default()``.
+    """
+    if obj.__class__ is datetime:
+        if obj.tzinfo is not None and obj.utcoffset() is not None:
+            obj = (obj - obj.utcoffset()).replace(tzinfo=None)
+        delta = obj - EPOCH
+        return {"$date": (delta.days * 86400000 + delta.seconds * 1000 +
+                          delta.microseconds // 1000)}
+
+    return json_util.default(obj)
+
+
+def prefix_query(query, prefix):
+    """
+    Returns a copy of a MongoDB query with its field names nested under
+    ``prefix``, for example to match fields of an embedded or joined
+    document.
+    """
+    prefixed = {}
+    for key, value in query.items():
+        if key in ('$and', '$or', '$nor'):
+            prefixed[key] = [prefix_query(q, prefix) for q in value]
+        else:
+            prefixed['%s.%s' % (prefix, key)] = value
+    return prefixed
+
+
+JOIN_MEMORY = 'memory'
+JOIN_AGGREGATE = 'aggregate'
+JOIN_CHOICES = (JOIN_MEMORY, JOIN_AGGREGATE)
+
+
 class RollerMeta(type):
     """
     Metaclass for Roller that allows defining field name transformations
@@ -67,6 +128,8 @@ class RollerMeta(type):
         field_calculators = {}
         transformed_fields_ordered = []
         calculated_fields_ordered = []
+        renamed_fields = {}
+        flattened_fields = {}
 
         for k, v in attrs.items():
             if isinstance(v, FieldTransform):
@@ -75,10 +138,15 @@ class RollerMeta(type):
                 # HACK Exclude flattened fields from the list of output fields.
                 # The flattened fields' contents will get added, but the
                 # original field shouldn't show up in the output.
-                if not isinstance(v, FlattenFieldTransform):
+                if isinstance(v, FlattenFieldTransform):
+                    flattened_fields.setdefault(v.collection, []).append(
+                        v.db_field)
+                else:
                     if not v.output_name:
                         v.output_name = k
                     transformed_fields_ordered.append(v.output_name)
+                    renamed_fields.setdefault(v.collection, {})[v.db_field] = \
+                        v.output_name
                 
             elif isinstance(v, CalculatedField):
                 field_calculators[k] = v.apply
@@ -88,10 +156,186 @@ class RollerMeta(type):
         attrs['field_calculators'] = field_calculators
         attrs['transformed_fields_ordered'] = transformed_fields_ordered
         attrs['calculated_fields_ordered'] = calculated_fields_ordered
+        # Precompiled versions of the transforms used to build a RowPlan.
+        # These map collection names to a dictionary of renamed database
+        # field names to output names and to a list of flattened database
+        # field names.
+        attrs['renamed_fields'] = renamed_fields
+        attrs['flattened_fields'] = flattened_fields
 
         return super(RollerMeta, cls).__new__(cls, name, bases, attrs)
 
 
+_MISSING = object()
+
+
+class RowPlan(object):
+    """
+    Precompiled plan for flattening a primary document and its related
+    documents into a tuple of output values.
+
+    ``Roller.flatten()`` builds a new dictionary for each row, applying each
+    transform in turn.  A plan works out, once, where each output field's
+    value comes from, so a row can be read directly from the raw pymongo
+    documents without copying or modifying them.  The values have the same
+    precedence as in ``flatten()``: calculated fields, then fields from the
+    primary document, including renamed and flattened fields, then fields
+    from related documents.
+    """
+    def __init__(self, roller, fields):
+        """
+        Args:
+            roller: Roller instance whose transforms and calculated fields
+                should be applied.
+            fields: Sequence of output field names, in the order the values
+                should be returned.
+
+        """
+        self.fields = tuple(fields)
+        self.relationships = list(roller._relationships.items())
+        primary_name = roller.primary_collection_name
+        self._primary_renames = roller.renamed_fields.get(primary_name, {})
+        self._primary_flattened = roller.flattened_fields.get(primary_name, [])
+        self._related_renames = [roller.renamed_fields.get(coll, {})
+                                 for fname, coll in self.relationships]
+        self._sources = {}
+        self._field_sources = []
+        self._calculators = []
+        for i, name in enumerate(self.fields):
+            try:
+                self._calculators.append((i, roller.field_calculators[name]))
+                self._field_sources.append(())
+            except KeyError:
+                self._field_sources.append(self.sources(name))
+
+    def sources(self, name):
+        """
+        Returns where the value for an output field can be found.
+
+        Returns:
+            A tuple of ``(slot, key, always)`` tuples, in order of precedence.
+            ``slot`` is the index of a document in the list built by
+            ``docs()`` and ``key`` is the key of the value in that document.
+            If ``always`` is True, the value is ``None`` when the key is
+            missing, rather than falling through to the next source.  This
+            matches the behavior of ``FieldNameTransform``.
+
+        """
+        try:
+            return self._sources[name]
+        except KeyError:
+            pass
+
+        sources = []
+        relationship_fields = set(fname for fname, coll in self.relationships)
+        for db_field, output_name in self._primary_renames.items():
+            if output_name == name:
+                sources.append((0, db_field, True))
+        for i, db_field in enumerate(self._primary_flattened):
+            sources.append((i + 1, name, False))
+        if (name != '_id' and name not in self._primary_renames and
+                name not in relationship_fields and
+                name not in self._primary_flattened):
+            sources.append((0, name, False))
+
+        # Fields from related documents that are merged later take
+        # precedence, so check them in reverse order.
+        first_related_slot = len(self._primary_flattened) + 1
+        for i in reversed(range(len(self.relationships))):
+            slot = first_related_slot + i
+            renames = self._related_renames[i]
+            for db_field, output_name in renames.items():
+                if output_name == name:
+                    sources.append((slot, db_field, True))
+            if name != '_id' and name not in renames:
+                sources.append((slot, name, False))
+
+        self._sources[name] = tuple(sources)
+        return self._sources[name]
+
+    def docs(self, primary, related):
+        """
+        Returns the list of documents that the values for a row are read from.
+
+        Args:
+            primary (dict): Raw document from the primary collection.
+            related (list): Raw related documents, in the same order as
+                ``relationships``.
+
+        """
+        docs = [primary]
+        for db_field in self._primary_flattened:
+            val = primary.get(db_field)
+            docs.append(val if isinstance(val, dict) else {})
+        docs.extend(related)
+        return docs
+
+    def lookup(self, docs, name, default=None):
+        """
+        Returns the value of an output field from a list of documents built
+        by ``docs()``.
+        """
+        for slot, key, always in self.sources(name):
+            doc = docs[slot]
+            if always:
+                return doc.get(key)
+            if key in doc:
+                return doc[key]
+        return default
+
+    def row(self, primary, related):
+        """
+        Returns a tuple of the output values for a primary document and its
+        related documents, ordered like ``fields``.
+        """
+        docs = self.docs(primary, related)
+        values = []
+        append = values.append
+        for sources in self._field_sources:
+            for slot, key, always in sources:
+                doc = docs[slot]
+                if always:
+                    append(doc.get(key))
+                    break
+                if key in doc:
+                    append(doc[key])
+                    break
+            else:
+                append(None)
+
+        if self._calculators:
+            view = _RowView(self, docs)
+            for i, fn in self._calculators:
+                values[i] = fn(view)
+
+        return tuple(values)
+
+
+class _RowView(object):
+    """
+    Read-only mapping of output field names to the values for a row.
+
+    This is passed to calculated fields instead of a flattened dictionary.
+    """
+    __slots__ = ('plan', 'docs')
+
+    def __init__(self, plan, docs):
+        self.plan = plan
+        self.docs = docs
+
+    def __getitem__(self, name):
+        val = self.plan.lookup(self.docs, name, _MISSING)
+        if val is _MISSING:
+            raise KeyError(name)
+        return val
+
+    def __contains__(self, name):
+        return self.plan.lookup(self.docs, name, _MISSING) is not _MISSING
+
+    def get(self, name, default=None):
+        return self.plan.lookup(self.docs, name, default)
+
+
 class Roller(object):
     """
     Filters and collects related data from document fields into a 
@@ -110,21 +354,61 @@ class Roller(object):
     data field.
     """
 
-    def __init__(self):
+    batch_size = 1000
+    """
+    Number of primary documents to request from the data store at a time
+    when iterating through results with ``iter_items()``.
+    """
+
+    join = JOIN_MEMORY
+    """
+    How documents from the primary collection are joined with documents
+    from related collections.
+
+    With 'memory', all related documents matching the filters are
+    retrieved and the join is done in Python.  With 'aggregate', the join
+    and field projection are done by the data store using an aggregation
+    pipeline.  This requires MongoDB 3.2 or greater.  Only fields declared
+    on the document classes, and the contents of flattened fields, are
+    included in the output with 'aggregate'.
+    """
+
+    def __init__(self, join=None):
+        if join is not None:
+            if join not in JOIN_CHOICES:
+                raise ValueError("Invalid join '%s'" % join)
+            self.join = join
+
         self._querysets = {}
         self._relationships = {}
         self._output_fields = []
+        # Cumulative seconds spent reading documents from the data store
+        # and joining and flattening them into rows.
+        self.timings = {
+            'query': 0.0,
+            'flatten': 0.0,
+        }
+
+        for coll in self.collections:
+            self._contribute_fields(coll)
+
+        self._output_fields.extend(self.calculated_fields_ordered)
 
+    def _reset_querysets(self):
+        """
+        Set the querysets to the unfiltered querysets for each collection.
+
+        This is done lazily, rather than in the constructor, so rollers can be
+        created without a connection to the data store and so filters aren't
+        applied more than once when a roller is reused.
+        """
+        self._querysets = {}
         for coll in self.collections:
             name = coll._meta['collection']
             self._querysets[name] = getattr(coll, 'objects')
             if coll  == self.primary_collection:
                 self._primary_queryset = self._querysets[name]
 
-            self._contribute_fields(coll)
-
-        self._output_fields.extend(self.calculated_fields_ordered)
-
     def _is_relationship_field(self, field):
         return isinstance(field, ReferenceField)
 
@@ -197,21 +481,22 @@ class Roller(object):
         
         q_kwargs['state'] = filter_kwargs['state'].upper()
 
-        try:
-            q_kwargs['election_id__contains'] = filter_kwargs['election_type']
-        except KeyError:
-            pass
-
         common_q = Q(**q_kwargs)
 
-        # Merge in the date filters
-        try:
-            common_q &= self.build_date_filters(filter_kwargs['datefilter'])
-        except KeyError:
-            pass
+        if filter_kwargs.get('election_type'):
+            common_q &= self.build_election_type_filter(
+                filter_kwargs['election_type'], filter_kwargs['state'])
 
-        for collection_name in self._querysets.keys():
+        for coll in self.collections:
+            collection_name = coll._meta['collection']
             filters[collection_name] = common_q
+            # Merge in the date filters
+            try:
+                filters[collection_name] &= self.build_date_filters(
+                    filter_kwargs['datefilter'], state=filter_kwargs['state'],
+                    collection=coll)
+            except KeyError:
+                pass
             try:
                 fn = getattr(self, 'build_filters_' + collection_name)
                 collection_q = fn(**filter_kwargs) 
@@ -223,41 +508,110 @@ class Roller(object):
         return filters
 
     @classmethod
-    def build_date_filters(cls, datefilter):
+    def parse_datefilter(cls, datefilter):
+        """
+        Parse a date filter string.
+
+        Arguments:
+            datefilter (string): Date string in one of the formats in
+                ``datefilter_formats``.  Dashes are ignored, so
+                "2012-11-06" is the same as "20121106".
+
+        Returns:
+            A tuple of the first datetime matching the filter, the datetime
+            just after the last datetime matching the filter, and the
+            filter formatted as it would appear in an election ID.
+
+        Raises:
+            ValueError if the date string is not in a supported format.
+
+        """
+        datefilter = datefilter.replace('-', '')
+        for infmt, outfmt in cls.datefilter_formats.items():
+            try:
+                start = datetime.strptime(datefilter, infmt)
+            except ValueError:
+                continue
+
+            # strptime() is lenient about the number of digits, so, for
+            # example, "201211" parses as 2012-01-01 with "%Y%m%d".  Only
+            # accept a format that gives back the same string.
+            if start.strftime(infmt) != datefilter:
+                continue
+
+            if infmt.endswith('%d'):
+                end = start + timedelta(days=1)
+            elif infmt.endswith('%m'):
+                if start.month == 12:
+                    end = start.replace(year=start.year + 1, month=1)
+                else:
+                    end = start.replace(month=start.month + 1)
+            else:
+                end = start.replace(year=start.year + 1)
+
+            return start, end, start.strftime(outfmt)
+
+        raise ValueError("Invalid date format '%s'" % datefilter)
+
+    @classmethod
+    def build_date_filters(cls, datefilter, state=None, collection=None):
         """
         Create a query object of filters based on a date string.
 
+        The filters are built so they can use an index when possible.  If the
+        collection has a ``start_date`` field, the filter is a range of
+        start dates.  Otherwise, if the state is known, the filter matches
+        the beginning of the election ID, for example "md-2012-11".  As a
+        last resort, the date can appear anywhere in the election ID, which
+        requires scanning every document.
+
         Arguments:
             datefilter (string): String representation of date.
+            state (string): Postal code of the state the results are for.
+            collection: Document class whose documents will be filtered.
 
         Returns:
             Q object of filters based on date string.
 
         """
-        filters = {}
-
         if not datefilter:
             return Q() 
 
-        # Iterate through the map of supported date formats, try parsing the
-        # date filter, and convert it to a mapper filter
-        for infmt, outfmt in cls.datefilter_formats.items():
-            try:
-                # For now we filter on the date string in the election IDs
-                # under the assumption that this will be faster than filtering
-                # across a reference.
-                filters['election_id__contains'] = datetime.strptime(
-                    datefilter, infmt).strftime(outfmt)
-                break
-            except ValueError:
-                pass
-        else:
-            raise ValueError("Invalid date format '%s'" % datefilter)
-        
-        # Return a Q object rather than just a dict because the non-date
-        # filters might also filter with a ``election_id__contains`` keyword
-        # argument, clobbering the date filter, or vice-versa
-        return Q(**filters)
+        start, end, election_id_date = cls.parse_datefilter(datefilter)
+
+        if collection is not None and 'start_date' in collection._fields:
+            return Q(start_date__gte=start, start_date__lt=end)
+
+        if state:
+            return Q(election_id__startswith="%s-%s" % (state.lower(),
+                election_id_date))
+
+        # Return a Q object rather than just a dict because the election type
+        # filter also filters on ``election_id``, clobbering the date filter,
+        # or vice-versa
+        return Q(election_id__contains=election_id_date)
+
+    @classmethod
+    def build_election_type_filter(cls, election_type, state):
+        """
+        Create a query object that filters on the election type in the
+        election ID.
+
+        Besides containing the election type, the election ID has to start
+        with the state, for example "md-".  MongoDB uses the anchored prefix
+        to narrow an index scan on election_id, which the date filters narrow
+        further, instead of checking every election ID for the election type.
+
+        Arguments:
+            election_type (string): Election type, for example "general".
+            state (string): Postal code of the state the results are for.
+
+        Returns:
+            Q object that filters on election_id.
+
+        """
+        return (Q(election_id__startswith="%s-" % state.lower()) &
+                Q(election_id__contains=election_type))
 
     def build_filters_result(self, **filter_kwargs):
         try:
@@ -342,10 +696,12 @@ class Roller(object):
 
         return flat 
 
-    def get_list(self, **filter_kwargs):
+    def _prepare(self, **filter_kwargs):
         """
-        Returns a list of filtered, limited and flattened election results.
+        Filter and limit the querysets and reset the list of encountered
+        fields.
         """
+        self._reset_querysets()
         filters = self.build_filters(**filter_kwargs)
         fields = self.build_fields(**filter_kwargs)
         exclude_fields = self.build_exclude_fields(**filter_kwargs)
@@ -355,39 +711,415 @@ class Roller(object):
         # Start off with the list of known fields built in the constructor.
         self._fields = OrderedSet(self._output_fields)
 
+    def _iter_queryset(self, qs):
+        """
+        Returns an iterator over the raw pymongo representation of the
+        documents in a queryset that only holds ``batch_size`` documents in
+        memory at a time.
+        """
+        # We use as_pymongo() because it's silly and expensive to construct a
+        # bunch of model instances from the dictionary representation
+        # returned by pymongo, only to convert them back to dictionaries for
+        # serialization.
+        #
+        # The default queryset caches every document it has seen, so use a
+        # non-caching one.
+        qs = qs.no_cache().as_pymongo()
+        # MongoEngine doesn't provide a way to set the cursor's batch size,
+        # so set it on the underlying pymongo cursor.
+        qs._cursor.batch_size(self.batch_size)
+        return self._timed(qs)
+
+    def _timed(self, iterable):
+        """
+        Iterate through documents from the data store, adding the time spent
+        waiting for each document to the 'query' timing.
+        """
+        timings = self.timings
+        it = iter(iterable)
+        while True:
+            start = time.time()
+            try:
+                doc = next(it)
+            except StopIteration:
+                timings['query'] += time.time() - start
+                return
+            timings['query'] += time.time() - start
+            yield doc
+
+    def _get_related_map(self):
+        """
+        Returns a dictionary, keyed by relationship field name, of related
+        documents keyed by the string representation of their ids.
+        """
         # It's slow to follow the referenced fields at the MongoEngine level
         # so just build our own map of related items in memory.
-        #
-        # We use as_pymongo() here, and below, because it's silly and expensive
-        # to construct a bunch of model instances from the dictionary
-        # representation returned by pymongo, only to convert them back to
-        # dictionaries for serialization.
         related_map = {}
         for related_field, related_collection in self._relationships.items():
             related_map[related_field] = {
-                str(c['_id']):c for c 
-                in self._querysets[related_collection].as_pymongo()
+                str(c['_id']):c for c
+                in self._iter_queryset(self._querysets[related_collection])
             }
+        return related_map
 
-        # We'll save the flattened items as an attribute to support a 
-        # chainable interface.
-        self._items = []
-        primary_qs = self._querysets[self.primary_collection_name].as_pymongo()
-        for primary in primary_qs:
+    def _contribute_scanned_fields(self, collection_name, data):
+        """
+        Add the output names of the fields found in a raw document to the
+        list of encountered fields.
+        """
+        transforms = self.field_transforms.get(collection_name, {})
+        is_primary = collection_name == self.primary_collection_name
+        for db_field_name, val in data.items():
+            if db_field_name == '_id':
+                continue
+
+            if is_primary and db_field_name in self._relationships:
+                continue
+
+            transform = transforms.get(db_field_name)
+            if isinstance(transform, FlattenFieldTransform):
+                if isinstance(val, dict):
+                    self._fields |= val.keys()
+            elif transform is not None:
+                self._fields.add(transform.output_name)
+            else:
+                self._fields.add(db_field_name)
+
+    def scan_fields(self, **filter_kwargs):
+        """
+        Find all the output fields for a set of filters without flattening
+        or keeping any of the data.
+
+        Fields declared on the document classes are already known, so
+        they're excluded from the scan of the primary collection.  Only
+        the dynamic fields and the contents of flattened fields need to come
+        back from the data store, which makes this much cheaper than a full
+        pass through the data.
+
+        This allows the header row of a CSV file to be written before
+        streaming rows with ``iter_items()``.
+
+        Returns:
+            A list of field names.
+        """
+        self._prepare(**filter_kwargs)
+
+        primary = self.primary_collection
+        transforms = self.field_transforms.get(self.primary_collection_name, {})
+        primary_qs = self._querysets[self.primary_collection_name]
+
+        if self.join == JOIN_AGGREGATE:
+            # The aggregation pipeline only projects declared fields, so the
+            # only fields we don't already know about are the contents of
+            # flattened fields.
+            self._related_map = None
+            flattened_fields = [name for name, field in primary._fields.items()
+                                if isinstance(transforms.get(field.db_field),
+                                    FlattenFieldTransform)]
+            if flattened_fields:
+                primary_qs = primary_qs.only(*flattened_fields)
+            else:
+                primary_qs = None
+        else:
+            self._related_map = self._get_related_map()
+            for related_field, related_collection in self._relationships.items():
+                for data in self._related_map[related_field].values():
+                    self._contribute_scanned_fields(related_collection, data)
+
+            known_fields = [name for name, field in primary._fields.items()
+                            if field.db_field != '_id'
+                            and not isinstance(transforms.get(field.db_field),
+                                FlattenFieldTransform)]
+            primary_qs = primary_qs.exclude(*known_fields)
+
+        if primary_qs is not None:
+            for data in self._iter_queryset(primary_qs):
+                self._contribute_scanned_fields(self.primary_collection_name,
+                    data)
+
+        self._scanned_kwargs = filter_kwargs
+        return self.get_fields()
+
+    def iter_items(self, **filter_kwargs):
+        """
+        Generator that yields filtered, limited and flattened election results
+        one at a time.
+
+        Unlike ``get_list()``, only ``batch_size`` primary documents are held
+        in memory at once.  With the default, in-memory, join, related
+        documents are still kept in memory, but there are far fewer of them.
+
+        Fields of dynamic documents are only discovered as rows are yielded,
+        so call ``scan_fields()`` with the same filters first if the complete
+        list of fields needs to be known before reading the rows.
+        """
+        if self.join == JOIN_AGGREGATE:
+            return self._iter_items_aggregate(**filter_kwargs)
+
+        return self._iter_items_memory(**filter_kwargs)
+
+    def iter_rows(self, fields=None, **filter_kwargs):
+        """
+        Generator that yields filtered, limited and flattened election results
+        as tuples of values.
+
+        This is faster than ``iter_items()`` because rows are built using a
+        precompiled ``RowPlan`` instead of flattening each set of documents
+        into a dictionary.
+
+        Args:
+            fields: Sequence of output field names.  Each tuple has a value
+                for each field, in this order.  Defaults to the result of
+                ``get_fields()``, so call ``scan_fields()`` with the same
+                filters first to include fields of dynamic documents.
+            **filter_kwargs: Filters, as passed to ``build_filters()``.
+
+        """
+        if fields is None:
+            fields = self.get_fields()
+
+        if self.join == JOIN_AGGREGATE:
+            for flat in self._iter_items_aggregate(**filter_kwargs):
+                yield tuple([flat.get(f) for f in fields])
+            return
+
+        plan = self.compile_row_plan(fields)
+        related_map = self._prepare_memory_join(**filter_kwargs)
+        relationship_fields = [fname for fname, coll in plan.relationships]
+        primary_qs = self._querysets[self.primary_collection_name]
+        timings = self.timings
+        for primary in self._iter_queryset(primary_qs):
+            start = time.time()
+            try:
+                related = [related_map[fname][str(primary[fname])]
+                           for fname in relationship_fields]
+            except KeyError:
+                # A related document was excluded by the filters
+                timings['flatten'] += time.time() - start
+                continue
+            row = plan.row(primary, related)
+            timings['flatten'] += time.time() - start
+            yield row
+
+    def compile_row_plan(self, fields):
+        """
+        Returns a ``RowPlan`` for building rows with values for ``fields``.
+        """
+        return RowPlan(self, fields)
+
+    def _prepare_memory_join(self, **filter_kwargs):
+        """
+        Prepare the querysets for the in-memory join and return the map of
+        related documents.
+        """
+        if getattr(self, '_scanned_kwargs', None) == filter_kwargs:
+            # scan_fields() has already prepared the querysets and fetched
+            # the related documents.  Don't throw away the fields that it
+            # found.
+            related_map = self._related_map
+        else:
+            self._prepare(**filter_kwargs)
+            related_map = self._get_related_map()
+        self._scanned_kwargs = None
+        self._related_map = None
+        return related_map
+
+    def _iter_items_memory(self, **filter_kwargs):
+        related_map = self._prepare_memory_join(**filter_kwargs)
+        # Adding keys to an OrderedSet is slow, so only do it when a row has
+        # fields we haven't seen.
+        seen = set(self._fields)
+        primary_qs = self._querysets[self.primary_collection_name]
+        timings = self.timings
+        for primary in self._iter_queryset(primary_qs):
+            start = time.time()
             related = {}
-            for fname, coll in self._relationships.items():
-                related[fname] = related_map[coll][str(primary[fname])]
-                    
+            try:
+                for fname, coll in self._relationships.items():
+                    related[fname] = \
+                        related_map[fname][str(primary[fname])].copy()
+            except KeyError:
+                # A related document was excluded by the filters
+                timings['flatten'] += time.time() - start
+                continue
+
             flat = self.flatten(primary, **related)
-            self._fields |= flat.keys()
-            self._items.append(flat)
+            if not seen.issuperset(flat):
+                self._fields |= flat.keys()
+                seen.update(flat)
+            timings['flatten'] += time.time() - start
+            yield flat
+
+    def _projected_fields(self, collection, excluded_fields):
+        """
+        Returns a list of (db field name, output field name) tuples for the
+        declared fields of a collection that are included in the output.
 
+        The output field name is None for flattened fields.
+        """
+        coll_name = collection._meta['collection']
+        is_primary = collection == self.primary_collection
+        transforms = self.field_transforms.get(coll_name, {})
+        excluded_field_set = set(excluded_fields.get(coll_name, []))
+        excluded_field_set.add('_id')
+
+        fields = []
+        for field_name in collection._fields_ordered:
+            field = collection._fields[field_name]
+            db_field_name = field.db_field
+            if db_field_name in excluded_field_set:
+                continue
+
+            if is_primary and self._is_relationship_field(field):
+                continue
+
+            transform = transforms.get(db_field_name)
+            if isinstance(transform, FlattenFieldTransform):
+                fields.append((db_field_name, None))
+            elif transform is not None:
+                fields.append((db_field_name, transform.output_name))
+            else:
+                fields.append((db_field_name, db_field_name))
+
+        return fields
+
+    def build_pipeline(self, **filter_kwargs):
+        """
+        Returns a list of aggregation pipeline stages that filters the
+        primary collection, joins in the related collections and projects the
+        output fields.
+
+        Fields are renamed using the declared field transforms.  Fields that
+        are renamed are set to None when they're missing, just like the
+        in-memory join.  Flattened fields and calculated fields are handled in
+        Python, after the results come back from the data store.
+        """
+        filters = self.build_filters(**filter_kwargs)
+        excluded_fields = self.build_exclude_fields(**filter_kwargs)
+        primary = self.primary_collection
+
+        pipeline = [
+            {'$match': filters[self.primary_collection_name].to_query(primary)},
+        ]
+
+        project = {'_id': 0}
+        # Project the related fields first so fields from the primary
+        # collection take precedence, like they do in flatten().
+        for related_field, related_collection in self._relationships.items():
+            pipeline.append({'$lookup': {
+                'from': related_collection,
+                'localField': related_field,
+                'foreignField': '_id',
+                'as': related_field,
+            }})
+            # Only keep primary documents with a related document, like the
+            # in-memory join.
+            pipeline.append({'$unwind': '$' + related_field})
+
+            related = [c for c in self.collections
+                       if c._meta['collection'] == related_collection][0]
+            # Apply the related collection's filters, which the in-memory
+            # join applies when it fetches the related documents.
+            related_query = filters[related_collection].to_query(related)
+            if related_query:
+                pipeline.append({'$match': prefix_query(related_query,
+                    related_field)})
+            for db_field_name, output_name in self._projected_fields(related,
+                    excluded_fields):
+                path = '$%s.%s' % (related_field, db_field_name)
+                project[output_name or db_field_name] = self._project_expr(
+                    path, db_field_name, output_name)
+
+        for db_field_name, output_name in self._projected_fields(primary,
+                excluded_fields):
+            path = '$' + db_field_name
+            project[output_name or db_field_name] = self._project_expr(path,
+                db_field_name, output_name)
+
+        pipeline.append({'$project': project})
+
+        return pipeline
+
+    def _project_expr(self, path, db_field_name, output_name):
+        if output_name is not None and output_name != db_field_name:
+            return {'$ifNull': [path, None]}
+
+        return path
+
+    def _iter_items_aggregate(self, **filter_kwargs):
+        if getattr(self, '_scanned_kwargs', None) != filter_kwargs:
+            self._fields = OrderedSet(self._output_fields)
+        self._scanned_kwargs = None
+
+        flatten_transforms = [t for t in
+            self.field_transforms.get(self.primary_collection_name, {}).values()
+            if isinstance(t, FlattenFieldTransform)]
+        collection = self.primary_collection._get_collection()
+        pipeline = self.build_pipeline(**filter_kwargs)
+        seen = set(self._fields)
+        timings = self.timings
+        # The join is done by the data store, so it's included in the
+        # 'query' timing.
+        for flat in self._timed(iter_aggregate(collection, pipeline,
+                self.batch_size)):
+            start = time.time()
+            for transform in flatten_transforms:
+                flat = transform.transform(flat)
+            flat.update(self.get_calculated_fields(flat))
+            if not seen.issuperset(flat):
+                self._fields |= flat.keys()
+                seen.update(flat)
+            timings['flatten'] += time.time() - start
+            yield flat
+
+    def get_list(self, **filter_kwargs):
+        """
+        Returns a list of filtered, limited and flattened election results.
+        """
+        # We'll save the flattened items as an attribute to support a 
+        # chainable interface.
+        self._items = list(self.iter_items(**filter_kwargs))
         return self._items
 
+    def fingerprint(self, **filter_kwargs):
+        """
+        Returns a summary of the documents that match a set of filters.
+
+        The summary includes the number of matching documents in each
+        collection and the most recent ``updated`` timestamp among them.  If
+        the fingerprint for a set of filters hasn't changed since a bake, the
+        baked output is still up to date.
+
+        Returns:
+            A dictionary of the filter keyword arguments and, for each
+            collection, the document count and the latest ``updated``
+            timestamp as an ISO-8601 string.  The dictionary can be
+            serialized as JSON and compared with a deserialized fingerprint.
+
+        """
+        self._reset_querysets()
+        self.apply_filters(**self.build_filters(**filter_kwargs))
+        collections = {}
+        for collection_name, qs in self._querysets.items():
+            latest = qs.order_by('-updated').only('updated').as_pymongo().first()
+            if latest and latest.get('updated'):
+                updated = latest['updated'].isoformat()
+            else:
+                updated = None
+            collections[collection_name] = {
+                'count': qs.count(),
+                'updated': updated,
+            }
+
+        return {
+            'filters': filter_kwargs,
+            'collections': collections,
+        }
+
     def get_fields(self):
         """
         Returns a list of all fields encountered when building the flattened
-        data with a call to get_list()
+        data with a call to get_list(), iter_items() or scan_fields().
 
         This list is appropriate for writing a header row in a csv file
         using csv.DictWriter.
@@ -504,10 +1236,371 @@ class RawResultRoller(Roller):
             'raw_result': [],
         }
 
+    @classmethod
+    def build_date_filters(cls, datefilter, state=None, collection=None):
+        q = super(RawResultRoller, cls).build_date_filters(datefilter,
+            state=state, collection=collection)
+        if not datefilter:
+            return q
+
+        # Compact raw results don't store a start date.  Only compact loads
+        # write Election records, so match the raw results of those
+        # elections by election ID.  Other raw results keep using the
+        # start date range.
+        election_ids = cls.compact_election_ids(datefilter, state)
+        if election_ids:
+            if state:
+                # Repeat the state inside the $or clause so older query
+                # planners can use the (state, start_date) index for it
+                q &= Q(state=state.upper())
+            q |= Q(election_id__in=election_ids)
+        return q
+
+    @classmethod
+    def compact_election_ids(cls, datefilter, state=None):
+        """
+        Returns a list of the IDs of elections matching a date filter that
+        have an Election record, and might have compact raw results.
+        """
+        start, end, election_id_date = cls.parse_datefilter(datefilter)
+        filters = {
+            'start_date__gte': start,
+            'start_date__lt': end,
+        }
+        if state:
+            filters['state'] = state.upper()
+        return list(Election.objects(**filters).scalar('election_id'))
+
+    def _iter_queryset(self, qs):
+        for doc in super(RawResultRoller, self)._iter_queryset(qs):
+            if 'start_date' not in doc:
+                Election.rehydrate(doc)
+            yield doc
+
+    def build_pipeline(self, **filter_kwargs):
+        pipeline = super(RawResultRoller, self).build_pipeline(**filter_kwargs)
+        project = pipeline[-1]['$project']
+        metadata_fields = [name for name in Election.METADATA_FIELDS
+                           if name in project]
+        if metadata_fields:
+            # Fill in the metadata missing from compact raw results from
+            # their Election documents.
+            pipeline[-1:-1] = [
+                {'$lookup': {
+                    'from': Election._get_collection_name(),
+                    'localField': 'election_id',
+                    'foreignField': '_id',
+                    'as': '_election',
+                }},
+                {'$unwind': {
+                    'path': '$_election',
+                    'preserveNullAndEmptyArrays': True,
+                }},
+            ]
+            for name in metadata_fields:
+                project[name] = {'$ifNull': ['$' + name, '$_election.' + name]}
+        return pipeline
+
+
+def parse_formats(fmt):
+    """
+    Returns a list of output formats from a format string or sequence.
+
+    Args:
+        fmt: A single format, like "csv", a comma-separated string of
+            formats, like "csv,json", or a list of formats.
+
+    """
+    if isinstance(fmt, basestring):
+        fmt = fmt.split(',')
+    return [f.strip() for f in fmt if f.strip()]
+
+
+class OutputFile(object):
+    """
+    Wraps a file object to count, hash and time the data written to it.
+
+    This lets a baker describe an output file in its manifest without
+    reading the file again after it's written.
+    """
+    def __init__(self, f, path=None):
+        self.f = f
+        self.path = path
+        self.bytes = 0
+        self.sha256 = hashlib.sha256()
+        self.write_time = 0.0
+
+    @property
+    def closed(self):
+        return self.f is None
+
+    def write(self, data):
+        start = time.time()
+        self.sha256.update(data)
+        self.f.write(data)
+        self.bytes += len(data)
+        self.write_time += time.time() - start
+
+    def reopen(self):
+        """
+        Reopen a closed file so more data can be appended to it.
+
+        The byte count and hash carry on from where they left off.
+        """
+        self.f = open(self.path, 'a')
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class OutputFilePool(object):
+    """
+    Keeps at most ``max_open`` output files open at once.
+
+    When another file needs to be opened, the least recently used file is
+    closed.  It's reopened in append mode the next time it's written to.
+    """
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self.files = OrderedDict()
+        self._open = OrderedDict()
+
+    def get(self, path):
+        """
+        Returns an open ``OutputFile`` for a path, creating the file if this
+        is the first time the path has been requested.
+        """
+        try:
+            f = self._open.pop(path)
+        except KeyError:
+            try:
+                f = self.files[path]
+            except KeyError:
+                f = OutputFile(open(path, 'w'), path)
+                self.files[path] = f
+            else:
+                f.reopen()
+
+            if len(self._open) >= self.max_open:
+                lru_path, lru = self._open.popitem(last=False)
+                lru.close()
+
+        self._open[path] = f
+        return f
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self._open.clear()
+
+
+PARTITION_FIELD_ALIASES = {
+    'election_id': 'id',
+    'ocd_id': 'division',
+}
+"""
+Map of data store field names that can be used to specify a partition to
+their output field names.
+"""
+
+
+def partition_key(partition):
+    """
+    Returns a function that gets the partition value of a result.
+
+    Args:
+        partition (string): Output field name, like "reporting_level" or
+            "jurisdiction".  "election_id" and "ocd_id" can be used for the
+            "id" and "division" fields.  An OCD division ID field can be
+            followed by a colon and a division type, like "ocd_id:county",
+            to partition by the part of the ID with that type.  Results
+            without that type of division are given a partition value of
+            None.
+
+    Returns:
+        A function that takes a result dictionary and returns its partition
+        value.
+
+    """
+    field, sep, division_type = partition.partition(':')
+    field = PARTITION_FIELD_ALIASES.get(field, field)
+    if not division_type:
+        return lambda item: item.get(field)
+
+    prefix = division_type + ':'
+    def key(item):
+        for bit in (item.get(field) or '').split('/'):
+            if bit.startswith(prefix):
+                return bit
+        return None
+
+    return key
+
+
+def partition_slug(value):
+    """
+    Returns a version of a partition value that can be used in a filename.
+    """
+    if value is None:
+        return 'none'
+
+    slug = re.sub(r'[^a-z0-9]+', '-', unicode(value).lower()).strip('-')
+    return slug or 'none'
+
+
+class ResultStats(object):
+    """
+    Counts results and sums their votes as they're written.
+
+    The vote total gives a cheap checksum for comparing bakes.
+    """
+    def __init__(self, fields, vote_field='votes'):
+        self.rows = 0
+        self.votes = 0
+        self.vote_field = vote_field
+        try:
+            self._vote_index = list(fields).index(vote_field)
+        except ValueError:
+            self._vote_index = None
+
+    def add_item(self, item):
+        self.rows += 1
+        votes = item.get(self.vote_field)
+        # Skip missing or non-numeric values, but not booleans, which are
+        # ints
+        if votes.__class__ in (int, long, float):
+            self.votes += votes
+
+    def count_rows(self, rows):
+        """
+        Generator that counts sequences of values ordered like the fields
+        passed to the constructor as they're passed through.
+        """
+        i = self._vote_index
+        for row in rows:
+            self.rows += 1
+            if i is not None:
+                votes = row[i]
+                if votes.__class__ in (int, long, float):
+                    self.votes += votes
+            yield row
+
+
+class ResultWriter(object):
+    """
+    Writes flattened results to an open file in a particular format.
+
+    Separating writing a file from looping through the results lets a baker
+    write several formats in a single pass through the results.
+    """
+    def __init__(self, f, fields):
+        """
+        Args:
+            f: File-like object that output will be written to.
+            fields: List of the field names of the results.
+
+        """
+        self.f = f
+        self.fields = fields
+
+    def start(self):
+        """Write anything that comes before the results."""
+        pass
+
+    def write_item(self, item):
+        """Write a single result dictionary."""
+        raise NotImplementedError
+
+    def finish(self):
+        """Write anything that comes after the results."""
+        pass
+
+
+class CSVResultWriter(ResultWriter):
+    def start(self):
+        self._writer = csv.writer(self.f)
+        self._writer.writerow(encode_row(self.fields))
+
+    def write_item(self, item):
+        self._writer.writerow(encode_row([item.get(f) for f in self.fields]))
+
+    def write_rows(self, rows):
+        """
+        Write sequences of values ordered like ``fields``.
+
+        This is faster than calling ``write_item()`` for each result.
+        """
+        self._writer.writerows(encode_row(row) for row in rows)
+
+
+class JSONResultWriter(ResultWriter):
+    """
+    Writes results as a JSON array.
+
+    Each item is encoded and written separately so the complete JSON
+    document is never held in memory.  The output is the same as
+    serializing the list of items all at once.
+    """
+    def start(self):
+        self._encode = json.JSONEncoder(default=json_default).encode
+        self._sep = ""
+        self.f.write("[")
+
+    def write_item(self, item):
+        self.f.write(self._sep)
+        self.f.write(self._encode(item))
+        self._sep = ", "
+
+    def finish(self):
+        self.f.write("]")
+
+
+class JSONLinesResultWriter(ResultWriter):
+    """
+    Writes results as newline-delimited JSON, with one JSON object per line.
+    """
+    def start(self):
+        self._encode = json.JSONEncoder(default=json_default).encode
+
+    def write_item(self, item):
+        self.f.write(self._encode(item))
+        self.f.write("\n")
+
 
 class BaseBaker(object):
     """Base class for classes that write election and candidate data to structured files"""
 
+    writer_classes = {
+        'csv': CSVResultWriter,
+        'json': JSONResultWriter,
+        'jsonl': JSONLinesResultWriter,
+    }
+    """
+    Map of output formats to the ResultWriter classes used to write them.
+
+    Formats can be written in the same pass through the results as other
+    formats if they have a writer class.
+    """
+
+    vote_field = 'votes'
+    """
+    Output field whose values are summed to provide a checksum in the
+    manifest.
+    """
+
+    max_open_files = 64
+    """
+    Maximum number of output files kept open at once when writing
+    partitioned output.
+    """
+
+    roller_class = None
+    """
+    Roller subclass used to retrieve and flatten the results.
+    """
+
     timestamp_format = "%Y%m%dT%H%M%S"
     """
     stftime() format string used to format timestamps. Mostly used for 
@@ -548,47 +1641,218 @@ class BaseBaker(object):
         if timestamp is None:
             timestamp = datetime.now()
 
-        state = self.filter_kwargs.get('state')
-        return "%s_%s.%s" % (state.lower(),
-            timestamp.strftime(self.timestamp_format), fmt) 
+        return "%s.%s" % (self._filename_base(timestamp), fmt)
 
     def manifest_filename(self, timestamp, **filter_kwargs):
         """
         Returns the filename string for the manifest output file.
         """
-        state = self.filter_kwargs.get('state')
-        return "%s_%s_manifest.txt" % (state.lower(),
-            timestamp.strftime(self.timestamp_format)) 
+        return "%s_manifest.json" % (self._filename_base(timestamp))
+
+    def fingerprint_filename(self):
+        """
+        Returns the filename string for the file recording the fingerprints
+        of the most recent bakes.
+
+        Unlike the other output files, this doesn't include a timestamp, so
+        it can be found by later bakes.  Bakes that share this file, for
+        example of different reporting levels, are recorded separately.
+        See ``bake_key()``.
+        """
+        return "%s_fingerprint.json" % (self._filename_base())
+
+    def _filename_base(self, timestamp=None):
+        """
+        Returns the part of output filenames shared by results and manifest
+        files.
+
+        The date filter and election type are included when they're set so
+        bakes of different elections that share a timestamp don't overwrite
+        each other.
+        """
+        bits = [self.filter_kwargs.get('state').lower()]
+        for k in ('datefilter', 'election_type'):
+            if self.filter_kwargs.get(k):
+                bits.append(self.filter_kwargs[k].replace('-', ''))
+        if timestamp is not None:
+            bits.append(timestamp.strftime(self.timestamp_format))
+        return "_".join(bits)
+
+    def fingerprint(self, roller=None):
+        """
+        Returns the fingerprint of the data that will be baked.
+
+        The fingerprint is only calculated once per baker, before any
+        results are collected.  See ``Roller.fingerprint()``.
+        """
+        if getattr(self, '_fingerprint', None) is None:
+            if roller is None:
+                roller = self.roller_class()
+            self._fingerprint = roller.fingerprint(**self.filter_kwargs)
+
+        return self._fingerprint
+
+    def bake_key(self, partition=None):
+        """
+        Returns a string identifying the results and layout of a bake.
+
+        The key is made from all the filters, the collection the results
+        are read from, which differs for per-state collections, and the
+        partition key, so bakes that share a fingerprint file don't
+        overwrite each other's record.
+        """
+        key = dict(self.filter_kwargs, partition=partition)
+        if self.roller_class is not None:
+            key['collection'] = \
+                self.roller_class.primary_collection._get_collection_name()
+        return json.dumps(key, sort_keys=True)
+
+    def _fingerprint_path(self, outputdir):
+        return os.path.join(outputdir, self.fingerprint_filename())
+
+    def _read_fingerprint_records(self, outputdir):
+        try:
+            with open(self._fingerprint_path(outputdir)) as f:
+                records = json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+        # Files written before bakes were keyed hold a single record
+        if 'fingerprint' in records:
+            return {}
+        return records
+
+    def is_up_to_date(self, fmt='csv', outputdir=None, partition=None):
+        """
+        Check whether a previous bake in a format is still up to date.
+
+        A bake is up to date if the fingerprint recorded when it was written
+        matches the current fingerprint of the data and the output files
+        still exist.
+
+        Arguments:
+
+        * fmt: Output format. Either 'csv', 'json' or 'jsonl'. Default is
+          'csv'. This can also be a list or comma-separated string of
+          formats, in which case every format has to be up to date.
+        * outputdir: Directory where output files are written. Defaults to
+          "openelections/us/bakery"
+        * partition: Partition key the results were split by.  See
+          ``write()``.
+
+        """
+        if outputdir is None:
+            outputdir = self.default_outputdir()
+
+        record = self._read_fingerprint_records(outputdir).get(
+            self.bake_key(partition))
+        if record is None or record['fingerprint'] != self.fingerprint():
+            return False
+
+        for fmt in parse_formats(fmt):
+            try:
+                filenames = record['files'][fmt]
+            except KeyError:
+                return False
+
+            for filename in filenames:
+                if not os.path.exists(os.path.join(outputdir, filename)):
+                    return False
+
+        return True
+
+    def _record_fingerprint(self, files, outputdir, partition=None):
+        """
+        Record the fingerprint of the data and the names of the files just
+        written so a later bake can tell if the files are up to date.
+
+        Arguments:
+
+        * files: Dictionary mapping formats to lists of filenames.
+        * outputdir: Directory where output files are written.
+        * partition: Partition key the results were split by.
+
+        """
+        fingerprint = getattr(self, '_fingerprint', None)
+        if fingerprint is None:
+            return
+
+        records = self._read_fingerprint_records(outputdir)
+        key = self.bake_key(partition)
+        record = records.get(key)
+        if record is None or record['fingerprint'] != fingerprint:
+            record = records[key] = {
+                'fingerprint': fingerprint,
+                'files': {},
+            }
+        record['files'].update(files)
+
+        with open(self._fingerprint_path(outputdir), 'w') as f:
+            json.dump(records, f, indent=4, sort_keys=True)
 
-    def collect_items(self):
+    def collect_items(self, stream=False, join=None):
         """
         Query the data store and retrieve a flattened, filtered list of
         election results.
 
         This should be implemented in a subclass.
 
+        Args:
+            stream (boolean): If True, don't retrieve all the results up
+                front. Instead, set up a generator that will yield results
+                as they are written.  This keeps memory use bounded for
+                large bakes, but the items can only be iterated through
+                once.  Default is False.
+            join (string): How documents from related collections are
+                joined.  Either 'memory' or 'aggregate'.  Default is the
+                roller's default, 'memory'.  See ``Roller.join``.
+
         Returns:
             ``self``, allowing a chainable interface.
 
             Implementations of this method in subclasses should set the
-            ``_items`` attribute of the class instance to a list of result
-            dictionaries and the ``_fields`` attribute to a list of field names
-            found in the result dictionaries.  Otherwise, subclasses will need
-            to override the ``get_items()`` and ``get_fields()`` methods.
+            ``_items`` attribute of the class instance to a list, or iterable,
+            of result dictionaries and the ``_fields`` attribute to a list of
+            field names found in the result dictionaries.  Otherwise,
+            subclasses will need to override the ``get_items()`` and
+            ``get_fields()`` methods.
 
         """
         self._items = []
         self._fields = []
         return self
 
+    def _collect_items_from_roller(self, roller, stream=False):
+        """
+        Set the items and fields for this baker using a Roller instance.
+        """
+        # Take the fingerprint before reading any results so changes made
+        # during the bake will be picked up by the next one.
+        self.fingerprint(roller)
+        self._timings = roller.timings
+        if stream:
+            # Find the fields first so the header row can be written before
+            # we start streaming the rows.
+            roller.scan_fields(**self.filter_kwargs)
+            self._fields = roller.get_fields()
+            # Neither generator does anything until it's iterated through,
+            # so only the one used by the writer will query the data store.
+            self._items = roller.iter_items(**self.filter_kwargs)
+            self._rows = roller.iter_rows(self._fields, **self.filter_kwargs)
+        else:
+            self._items = roller.get_list(**self.filter_kwargs)
+            self._fields = roller.get_fields()
+            self._rows = None
+        return self
+
     def get_items(self):
         """
         Retrieve a flattened, filtered list of election results. 
 
         Returns:
-            A list of result dictionaries.  By default, this is the value of
-            ``self._items`` which should be populated with a call to
-            ``collect_items()``.
+            A list, or other iterable, of result dictionaries.  By default,
+            this is the value of ``self._items`` which should be populated
+            with a call to ``collect_items()``.
 
             If results need to be retrieved in some other way, this
             method should be overridden in a subclass.
@@ -599,6 +1863,25 @@ class BaseBaker(object):
         except AttributeError:
             return []
 
+    def get_rows(self):
+        """
+        Retrieve flattened, filtered election results as sequences of values.
+
+        Returns:
+            An iterable of sequences of values in the same order as the
+            fields returned by ``get_fields()``.  When items are being
+            streamed, this is a generator that builds rows directly from the
+            data store documents.  Otherwise the rows are built from the
+            result dictionaries returned by ``get_items()``.
+
+        """
+        rows = getattr(self, '_rows', None)
+        if rows is not None:
+            return rows
+
+        fields = self.get_fields()
+        return ([item.get(f) for f in fields] for item in self.get_items())
+
     def get_fields(self):
         """
         Retrieve a list of fields found in result records.
@@ -616,21 +1899,41 @@ class BaseBaker(object):
         """
         return self._fields
            
-    def write(self, fmt='csv', outputdir=None, timestamp=None):
+    def write(self, fmt='csv', outputdir=None, timestamp=None, partition=None):
         """
-        Writes collected data to a file.
+        Writes collected data to one or more files.
+
+        When more than one format is specified, each result is written to
+        every file in a single pass through the results, so the results only
+        have to be retrieved once.  This works with results collected with
+        ``collect_items(stream=True)``.
         
         Arguments:
         
-        * fmt: Output format. Either 'csv' or 'json'. Default is 'csv'. 
+        * fmt: Output format. Either 'csv', 'json' or 'jsonl'. Default is
+          'csv'. This can also be a list or comma-separated string of
+          formats, for example 'csv,json'.
         * outputdir: Directory where output files will be written. Defaults to 
           "openelections/us/bakery"
+        * partition: Split the results into a file for each value of this
+          partition key, for example 'reporting_level' or 'ocd_id:county'.
+          See ``partition_key()``.  All the files are written in a single
+          pass through the results.
           
         """
-        try:
-            fmt_method = getattr(self, 'write_' + fmt) 
-        except AttributeError:
-            raise UnsupportedFormatError("Format %s is not supported" % (fmt))
+        fmts = parse_formats(fmt)
+        if not fmts:
+            raise UnsupportedFormatError("No output format specified")
+
+        for fmt in fmts:
+            if not hasattr(self, 'write_' + fmt):
+                raise UnsupportedFormatError("Format %s is not supported" % (fmt))
+
+        if len(fmts) > 1 or partition is not None:
+            for fmt in fmts:
+                if fmt not in self.writer_classes:
+                    raise UnsupportedFormatError(
+                        "Format %s can't be written with other formats" % (fmt))
         
         if outputdir is None:
             outputdir = self.default_outputdir()
@@ -641,31 +1944,200 @@ class BaseBaker(object):
         if timestamp is None:
             timestamp = datetime.now()
 
-        return fmt_method(outputdir, timestamp)
+        files = dict((fmt, []) for fmt in fmts)
+        if partition is not None:
+            num_outputs = len(getattr(self, '_outputs', []))
+            self._write_partitioned(fmts, partition, outputdir, timestamp)
+            for output in getattr(self, '_outputs', [])[num_outputs:]:
+                files[output['format']].append(output['filename'])
+        else:
+            if len(fmts) > 1:
+                self._write_formats(fmts, outputdir, timestamp)
+            else:
+                getattr(self, 'write_' + fmts[0])(outputdir, timestamp)
 
-    def write_csv(self, outputdir, timestamp):
-        path = os.path.join(outputdir,
-            self.filename('csv', timestamp, **self.filter_kwargs))
-            
-        with open(path, 'w') as csvfile:
-            writer = DictWriter(csvfile, self.get_fields())
-            writer.writeheader()
-            for row in self.get_items():
-                writer.writerow(row)
+            for fmt in fmts:
+                files[fmt].append(self.filename(fmt, timestamp,
+                    **self.filter_kwargs))
 
+        self._record_fingerprint(files, outputdir, partition)
         return self
 
-    def write_json(self, outputdir, timestamp):
-        path = os.path.join(outputdir,
-            self.filename('json', timestamp, **self.filter_kwargs))
-        with open(path, 'w') as f:
-            f.write(json.dumps(self.get_items(), default=json_util.default))
+    def _write_formats(self, fmts, outputdir, timestamp):
+        """
+        Write the results to a file for each format using the formats'
+        ``ResultWriter`` classes.
+
+        A description of each file is saved for the manifest.
+        """
+        fields = self.get_fields()
+        stats = ResultStats(fields, self.vote_field)
+        timings = getattr(self, '_timings', {})
+        files = []
+        try:
+            writers = []
+            for fmt in fmts:
+                path = os.path.join(outputdir,
+                    self.filename(fmt, timestamp, **self.filter_kwargs))
+                f = OutputFile(open(path, 'w'))
+                files.append(f)
+                writers.append(self.writer_classes[fmt](f, fields))
+
+            for writer in writers:
+                writer.start()
+
+            if len(writers) == 1 and hasattr(writers[0], 'write_rows'):
+                # Rows are read from the data store as they're written, so
+                # don't count that as time spent writing.
+                roller_time = sum(timings.values())
+                start = time.time()
+                writers[0].write_rows(stats.count_rows(self.get_rows()))
+                elapsed = [time.time() - start -
+                           (sum(timings.values()) - roller_time)]
+            else:
+                elapsed = [0.0] * len(writers)
+                write_fns = list(enumerate(
+                    [writer.write_item for writer in writers]))
+                for item in self.get_items():
+                    stats.add_item(item)
+                    for i, write_item in write_fns:
+                        start = time.time()
+                        write_item(item)
+                        elapsed[i] += time.time() - start
+
+            for writer in writers:
+                writer.finish()
+        finally:
+            for f in files:
+                f.close()
+
+        for fmt, f, output_time in zip(fmts, files, elapsed):
+            self._add_output(self.filename(fmt, timestamp,
+                **self.filter_kwargs), fmt, f, fields, stats, output_time)
 
         return self
 
+    def _write_partitioned(self, fmts, partition, outputdir, timestamp):
+        """
+        Write the results to a file for each combination of format and
+        partition value.
+        """
+        fields = self.get_fields()
+        get_partition = partition_key(partition)
+        pool = OutputFilePool(self.max_open_files)
+        # Filename slugs of partition values to dictionaries of the partition
+        # value, result stats and a list of [format, filename, writer,
+        # seconds writing] lists.  Values with the same slug share files.
+        partitions = {}
+        # Cache of partition values to the dictionaries in ``partitions``.
+        value_partitions = {}
+        try:
+            for item in self.get_items():
+                value = get_partition(item)
+                try:
+                    part = value_partitions[value]
+                except KeyError:
+                    slug = partition_slug(value)
+                    part = partitions.get(slug)
+                    if part is None:
+                        part = partitions[slug] = self._start_partition(fmts,
+                            value, slug, fields, pool, outputdir, timestamp)
+                    value_partitions[value] = part
+
+                part['stats'].add_item(item)
+                for output in part['outputs']:
+                    writer = output[2]
+                    pool.get(writer.f.path)
+                    start = time.time()
+                    writer.write_item(item)
+                    output[3] += time.time() - start
+
+            for part in partitions.values():
+                for fmt, filename, writer, output_time in part['outputs']:
+                    pool.get(writer.f.path)
+                    writer.finish()
+        finally:
+            pool.close()
+
+        for slug, part in sorted(partitions.items()):
+            for fmt, filename, writer, output_time in part['outputs']:
+                output = self._add_output(filename, fmt, writer.f, fields,
+                    part['stats'], output_time)
+                output['partition'] = part['value']
+
+        return self
+
+    def _start_partition(self, fmts, value, slug, fields, pool, outputdir,
+            timestamp):
+        """
+        Open the files for a new partition and write anything that comes
+        before the results.
+        """
+        part = {
+            'value': value,
+            'stats': ResultStats(fields, self.vote_field),
+            'outputs': [],
+        }
+        for fmt in fmts:
+            root, ext = os.path.splitext(self.filename(fmt, timestamp,
+                **self.filter_kwargs))
+            filename = "%s_%s%s" % (root, slug, ext)
+            f = pool.get(os.path.join(outputdir, filename))
+            writer = self.writer_classes[fmt](f, fields)
+            writer.start()
+            part['outputs'].append([fmt, filename, writer, 0.0])
+
+        return part
+
+    def _add_output(self, filename, fmt, f, fields, stats, output_time):
+        """
+        Save the description of an output file for the manifest.
+
+        Returns:
+            A dictionary describing the output file.
+
+        """
+        timings = getattr(self, '_timings', {})
+        output = {
+            'filename': filename,
+            'format': fmt,
+            'rows': stats.rows,
+            'bytes': f.bytes,
+            'sha256': f.sha256.hexdigest(),
+            'fields': list(fields),
+            self.vote_field: stats.votes,
+            'timings': {
+                'query': round(timings.get('query', 0.0), 6),
+                'flatten': round(timings.get('flatten', 0.0), 6),
+                'serialize': round(max(output_time - f.write_time, 0.0), 6),
+                'write': round(f.write_time, 6),
+            },
+        }
+        if not hasattr(self, '_outputs'):
+            self._outputs = []
+        self._outputs.append(output)
+        return output
+
+    def write_csv(self, outputdir, timestamp):
+        return self._write_formats(['csv'], outputdir, timestamp)
+
+    def write_json(self, outputdir, timestamp):
+        return self._write_formats(['json'], outputdir, timestamp)
+
+    def write_jsonl(self, outputdir, timestamp):
+        return self._write_formats(['jsonl'], outputdir, timestamp)
+
     def write_manifest(self, outputdir=None, timestamp=None):
         """
-        Writes a manifest file that describes collected results.
+        Writes a JSON manifest file that describes collected results and
+        the files they were written to.
+
+        For each file written by ``write()``, the manifest includes the
+        filename, format, number of rows, size in bytes, SHA-256 digest,
+        field names, the total of the vote field and the seconds spent in
+        each stage of the bake.  The 'query' and 'flatten' timings are for
+        retrieving the results and are shared by all files written from
+        them.  'serialize' and 'write' are for the individual file.
         """
         if outputdir is None:
             outputdir = self.default_outputdir()
@@ -679,25 +2151,25 @@ class BaseBaker(object):
         path = os.path.join(outputdir,
             self.manifest_filename(timestamp, **self.filter_kwargs))
 
-        # TODO: Decide on best format for manifest file. 
+        manifest = {
+            'generated': timestamp.strftime(self.timestamp_format),
+            'filters': self.filter_kwargs,
+            'fingerprint': getattr(self, '_fingerprint', None),
+            'files': getattr(self, '_outputs', []),
+        }
         with open(path, 'w') as f:
-            f.write("Generated on %s\n" %
-                timestamp.strftime(self.timestamp_format))
-            f.write("\n")
-            f.write("Filters:\n\n")
-            for k, v in self.filter_kwargs.items():
-                f.write("%s: %s\n" % (k, v))
+            json.dump(manifest, f, indent=4, sort_keys=True)
 
         return self
 
 
 class RawBaker(BaseBaker):
     """Writes filtered election results from RawResult records to structured files"""
-    def collect_items(self):
-        roller = RawResultRoller()
-        self._items = roller.get_list(**self.filter_kwargs)
-        self._fields = roller.get_fields()
-        return self
+    roller_class = RawResultRoller
+
+    def collect_items(self, stream=False, join=None):
+        return self._collect_items_from_roller(self.roller_class(join),
+            stream)
 
     def filename(self, fmt, timestamp=None, **filter_kwargs):
         state = filter_kwargs.get('state')
@@ -711,6 +2183,13 @@ class RawBaker(BaseBaker):
             race_type=race_type,
             extension="."+fmt, suffix_bits=suffix_bits)
 
+    def fingerprint_filename(self):
+        start_date_s = self.filter_kwargs['datefilter'].replace('-', '')
+        return standardized_filename(state=self.filter_kwargs['state'],
+            start_date=start_date_s,
+            race_type=self.filter_kwargs.get('election_type'),
+            extension=".json", suffix_bits=['raw', 'fingerprint'])
+
     def write_manifest(self, outputdir=None, timestamp=None):
         # Don't write a manifest with the raw baker
         pass
@@ -718,8 +2197,8 @@ class RawBaker(BaseBaker):
    
 class Baker(BaseBaker):
     """Writes (filtered) election and candidate data to structured files"""
-    def collect_items(self):
-        roller = ResultRoller()
-        self._items = roller.get_list(**self.filter_kwargs)
-        self._fields = roller.get_fields()
-        return self
+    roller_class = ResultRoller
+
+    def collect_items(self, stream=False, join=None):
+        return self._collect_items_from_roller(self.roller_class(join),
+            stream)
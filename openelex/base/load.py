@@ -1,22 +1,90 @@
 import datetime
 import json
+import logging
 from os.path import join
 import re
 
+from mongoengine import ValidationError
 import unicodecsv
 
-from openelex.models import RawResult
+from openelex.db import write_concern
+from openelex.lib.insertbuffer import BulkInsertBuffer
+from openelex.models import Election, RawResult
+from openelex.storage import get_backend
 from .state import StateBase
 
 
+class LoadContext(object):
+    """
+    Values that are the same for every result loaded from a data file.
+
+    ``BaseLoader.run()`` builds one of these for each file, so loaders don't
+    have to look up the election metadata for every row.
+
+    Attributes:
+
+    * mapping - The datasource mapping for the file.
+    * source - Name of the data file.
+    * election_id - OpenElex election ID, e.g. "md-2012-11-06-general".
+    * state - Uppercase state abbreviation.
+    * timestamp - Time the load started.
+    * metadata - Dictionary of the Election metadata fields.
+    * common_kwargs - Dictionary of the RawResult fields shared by every
+      result from the file.
+    * columns - Dictionary mapping the names of the file's columns to their
+      positions.  Empty until ``resolve_columns()`` is called.
+    * constants - Dictionary for other per-file values a loader wants to
+      compute once.
+
+    """
+
+    def __init__(self, mapping, state, timestamp, metadata):
+        self.mapping = mapping
+        self.source = mapping['generated_filename']
+        self.election_id = mapping['election']
+        self.state = state.upper()
+        self.timestamp = timestamp
+        self.metadata = metadata
+        self.common_kwargs = {
+            'created': timestamp,
+            'updated': timestamp,
+            'source': self.source,
+            'election_id': self.election_id,
+            'state': self.state,
+        }
+        self.common_kwargs.update(metadata)
+        self.columns = {}
+        self.constants = {}
+
+    def result_kwargs(self, **kwargs):
+        """
+        Returns a new dictionary of the common RawResult fields, updated
+        with any keyword arguments.
+        """
+        result = self.common_kwargs.copy()
+        if kwargs:
+            result.update(kwargs)
+        return result
+
+    def resolve_columns(self, header):
+        """
+        Record the position of each column in a file's header row.
+
+        Column names are stripped of surrounding whitespace.  Returns the
+        ``columns`` dictionary.
+        """
+        self.columns = dict((name.strip(), i) for i, name in enumerate(header))
+        return self.columns
+
+
 class BaseLoader(StateBase):
     """
     Base class for loading results data into MongoDB
     Intended to be subclassed in state-specific load.py modules.
     Reads from cached resources inside each state directory.
     
-    Subclasses should create RawResult models and only do minimal
-    cleaning such as:
+    Subclasses should yield raw results from ``iter_results()`` and only do
+    minimal cleaning such as:
 
     * Strip leading/trailing whitespace from values
     * Convert votes from string to integer
@@ -24,7 +92,20 @@ class BaseLoader(StateBase):
     All other cleaning or transformation of values should be
     done by creating transforms.
 
+    In compact mode, the election metadata is stored once, on an Election
+    record, rather than on each RawResult.  Subclasses that override
+    ``load()`` should create records with ``insert_results()`` so they're
+    stored the same way in either mode.
+
     """
+    compact = False
+    """Store election metadata on an Election instead of each RawResult"""
+
+    bulk = False
+    """Insert raw results with the "bulk_load" write concern"""
+
+    batch_size = 1000
+    """Number of raw results inserted at a time by ``load()``"""
 
     def __init__(self):
         super(BaseLoader, self).__init__()
@@ -36,9 +117,10 @@ class BaseLoader(StateBase):
         """
         Load a data file's results into the data store.
 
-        Initializes some metadata attributes on the instance and then
-        call ``load()`` to create the RawResult model instances in the
-        data store.
+        Initializes some metadata attributes on the instance, builds the
+        file's LoadContext, available as ``self.context``, and then calls
+        ``load()`` to create the RawResult model instances in the data
+        store.
 
         Arguments:
 
@@ -47,14 +129,28 @@ class BaseLoader(StateBase):
             ``generated_filename`` value that contains the filename of the
             data to be loaded.
 
+        Returns:
+            The loader, so callers that go through a state's dispatching
+            ``LoadResults`` class can see which file was loaded and how many
+            results were inserted.
+
         """
         self.mapping = mapping
         self.source = mapping['generated_filename']
         self.timestamp = datetime.datetime.now()
         self.election_id = mapping['election']
+        self.inserted = 0
+        self.invalid = 0
+        self.context = LoadContext(mapping, self.state, self.timestamp,
+            self._build_election_metadata())
 
         self.delete_previously_loaded()
+        if self.compact:
+            self.save_election()
         self.load()
+        if self.invalid:
+            print("\tSkipped %d invalid raw results" % self.invalid)
+        return self
 
     def delete_previously_loaded(self):
         """
@@ -63,15 +159,92 @@ class BaseLoader(StateBase):
         """
         print("LOAD: %s" % self.source)
         # Reload raw results fresh every time
-        result_count = RawResult.objects.filter(source=self.source).count()
+        backend = get_backend()
+        result_count = backend.count(RawResult, source=self.source)
         if result_count > 0:
             print("\tDeleting %s previously loaded raw results" % result_count)
-            RawResult.objects.filter(source=self.source).delete()
+            backend.delete(RawResult, source=self.source)
+
+    def save_election(self):
+        """
+        Create or update the Election record that holds the metadata for
+        the election being loaded.
+
+        Files from the same election can be loaded by parallel workers, so
+        the record is written with a single atomic upsert.
+        """
+        Election(election_id=self.election_id, state=self.state.upper(),
+            **self.context.metadata).upsert()
+
+    def insert_results(self, results):
+        """
+        Insert a list of raw results into the data store.
+
+        Results can be RawResult instances or, much faster to build,
+        dictionaries of RawResult field values.  Dictionaries are validated
+        and converted by ``RawResult.build_son()``.  Invalid results are
+        logged and skipped, so one bad row doesn't leave a file partly
+        loaded.  ``self.invalid`` counts them.
+
+        In compact mode, the election metadata fields are left out of the
+        stored records.
+
+        The records are stored with the configured storage backend.  In
+        MongoDB, the inserts use the write concern configured for the "load"
+        operation in ``settings.MONGO_WRITE_CONCERNS``, or the "bulk_load"
+        operation in bulk mode.
+        """
+        if not results:
+            return
+
+        if self.bulk:
+            concern = write_concern('bulk_load')
+        else:
+            concern = write_concern('load')
+
+        docs = []
+        for result in results:
+            if not isinstance(result, dict):
+                docs.append(result.to_mongo())
+                continue
+            try:
+                docs.append(RawResult.build_son(result))
+            except ValidationError as e:
+                logging.warning("Skipping invalid raw result from %s: %s" %
+                    (self.source, e))
+                self.invalid += 1
+        if self.compact:
+            for doc in docs:
+                RawResult.compact_son(doc)
+
+        # With continue_on_error, a bad document doesn't stop the rest of the
+        # batch from being inserted in MongoDB, like an unordered bulk write
+        get_backend().insert(RawResult, docs, continue_on_error=self.bulk,
+            **concern)
+        self.inserted += len(docs)
 
     def load(self):
         """
         Creates records in the data store for each result in the data file.
 
+        The RawResult instances yielded by ``iter_results()`` are inserted
+        in batches of ``batch_size``, so memory use doesn't grow with the
+        size of the file.
+
+        """
+        results = BulkInsertBuffer(RawResult, self.batch_size,
+            insert=self.insert_results)
+        for result in self.iter_results():
+            results.append(result)
+        results.flush()
+
+    def iter_results(self):
+        """
+        Yields a raw result for each result in the data file.
+
+        Results can be dictionaries of RawResult field values, which are
+        much cheaper to build than RawResult instances.
+
         This should load the data fields in a way that is as close as possible
         to the original data file.  Only basic data cleaning and transforming
         should be done here, such as stripping leading or trailing whitespace
@@ -80,7 +253,7 @@ class BaseLoader(StateBase):
         This should be implemented in state-specific sublcasses.
 
         """
-        raise NotImplementedError("Your loader class must implement a load method")
+        raise NotImplementedError("Your loader class must implement an iter_results method")
 
     # TODO: Decide if we can remove this.
     def jurisdiction_mappings(self, headers):
@@ -108,17 +281,25 @@ class BaseLoader(StateBase):
         This dictionary can be used to specify some of the keyword
         arguments when constructing new RawResult records in a
         load implementation.
+
+        The fields are computed once per file, in ``self.context``.  This
+        returns a copy that can be modified.
+        """
+        return self.context.result_kwargs()
+
+    def _build_election_metadata(self):
+        """
+        Returns a dictionary of the Election metadata fields, derived from
+        the OpenElex API.
+
+        This is relatively slow, so use the metadata in ``self.context``
+        rather than calling this for each result.
         """
         year = int(re.search(r'\d{4}', self.election_id).group())
         elecs = self.datasource.elections(year)[year]
         # Get election metadata by matching on election slug
         elec_meta = [e for e in elecs if e['slug'] == self.election_id][0]
         kwargs = {
-            'created':  self.timestamp,
-            'updated': self.timestamp,
-            'source': self.source,
-            'election_id': self.election_id,
-            'state': self.state.upper(),
             'start_date': datetime.datetime.strptime(elec_meta['start_date'], "%Y-%m-%d"),
             'end_date': datetime.datetime.strptime(elec_meta['end_date'], "%Y-%m-%d"),
             'election_type': elec_meta['race_type'],
@@ -127,3 +308,166 @@ class BaseLoader(StateBase):
             'special': elec_meta['special'],
         }
         return kwargs
+
+
+def strip(value):
+    """Default cleaner for a Column's values"""
+    return value.strip()
+
+
+class Column(object):
+    """
+    Declares the data file column that a RawResult field is loaded from.
+
+    Arguments:
+
+    * field - Name of the RawResult field.
+    * names - Name of the column, or a tuple of alternative names for data
+      files with different headers.  The first name found in a file's
+      header is used.
+    * clean - Function that takes the column's value and returns the
+      field's value.  Defaults to stripping leading and trailing
+      whitespace.  Use None to load the value as is.
+    * required - If False, files without the column are loaded without the
+      field instead of raising a ValueError.
+
+    """
+
+    def __init__(self, field, names, clean=strip, required=True):
+        if isinstance(names, basestring):
+            names = (names,)
+        self.field = field
+        self.names = tuple(names)
+        self.clean = clean
+        self.required = required
+
+    def position(self, columns):
+        """
+        Returns the position of this column, given a dictionary mapping a
+        file's column names to their positions.
+        """
+        for name in self.names:
+            if name in columns:
+                return columns[name]
+        if self.required:
+            raise ValueError("Data file has no %s column" %
+                " or ".join(repr(name) for name in self.names))
+        return None
+
+
+class ColumnLoader(BaseLoader):
+    """
+    Base class for loaders of delimited text files that declare how the
+    file's columns map to RawResult fields, instead of building each
+    result by hand.
+
+    Subclasses set ``columns`` to a list of Column instances, and can set
+    ``target_field`` to skip results whose value for that field isn't in
+    the loader's ``target_offices``.  For example::
+
+        class XXLoader(ColumnLoader):
+            datasource = Datasource()
+            target_offices = set(['Governor', 'State Senate'])
+            target_field = 'office'
+            columns = [
+                Column('office', 'Office'),
+                Column('full_name', ('Candidate Name', 'Candidate')),
+                Column('votes', 'Votes', clean=int),
+            ]
+
+    When a file is loaded, the columns are looked up in its header once and
+    compiled into a function that converts a row, read with
+    ``unicodecsv.reader``, to a dictionary of RawResult fields using the
+    positions of the columns.
+
+    Override ``file_kwargs()`` to add fields that are the same for every
+    result in a file, ``skip_result()`` for other rules about which rows to
+    load and ``prepare_result()`` to set fields derived from other fields.
+
+    """
+    columns = []
+    """List of Column instances"""
+
+    target_field = None
+    """Field whose value has to be in ``target_offices`` to load a result"""
+
+    delimiter = ','
+    encoding = 'latin-1'
+
+    fieldnames = None
+    """Column names for data files that don't have a header row"""
+
+    def iter_results(self):
+        with self._file_handle as csvfile:
+            reader = unicodecsv.reader(csvfile, delimiter=self.delimiter,
+                encoding=self.encoding)
+            if self.fieldnames is not None:
+                header = self.fieldnames
+            else:
+                try:
+                    header = next(reader)
+                except StopIteration:
+                    return
+            convert = self.compile_converter(header)
+            for row in reader:
+                # Skip blank lines, like csv.DictReader does
+                if not row:
+                    continue
+                result = convert(row)
+                if result is not None:
+                    yield result
+
+    def compile_converter(self, header):
+        """
+        Returns a function that converts a row of a data file with the given
+        header to a dictionary of RawResult fields, or None if the row
+        should be skipped.
+        """
+        columns = self.context.resolve_columns(header)
+        plan = []
+        for column in self.columns:
+            i = column.position(columns)
+            if i is not None:
+                plan.append((column.field, i, column.clean))
+        width = max(i for field, i, clean in plan) + 1 if plan else 0
+        padding = [u''] * width
+        common = self.context.result_kwargs(**self.file_kwargs())
+        skip = self.skip_result
+        prepare = self.prepare_result
+
+        def convert(row):
+            if len(row) < width:
+                # Missing trailing values are empty, rather than an error
+                row = row + padding[len(row):]
+            result = common.copy()
+            for field, i, clean in plan:
+                value = row[i]
+                result[field] = clean(value) if clean is not None else value
+            if skip(result):
+                return None
+            return prepare(result)
+
+        return convert
+
+    def file_kwargs(self):
+        """
+        Returns a dictionary of RawResult fields, besides the election
+        fields in ``self.context``, that are the same for every result in
+        the data file.
+        """
+        return {}
+
+    def skip_result(self, result):
+        """Should the result built from a row be skipped?"""
+        if self.target_field is None:
+            return False
+        return result.get(self.target_field) not in self.target_offices
+
+    def prepare_result(self, result):
+        """
+        Returns the finished dictionary of RawResult fields for a result
+        that won't be skipped.
+
+        By default, the result is returned unchanged.
+        """
+        return result
@@ -0,0 +1,141 @@
+"""
+Connections to the MongoDB data store.
+
+Connection settings come from the ``MONGO`` dictionary in
+``openelex/settings.py``.  In addition to the host, port and credentials,
+each database's settings can include these driver options:
+
+* maxPoolSize - Maximum number of connections in the pool.
+* connectTimeoutMS - How long to wait when opening a connection.
+* socketTimeoutMS - How long to wait for a response to an operation.
+* w, j, wtimeout - Default write concern.
+
+Write concerns for particular operations, like inserting raw results, can
+be set in ``MONGO_WRITE_CONCERNS`` and looked up with ``write_concern()``.
+
+pymongo connections can't be shared across a fork.  Processes started with
+multiprocessing call ``reconnect()`` automatically, so MongoEngine opens a
+new connection the first time a document is used in the child.  After a
+bare ``os.fork()``, call ``reconnect()`` in the child.  pymongo's own pool
+also discards sockets inherited from another process.
+
+"""
+from multiprocessing import util
+import os
+
+import pymongo
+from mongoengine import connection
+from mongoengine.base.common import _document_registry
+
+_registered = None
+"""Name of the database the default connection is registered for"""
+
+_pid = None
+"""ID of the process the default connection was registered in"""
+
+
+def connection_settings(name):
+    """
+    Returns the keyword arguments used to register the connection to a
+    database.
+    """
+    from openelex import settings
+
+    conn_settings = dict(settings.MONGO[name])
+    if pymongo.version_tuple[0] < 3 and 'maxPoolSize' in conn_settings:
+        # Older drivers call this max_pool_size
+        conn_settings['max_pool_size'] = conn_settings.pop('maxPoolSize')
+    return conn_settings
+
+
+def write_concern(operation):
+    """
+    Returns the write concern keyword arguments configured for an operation,
+    for example "load".
+
+    An empty dictionary, which uses the connection's default write concern,
+    is returned if there isn't a setting for the operation.
+    """
+    from openelex import settings
+
+    return dict(getattr(settings, 'MONGO_WRITE_CONCERNS', {}).get(operation,
+        {}))
+
+
+def _forget_collections():
+    # Documents cache their collection, which holds a reference to the
+    # connection.
+    for doc_cls in _document_registry.values():
+        if not doc_cls._meta.get('abstract'):
+            doc_cls._collection = None
+
+
+def init_db(name='openelex', lazy=False):
+    """
+    Configure the default connection to a database.
+
+    Arguments:
+
+    * name - Key of the database's settings in ``settings.MONGO``.
+    * lazy - If True, don't connect until the database is first used.
+
+    Returns the pymongo Database object, or None if ``lazy`` is True.
+
+    Raises mongoengine.ConnectionError if the database can't be reached and
+    ``lazy`` is False.
+    """
+    global _registered, _pid
+
+    if _registered != name:
+        connection._connections.pop(connection.DEFAULT_CONNECTION_NAME, None)
+        connection._dbs.pop(connection.DEFAULT_CONNECTION_NAME, None)
+        _forget_collections()
+        connection.register_connection(connection.DEFAULT_CONNECTION_NAME,
+            name, **connection_settings(name))
+        _registered = name
+        _pid = os.getpid()
+
+    if lazy:
+        return None
+
+    return get_db()
+
+
+def reconnect():
+    """
+    Forget connections inherited from a parent process.
+
+    The next database operation opens a new connection.  This runs in every
+    process started with multiprocessing, before a pool's ``initializer``.
+    """
+    global _pid
+
+    # Don't disconnect the inherited clients.  Their sockets are shared
+    # with the parent process.
+    connection._connections.clear()
+    connection._dbs.clear()
+    _forget_collections()
+    _pid = os.getpid()
+
+
+class _AfterFork(object):
+    pass
+
+
+_after_fork = _AfterFork()
+"""Key for the multiprocessing after-fork hook, which is held weakly"""
+
+# Documents, querysets and switch_collection look up connections through
+# MongoEngine's caches rather than ``get_db()``, so clear the caches as soon
+# as a child process starts.
+util.register_after_fork(_after_fork, lambda obj: reconnect())
+
+
+def get_db():
+    """
+    Returns the pymongo Database object for the default connection,
+    reconnecting first if this process was forked after connecting.
+    """
+    if _pid is not None and _pid != os.getpid():
+        reconnect()
+    return connection.get_db()
@@ -0,0 +1,43 @@
+"""
+Helpers for MongoDB aggregation pipelines.
+"""
+
+
+def iter_aggregate(collection, pipeline, batch_size=1000):
+    """
+    Run an aggregation pipeline and iterate through the results.
+
+    This issues the aggregate and getMore commands directly, rather than
+    using ``Collection.aggregate()``, because older versions of pymongo
+    return the aggregation results as a single document, which limits the
+    size of the results and holds them all in memory.
+
+    Args:
+        collection: pymongo Collection object.
+        pipeline (list): Aggregation pipeline stages.
+        batch_size (int): Number of results to retrieve at a time.
+
+    Returns:
+        A generator that yields result documents.
+
+    """
+    db = collection.database
+    response = db.command('aggregate', collection.name, pipeline=pipeline,
+        allowDiskUse=True, cursor={'batchSize': batch_size})
+    cursor = response['cursor']
+    cursor_id = cursor['id']
+    try:
+        for doc in cursor['firstBatch']:
+            yield doc
+
+        while cursor_id:
+            response = db.command('getMore', cursor_id,
+                collection=collection.name, batchSize=batch_size)
+            cursor = response['cursor']
+            cursor_id = cursor['id']
+            for doc in cursor['nextBatch']:
+                yield doc
+    finally:
+        if cursor_id:
+            # The generator was closed before all the results were read.
+            db.command('killCursors', collection.name, cursors=[cursor_id])
@@ -0,0 +1,336 @@
+"""
+Index management and a query-pattern audit.
+
+The compound indexes declared in the ``meta`` of the models in
+``openelex.models`` are derived from the queries issued when loading,
+transforming, validating and baking results.  This module keeps a registry
+of those queries so they can be run through ``explain()`` to make sure
+MongoDB actually uses an index to answer them.
+
+"""
+from contextlib import contextmanager
+
+from openelex.models import (Candidate, Contest, Election, Office, Party,
+    Person, RawResult, Result)
+
+DOCUMENTS = [Office, Party, Person, Election, RawResult, Contest, Candidate,
+    Result]
+"""Documents whose indexes are managed by ``ensure_indexes()``"""
+
+BUILD_FAILURE_HELP = ("Remove the duplicate documents and run "
+    "'invoke db.indexes --drop'.")
+"""
+What to do when an index can't be built because of duplicate keys or
+because an existing index with the same keys has different options
+"""
+
+SCAN_RATIO_THRESHOLD = 10
+"""
+Flag queries that examine more than this many documents for each document
+they return.
+"""
+
+
+class IndexedQuery(object):
+    """A known query pattern that should be answered by an index"""
+
+    def __init__(self, name, document, query, index=None):
+        """
+        Arguments:
+
+        * name - Short, descriptive name of the query.
+        * document - MongoEngine Document class that is queried.
+        * query - Dictionary of keyword arguments passed to the document's
+          ``objects.filter()`` or a callable that returns a QuerySet.
+        * index - Optional name of the index that is expected to be used,
+          for example "election_id_1_slug_1".
+
+        """
+        self.name = name
+        self.document = document
+        self.query = query
+        self.index = index
+
+    def queryset(self):
+        if callable(self.query):
+            return self.query()
+
+        return self.document.objects.filter(**self.query)
+
+    def explain(self):
+        return self.queryset().explain()
+
+    def audit(self):
+        """
+        Run the query through ``explain()`` and return a tuple of a plan
+        summary and a list of problems with the plan.
+        """
+        plan = summarize_plan(self.explain())
+        return plan, check_plan(plan, self.index)
+
+
+QUERIES = []
+"""Registry of IndexedQuery objects checked by ``audit()``"""
+
+
+def register_query(name, document, query, index=None):
+    """Add a query pattern to the registry that is audited"""
+    indexed_query = IndexedQuery(name, document, query, index)
+    QUERIES.append(indexed_query)
+    return indexed_query
+
+
+def _bake_query(roller_cls, collection, **filter_kwargs):
+    """
+    Returns a callable that builds the query a bake roller would run against
+    a collection.
+    """
+    def query():
+        # Import here to avoid importing the bake machinery every time the
+        # registry is loaded.
+        from openelex.base import bake
+        roller = getattr(bake, roller_cls)()
+        roller._reset_querysets()
+        q = roller.build_filters(**filter_kwargs)[collection]
+        return roller._querysets[collection](q)
+
+    return query
+
+
+register_query("load: delete previously loaded raw results", RawResult,
+    {'source': '20121106__md__general__precinct.csv'}, 'source_1')
+register_query("transform: raw results by election and level", RawResult,
+    {'state': 'MD', 'election_id': 'md-2012-11-06-general',
+     'reporting_level': 'precinct'},
+    'state_1_election_id_1_reporting_level_1')
+register_query("transform: raw results for a candidate", RawResult,
+    {'election_id': 'md-2012-11-06-general', 'contest_slug': 'president',
+     'candidate_slug': 'barack_obama'},
+    'election_id_1_contest_slug_1_candidate_slug_1')
+register_query("transform: contest by election and slug", Contest,
+    {'election_id': 'md-2012-11-06-general', 'slug': 'president'},
+    'election_id_1_slug_1')
+register_query("transform: candidate by election, contest and slug",
+    Candidate,
+    {'election_id': 'md-2012-11-06-general', 'contest_slug': 'president',
+     'slug': 'obama-barack'},
+    'election_id_1_contest_slug_1_slug_1')
+register_query("validate: results for a candidate", Result,
+    {'election_id': 'md-2012-11-06-general', 'reporting_level': 'county',
+     'contest_slug': 'president', 'candidate_slug': 'obama-barack'},
+    'election_id_1_reporting_level_1_contest_slug_1_candidate_slug_1')
+register_query("bake raw: raw results for a date", RawResult,
+    _bake_query('RawResultRoller', 'raw_result', state='md',
+        datefilter='20121106', reporting_level='precinct'),
+    'state_1_start_date_1_reporting_level_1')
+register_query("bake: contests for a date", Contest,
+    _bake_query('ResultRoller', 'contest', state='md',
+        datefilter='20121106'),
+    'state_1_start_date_1')
+register_query("bake: candidates for a date", Candidate,
+    _bake_query('ResultRoller', 'candidate', state='md',
+        datefilter='20121106'),
+    'state_1_election_id_1')
+register_query("bake: results for a date", Result,
+    _bake_query('ResultRoller', 'result', state='md', datefilter='20121106',
+        reporting_level='precinct'),
+    'state_1_election_id_1_reporting_level_1')
+register_query("bake: results for an election type", Result,
+    _bake_query('ResultRoller', 'result', state='md', datefilter='2012',
+        election_type='general', reporting_level='precinct'),
+    'state_1_election_id_1_reporting_level_1')
+
+
+def _iter_stages(stage):
+    """Yield a query plan stage and all of its input stages"""
+    while stage:
+        yield stage
+        for child in stage.get('inputStages', []):
+            for s in _iter_stages(child):
+                yield s
+        stage = stage.get('inputStage')
+
+
+def summarize_plan(explain):
+    """
+    Summarize the output of ``explain()``.
+
+    Both the legacy explain format, returned by MongoDB < 3.0, and the
+    ``queryPlanner``/``executionStats`` format are supported.
+
+    Returns a dictionary with the following keys:
+
+    * collscan - True if the query scanned the whole collection.
+    * indexes - List of the names of the indexes used by the query.
+    * examined - Number of documents examined.
+    * returned - Number of documents returned.
+
+    """
+    if 'queryPlanner' in explain:
+        stages = list(_iter_stages(explain['queryPlanner']['winningPlan']))
+        stats = explain.get('executionStats', {})
+        return {
+            'collscan': any(s['stage'] == 'COLLSCAN' for s in stages),
+            'indexes': [s['indexName'] for s in stages if 'indexName' in s],
+            'examined': stats.get('totalDocsExamined', 0),
+            'returned': stats.get('nReturned', 0),
+        }
+
+    # Legacy format.  Queries with $or clauses report a plan for each clause.
+    plans = explain.get('clauses', [explain])
+    indexes = []
+    collscan = False
+    for plan in plans:
+        cursor = plan['cursor']
+        if cursor.startswith('BasicCursor'):
+            collscan = True
+        else:
+            # Cursor names look like "BtreeCursor state_1_election_id_1"
+            indexes.append(cursor.split(' ')[1])
+
+    return {
+        'collscan': collscan,
+        'indexes': indexes,
+        'examined': explain.get('nscannedObjects', explain.get('nscanned', 0)),
+        'returned': explain.get('n', 0),
+    }
+
+
+def check_plan(plan, index=None):
+    """
+    Returns a list of strings describing problems with a query plan
+    summarized by ``summarize_plan()``.
+    """
+    problems = []
+    if plan['collscan']:
+        problems.append("collection scan")
+    if index and plan['indexes'] and index not in plan['indexes']:
+        problems.append("used index %s instead of %s" %
+            (', '.join(plan['indexes']), index))
+    if plan['examined'] > max(plan['returned'], 1) * SCAN_RATIO_THRESHOLD:
+        problems.append("examined %d documents to return %d" %
+            (plan['examined'], plan['returned']))
+    return problems
+
+
+def raw_collection(document):
+    """
+    Returns the pymongo collection for a document without building the
+    document's indexes.
+
+    MongoEngine builds the declared indexes the first time it looks up a
+    document's collection, which fails when a new unique index conflicts
+    with an existing index or with duplicate documents.  Use this to
+    inspect or drop indexes before building them.
+    """
+    return document._get_db()[document._get_collection_name()]
+
+
+def ensure_indexes(documents=None):
+    """
+    Build any indexes declared in the documents' meta that don't already
+    exist.
+
+    Returns a dictionary mapping collection names to the index information
+    for the collection.
+    """
+    if documents is None:
+        documents = DOCUMENTS
+
+    info = {}
+    for doc in documents:
+        doc.ensure_indexes()
+        info[doc._get_collection_name()] = \
+            raw_collection(doc).index_information()
+    return info
+
+
+@contextmanager
+def deferred_indexes(document, keep=()):
+    """
+    Drop a document's secondary indexes while a block runs and rebuild them
+    when it finishes.
+
+    Building an index once over a full collection is much cheaper than
+    updating it on every insert, so this is meant to wrap bulk loads.  The
+    indexes are rebuilt even if the block raises an exception.
+
+    Arguments:
+
+    * document - MongoEngine Document class.
+    * keep - Names of indexes that shouldn't be dropped because queries in
+      the block need them, for example "source_1".
+
+    Yields a list of the names of the dropped indexes.
+    """
+    collection = raw_collection(document)
+    keep = set(keep)
+    keep.add('_id_')
+    dropped = sorted(name for name in collection.index_information()
+                     if name not in keep)
+    for name in dropped:
+        collection.drop_index(name)
+
+    # Don't let MongoEngine rebuild the indexes if the collection is
+    # looked up again during the block.
+    auto_create_index = document._meta.get('auto_create_index', True)
+    document._meta['auto_create_index'] = False
+    try:
+        yield dropped
+    finally:
+        document._meta['auto_create_index'] = auto_create_index
+        document.ensure_indexes()
+
+
+def declared_indexes(document):
+    """
+    Returns a dictionary mapping the names MongoDB gives the indexes
+    declared in a document's meta, for example "state_1_start_date_1", to
+    whether the index is unique.
+    """
+    declared = {'_id_': False}
+    for spec in document._meta['index_specs']:
+        name = '_'.join('%s_%s' % (field, direction)
+            for field, direction in spec['fields'])
+        declared[name] = spec.get('unique', False)
+    return declared
+
+
+def undeclared_indexes(documents=None):
+    """
+    Returns a dictionary mapping documents to a list of the names of
+    indexes that exist in the database but are no longer declared in the
+    document's meta.
+
+    An index that was declared unique after it was built counts as
+    undeclared, because it has to be dropped before it can be rebuilt.
+    """
+    if documents is None:
+        documents = DOCUMENTS
+
+    undeclared = {}
+    for doc in documents:
+        declared = declared_indexes(doc)
+        existing = raw_collection(doc).index_information()
+        # Undeclared names aren't in ``declared``, so they never match
+        names = sorted(name for name, info in existing.items()
+                       if declared.get(name) != info.get('unique', False))
+        if names:
+            undeclared[doc] = names
+    return undeclared
+
+
+def audit(queries=None):
+    """
+    Explain each registered query.
+
+    Returns a list of (IndexedQuery, plan summary, problems) tuples.
+    """
+    if queries is None:
+        queries = QUERIES
+
+    results = []
+    for query in queries:
+        plan, problems = query.audit()
+        results.append((query, plan, problems))
+    return results
@@ -1,13 +1,21 @@
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from openelex.lib.indexes import BUILD_FAILURE_HELP
+
+
 class BulkInsertBuffer(object):
-    def __init__(self, doc_cls, maxsize=1000):
+    def __init__(self, doc_cls, maxsize=1000, insert=None):
         """
         Arguments:
 
         * doc_cls - MongoEngine Document class
         * maxsize - Maximum items in buffer. Default is 1000. 
+        * insert - Optional callable that takes a list of items and stores
+          them.  Default is to insert them with the document's queryset.
         """
         self._doc_cls = doc_cls
         self._maxsize = maxsize
+        self._insert = insert
         self._items = []
         self._count = 0
 
@@ -19,7 +27,10 @@ class BulkInsertBuffer(object):
 
     def flush(self):
         if len(self._items):
-            self._doc_cls.objects.insert(self._items, load_bulk=False)
+            if self._insert is None:
+                self._doc_cls.objects.insert(self._items, load_bulk=False)
+            else:
+                self._insert(self._items)
             self._items = []
 
     def __len__(self):
@@ -27,3 +38,49 @@ class BulkInsertBuffer(object):
 
     def count(self):
         return self._count
+
+
+def insert_unique(doc_cls, docs):
+    """
+    Insert documents into a collection with a unique index, skipping any
+    that have the same key as an existing document or as another document
+    in the batch.
+
+    Arguments:
+
+    * doc_cls - MongoEngine Document class
+    * docs - List of unsaved instances of ``doc_cls``
+
+    Returns a list of the documents that weren't inserted because their
+    key was a duplicate.
+
+    The document's indexes are built first, because documents with unique
+    keys don't build them automatically.  Raises OperationFailure if the
+    unique index can't be built because the collection already has
+    duplicates.
+    """
+    if not docs:
+        return []
+
+    try:
+        doc_cls.ensure_indexes()
+    except OperationFailure as e:
+        raise OperationFailure("Couldn't build the unique indexes on %s: %s. "
+            "%s" % (doc_cls._get_collection_name(), e, BUILD_FAILURE_HELP))
+
+    collection = doc_cls._get_collection()
+    raw = [doc.to_mongo() for doc in docs]
+    try:
+        # Keep inserting the rest of the batch after a duplicate
+        collection.insert(raw, continue_on_error=True)
+    except DuplicateKeyError:
+        pass
+    else:
+        return []
+
+    # The driver sets the _id of each document before sending it, so the
+    # duplicates are the documents whose _id wasn't stored.
+    ids = [son['_id'] for son in raw]
+    inserted = set(son['_id'] for son in
+                   collection.find({'_id': {'$in': ids}}, {'_id': 1}))
+    return [doc for doc, son in zip(docs, raw) if son['_id'] not in inserted]
@@ -0,0 +1,103 @@
+"""
+Lightweight, read-only records for documents.
+
+Building MongoEngine documents is slow.  Each one converts every field,
+fires the ``post_init`` signal and may dereference related documents.  Code
+that only reads a few fields, like validators and bulk transforms, can use
+``iter_records()`` to get namedtuples built straight from the pymongo cursor
+instead.
+
+Example::
+
+    results = Result.objects.filter(election_id='md-2012-11-06-general')
+    for result in iter_records(results, 'id', 'jurisdiction', 'votes'):
+        print result.jurisdiction, result.votes
+
+"""
+from collections import namedtuple
+
+_record_types = {}
+
+
+def record_type(document, fields):
+    """
+    Returns a namedtuple class for records of a document with the given
+    fields.
+    """
+    key = (document, tuple(fields))
+    try:
+        return _record_types[key]
+    except KeyError:
+        pass
+
+    cls = namedtuple(document.__name__ + 'Record', fields)
+    _record_types[key] = cls
+    return cls
+
+
+def _db_field(document, name):
+    if name in ('id', 'pk'):
+        return '_id'
+
+    return document._fields[name].db_field
+
+
+def iter_records(queryset, *fields, **kwargs):
+    """
+    Iterate through the documents matching a queryset as namedtuples.
+
+    Only the requested fields are retrieved from the data store.  Values
+    are the raw values stored in the data store, so reference fields are
+    ObjectIds rather than documents.  The queryset's filters, ordering,
+    skip and limit are respected.
+
+    Arguments:
+
+    * queryset - MongoEngine QuerySet.
+    * fields - Names of the fields to include in each record.  Use 'id'
+      for the primary key.
+    * batch_size - Optional number of documents to request from the data
+      store at a time.  Default is 1000.
+
+    """
+    if queryset._none:
+        return
+
+    batch_size = kwargs.get('batch_size', 1000)
+    document = queryset._document
+    db_fields = [_db_field(document, name) for name in fields]
+    projection = dict((db_field, 1) for db_field in db_fields)
+    if '_id' not in projection:
+        projection['_id'] = 0
+
+    cursor = queryset._collection.find(queryset._query, projection)
+    if queryset._ordering:
+        cursor.sort(queryset._ordering)
+    if queryset._skip:
+        cursor.skip(queryset._skip)
+    if queryset._limit:
+        cursor.limit(queryset._limit)
+    cursor.batch_size(batch_size)
+
+    make = record_type(document, fields)._make
+    for doc in cursor:
+        yield make([doc.get(db_field) for db_field in db_fields])
+
+
+def get_record(queryset, *fields, **query):
+    """
+    Returns a single record matching a queryset and filters.
+
+    Like ``QuerySet.get()``, this raises the document's DoesNotExist or
+    MultipleObjectsReturned exceptions if there isn't exactly one matching
+    document.
+    """
+    document = queryset._document
+    records = list(iter_records(queryset.filter(**query).limit(2), *fields))
+    if not records:
+        raise document.DoesNotExist("%s matching query does not exist." %
+            document._class_name)
+    if len(records) > 1:
+        raise document.MultipleObjectsReturned(
+            "2 or more items returned, instead of 1")
+    return records[0]
@@ -0,0 +1,199 @@
+"""
+Build documents' SON straight from dictionaries of field values.
+
+Instantiating a MongoEngine document for every row of a large results file,
+only to convert it back to SON to insert it, is slow.  A ``SONBuilder``
+compiles a document's field definitions into a list of converters once and
+then builds the same SON that ``Document(**values).to_mongo()`` would.
+
+Values are checked the way ``Document.validate()`` checks them for required
+fields, choices, string lengths and integer fields, except that empty
+strings are allowed for fields with choices.  Other fields are only
+converted.
+
+Example::
+
+    build = SONBuilder(RawResult)
+    son = build({'election_id': 'md-2012-11-06-general', 'votes': '10', ...})
+
+"""
+from bson import SON
+from mongoengine import ValidationError
+from mongoengine.fields import DynamicField, IntField, StringField
+
+
+def _choices_check(field):
+    choices = field.choices
+    if isinstance(choices[0], (list, tuple)):
+        choices = [k for k, v in choices]
+    allowed = set(choices)
+    message = 'Value must be one of %s' % unicode(list(choices))
+
+    def check(value):
+        # Data files and the metadata API use empty strings for missing
+        # values, e.g. the primary type of a general election.
+        if value == '':
+            return
+        try:
+            ok = value in allowed
+        except TypeError:
+            ok = False
+        if not ok:
+            field.error(message)
+
+    return check
+
+
+def _string_check(field):
+    max_length = field.max_length
+    min_length = field.min_length
+    regex = field.regex
+
+    def check(value):
+        if not isinstance(value, basestring):
+            field.error('StringField only accepts string values')
+        if max_length is not None and len(value) > max_length:
+            field.error('String value is too long')
+        if min_length is not None and len(value) < min_length:
+            field.error('String value is too short')
+        if regex is not None and regex.match(value) is None:
+            field.error('String value did not match validation regex')
+
+    return check
+
+
+def _int_check(field):
+    min_value = field.min_value
+    max_value = field.max_value
+
+    def check(value):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            field.error('%s could not be converted to int' % value)
+        if min_value is not None and value < min_value:
+            field.error('Integer value is too small')
+        if max_value is not None and value > max_value:
+            field.error('Integer value is too large')
+
+    return check
+
+
+def _to_unicode(value):
+    # Same as StringField.to_python()
+    if isinstance(value, unicode):
+        return value
+    try:
+        return value.decode('utf-8')
+    except (AttributeError, UnicodeDecodeError):
+        return value
+
+
+def _to_int(value):
+    # Same as IntField.to_python(), which the value has already been
+    # checked against.
+    return int(value)
+
+
+def _compile_field(field):
+    """
+    Returns a tuple of a function that checks a value for a field and a
+    function that converts it to its SON representation.
+    """
+    checks = []
+    if field.choices:
+        checks.append(_choices_check(field))
+
+    if isinstance(field, StringField):
+        checks.append(_string_check(field))
+        convert = _to_unicode
+    elif isinstance(field, IntField):
+        checks.append(_int_check(field))
+        convert = _to_int
+    else:
+        convert = field.to_mongo
+
+    if not checks:
+        check = None
+    elif len(checks) == 1:
+        check = checks[0]
+    else:
+        def check(value):
+            for c in checks:
+                c(value)
+
+    return check, convert
+
+
+class SONBuilder(object):
+    """
+    Builds the SON for documents of a class from dictionaries of field
+    values, without instantiating the documents.
+
+    Signals aren't sent, so anything a document's signal handlers would set
+    has to be in the values.
+    """
+
+    def __init__(self, document):
+        self._class_name = document._class_name
+        self._dynamic = document._dynamic
+        self._dynamic_field = DynamicField()
+        self._fields = []
+        for name in document._fields_ordered:
+            field = document._fields[name]
+            check, convert = _compile_field(field)
+            self._fields.append((name, field.db_field, field.default,
+                field.required, check, convert))
+        self._names = frozenset(document._fields_ordered)
+
+    def __call__(self, values):
+        """
+        Returns the SON for a document with the given field values.
+
+        Raises a mongoengine ValidationError, with an error for each invalid
+        field, if any of the values are invalid.
+        """
+        son = SON()
+        errors = None
+        for name, db_field, default, required, check, convert in self._fields:
+            if name in values:
+                value = values[name]
+            elif callable(default):
+                value = default()
+            else:
+                value = default
+
+            if value is None:
+                if required:
+                    if errors is None:
+                        errors = {}
+                    errors[name] = ValidationError('Field is required',
+                        field_name=name)
+                continue
+
+            if check is not None:
+                try:
+                    check(value)
+                except ValidationError as error:
+                    if errors is None:
+                        errors = {}
+                    errors[name] = error
+                    continue
+
+            son[db_field] = convert(value)
+
+        if errors:
+            raise ValidationError("ValidationError (%s:None) " %
+                self._class_name, errors=errors)
+
+        if self._dynamic:
+            to_mongo = self._dynamic_field.to_mongo
+            for name, value in values.iteritems():
+                if value is not None and name not in self._names:
+                    son[name] = to_mongo(value)
+
+        return son
+
+    def build_many(self, rows):
+        """Returns a list of the SON for each dictionary of values"""
+        return [self(values) for values in rows]
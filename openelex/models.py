@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from mongoengine import Document, DynamicDocument
+from mongoengine.context_managers import switch_collection
 from mongoengine.fields import (
     BooleanField,
     DateTimeField,
@@ -12,7 +13,9 @@ from mongoengine.fields import (
 )
 from mongoengine.queryset import CASCADE
 from mongoengine import signals
+from pymongo.errors import DuplicateKeyError
 
+from openelex.lib.son import SONBuilder
 from openelex.lib.text import slugify
 from openelex.us import STATE_POSTALS
 
@@ -89,6 +92,109 @@ class TimestampMixin(object):
 
 # Models
 
+class Election(Document):
+    """
+    Metadata shared by every raw result loaded for an election.
+
+    Loaders running in compact mode store the metadata once, in one of
+    these documents, instead of copying it to every RawResult.  Compact raw
+    results are rehydrated from a per-process cache of these documents
+    when they're read from the data store.
+
+    RawResult and Result refer to their Election by ``election_id``, which
+    is the Election's primary key, rather than through a ReferenceField.
+    Their fields also keep their existing database names.  Renaming them
+    would mean migrating stored results and every query that uses the
+    names.
+    """
+    METADATA_FIELDS = (
+        'start_date',
+        'end_date',
+        'election_type',
+        'primary_type',
+        'result_type',
+        'special',
+    )
+    """Fields omitted from compact RawResult records"""
+
+    election_id = StringField(primary_key=True, help_text="election id, e.g. md-2012-11-06-general")
+    state = StringField(required=True, choices=STATE_POSTALS)
+    start_date = DateTimeField(required=True)
+    end_date = DateTimeField(required=True, help_text="Most often will match start date, except for multi-day primaries")
+    election_type = StringField(help_text="general, primary, etc. from OpenElex metadata")
+    primary_type = StringField(choices=PRIMARY_TYPE_CHOICES, help_text="blanket, closed, open, etc. from OpenElex metadata")
+    result_type = StringField(required=True, help_text="certified/unofficial, from Openelex metadata")
+    special = BooleanField(default=False, help_text="From OpenElex metadata")
+
+    _metadata_cache = {}
+
+    def __unicode__(self):
+        return u'%s' % self.election_id
+
+    @classmethod
+    def metadata(cls, election_id):
+        """
+        Returns a dictionary of the metadata fields for an election.
+
+        The metadata is only read from the data store once per process.
+        An empty dictionary is returned if there is no Election document
+        for the election.  Missing elections aren't cached, because another
+        process might save the Election later.
+        """
+        try:
+            return cls._metadata_cache[election_id]
+        except KeyError:
+            pass
+
+        doc = cls.objects(pk=election_id).as_pymongo().first()
+        if doc is None:
+            return {}
+
+        metadata = {name: doc[name] for name in cls.METADATA_FIELDS
+                    if name in doc}
+        cls._metadata_cache[election_id] = metadata
+        return metadata
+
+    @classmethod
+    def rehydrate(cls, data):
+        """
+        Fill in the metadata fields missing from the raw, dictionary
+        representation of a compact RawResult.
+        """
+        try:
+            election_id = data['election_id']
+        except KeyError:
+            return data
+
+        for name, value in cls.metadata(election_id).items():
+            if name not in data:
+                data[name] = value
+        return data
+
+    @classmethod
+    def clear_cache(cls):
+        cls._metadata_cache.clear()
+
+    def upsert(self):
+        """
+        Create or replace the election's document in a single atomic write.
+
+        Unlike ``save()``, this is safe to call from several processes
+        loading files from the same election at once.
+        """
+        self.validate()
+        son = self.to_mongo()
+        collection = self._get_collection()
+        try:
+            collection.update({'_id': son['_id']}, son, upsert=True)
+        except DuplicateKeyError:
+            # Another process inserted the document between this update
+            # finding no match and inserting one.  It exists now.
+            collection.update({'_id': son['_id']}, son)
+        self.clear_cache()
+        return self
+
+
 class RawResult(TimestampMixin, DynamicDocument):
     """Flat representation of raw data. Intended for use in data loaders."""
     ### META fields ###
@@ -135,10 +241,86 @@ class RawResult(TimestampMixin, DynamicDocument):
     winner = StringField(help_text="Winner flag, if provided in raw results.")
     write_in = StringField(help_text="Write-in flag, if provided in raw results.")
 
+    ### Slugs ###
+    SLUG_FIELDS = ('office', 'district', 'primary_party', 'full_name',
+        'family_name', 'given_name', 'additional_name', 'suffix')
+    """Raw fields that the contest and candidate slugs are built from"""
+
+    contest_slug = StringField(help_text="A slugified version of the raw "
+        "contest information.  This will not neccesarily match the slug on "
+        "canonical Contest records.")
+    candidate_slug = StringField(help_text="A slugified version of the raw "
+        "candidate information.  This will not neccesarily match the slug on "
+        "canonical Candidate records.")
+
     meta = {
-        'indexes': ['election_id', 'end_date', 'primary_type', 'primary_party', 'reporting_level', 'full_name', 'family_name'],
+        'indexes': [
+            'election_id', 'end_date', 'primary_type', 'primary_party',
+            'reporting_level', 'full_name', 'family_name',
+            # Loaders delete previously loaded results for a source file
+            'source',
+            # Baking filters raw results by state, date and level
+            ('state', 'start_date', 'reporting_level'),
+            # Transforms select raw results by state, election and level
+            ('state', 'election_id', 'reporting_level'),
+            # Transforms group raw results by contest and candidate
+            ('election_id', 'contest_slug', 'candidate_slug'),
+        ],
     }
 
+    @classmethod
+    def _from_son(cls, son, *args, **kwargs):
+        # Compact raw results don't store the election metadata
+        if 'start_date' not in son:
+            Election.rehydrate(son)
+        return super(RawResult, cls)._from_son(son, *args, **kwargs)
+
+    def to_compact_mongo(self):
+        """
+        Returns the SON representation of the document without the fields
+        stored on the election's Election document.
+        """
+        return self.compact_son(self.to_mongo())
+
+    @classmethod
+    def compact_son(cls, son):
+        """
+        Remove the fields stored on the election's Election document from a
+        raw result's SON.
+        """
+        for name in Election.METADATA_FIELDS:
+            son.pop(name, None)
+        return son
+
+    _son_builder = None
+
+    @classmethod
+    def build_son(cls, values):
+        """
+        Returns the SON that ``RawResult(**values).to_mongo()`` would,
+        without building the document.
+
+        This is much faster when loading large files.  The values are
+        validated against the field definitions and the slugs are set the
+        same way as when a document is created.
+
+        Raises mongoengine.ValidationError if any of the values are
+        invalid.
+        """
+        if cls._son_builder is None:
+            cls._son_builder = SONBuilder(cls)
+
+        if not values.get('contest_slug') or not values.get('candidate_slug'):
+            contest_slug, candidate_slug = cls.make_slugs(
+                **{name: values.get(name) for name in cls.SLUG_FIELDS})
+            values = dict(values)
+            if contest_slug is not None:
+                values['contest_slug'] = contest_slug
+            if candidate_slug is not None:
+                values['candidate_slug'] = candidate_slug
+
+        return cls._son_builder(values)
+
     def __unicode__(self):
         bits = (
             self.election_id,
@@ -150,40 +332,116 @@ class RawResult(TimestampMixin, DynamicDocument):
         )
         return u'%s-%s-%s-%s-%s (%s)' % bits
 
-    @property
-    def contest_slug(self):
+    @classmethod
+    def make_contest_slug(cls, **kwargs):
         """
-        A slugified version of the raw contest information.
-
-        This will not neccesarily match the slug on canonical Contest records.
+        Returns a slug suitable for setting self.contest_slug
         """
-        slug = "%s" % slugify(self.office)
-        if self.district:
-            slug += "-%s" % slugify(self.district.lstrip('0'))
-        if self.primary_party:
-            slug += "-%s" % slugify(self.primary_party)
+        slug = "%s" % slugify(kwargs['office'])
+        if kwargs.get('district'):
+            slug += "-%s" % slugify(kwargs['district'].lstrip('0'))
+        if kwargs.get('primary_party'):
+            slug += "-%s" % slugify(kwargs['primary_party'])
         return slug
 
-    @property
-    def candidate_slug(self):
+    @classmethod
+    def make_candidate_slug(cls, **kwargs):
         """
-        A slugified version of the raw candidate information.
-
-        This will not neccesarily match the slug on canonical Candidate records.
+        Returns a slug suitable for setting self.candidate_slug
         """
-        if self.full_name:
-            name = self.full_name
+        if kwargs.get('full_name'):
+            name = kwargs['full_name']
         else:
-            name = self.family_name
-            if self.given_name:
-                name += " %s" % self.given_name
-            if self.additional_name:
-                name += " %s" % self.additional_name
-            if self.suffix:
-                name +=  " %s" % self.suffix
+            name = kwargs['family_name']
+            if kwargs.get('given_name'):
+                name += " %s" % kwargs['given_name']
+            if kwargs.get('additional_name'):
+                name += " %s" % kwargs['additional_name']
+            if kwargs.get('suffix'):
+                name +=  " %s" % kwargs['suffix']
         return slugify(name)
+
+    @classmethod
+    def make_slugs(cls, **kwargs):
+        """
+        Returns a tuple of the contest and candidate slugs for a set of raw
+        contest and candidate fields.
+
+        A slug is None if the fields needed to build it are missing.
+        """
+        contest_slug = candidate_slug = None
+        if kwargs.get('office'):
+            contest_slug = cls.make_contest_slug(**kwargs)
+        if kwargs.get('full_name') or kwargs.get('family_name'):
+            candidate_slug = cls.make_candidate_slug(**kwargs)
+        return contest_slug, candidate_slug
+
+    def update_slugs(self):
+        """
+        Set the contest and candidate slugs from the raw contest and
+        candidate fields.
+        """
+        contest_slug, candidate_slug = self.make_slugs(
+            **{name: getattr(self, name) for name in self.SLUG_FIELDS})
+        if contest_slug is not None:
+            self.contest_slug = contest_slug
+        if candidate_slug is not None:
+            self.candidate_slug = candidate_slug
+
+    @classmethod
+    def post_init(cls, sender, document, **kwargs):
+        # Raw results loaded before the slugs were stored don't have them
+        if not document.contest_slug or not document.candidate_slug:
+            document.update_slugs()
+
+    @classmethod
+    def pre_save(cls, sender, document, **kwargs):
+        document.update_slugs()
+
+    @classmethod
+    def backfill_slugs(cls, batch_size=1000, **filters):
+        """
+        Store the contest and candidate slugs on raw results that were
+        loaded without them.
+
+        Raw results that share slugs are updated together, so this makes
+        far fewer round trips to the data store than saving each record.
+
+        Returns the number of raw results that were updated.
+        """
+        query = cls.objects.filter(contest_slug__exists=False,
+            **filters)._query
+        collection = cls._get_collection()
+        # Query the collection directly.  ``as_pymongo()`` combined with
+        # ``only()`` strips the ``_id`` field that the updates need.
+        qs = collection.find(query,
+            fields={name: 1 for name in cls.SLUG_FIELDS})
+        pending = {}
+        count = 0
+
+        def flush(slugs, ids):
+            collection.update({'_id': {'$in': ids}},
+                {'$set': {
+                    'contest_slug': slugs[0],
+                    'candidate_slug': slugs[1],
+                }}, multi=True)
+
+        for doc in qs:
+            slugs = cls.make_slugs(**doc)
+            ids = pending.setdefault(slugs, [])
+            ids.append(doc['_id'])
+            count += 1
+            if len(ids) >= batch_size:
+                flush(slugs, pending.pop(slugs))
+
+        for slugs, ids in pending.items():
+            flush(slugs, ids)
+
+        return count
     
 signals.pre_save.connect(TimestampMixin.update_timestamp, sender=RawResult)
+signals.pre_save.connect(RawResult.pre_save, sender=RawResult)
+signals.post_init.connect(RawResult.post_init, sender=RawResult)
 
 
 class Office(Document):
@@ -315,8 +573,23 @@ class Contest(TimestampMixin, DynamicDocument):
     primary_party = ReferenceField(Party, help_text="This should only be assigned for closed primaries, where voters must be registered in party to vote in the contest")
     slug = StringField(required=True, help_text="Slugified office name, plus district and party if relevant")
 
+    KEY_FIELDS = ('election_id', 'slug')
+    """Fields that uniquely identify a contest"""
+
     meta = {
-        'indexes': ['election_id',],
+        'indexes': [
+            # Supports the state and date filters used when baking
+            ('state', 'start_date'),
+            # Transforms and validators look up contests by election and
+            # slug.  This also prevents duplicate contests.
+            {'fields': KEY_FIELDS, 'unique': True},
+        ],
+        # The unique index can't be built while a database still has
+        # duplicates from before it was declared, so it's built by
+        # ``insert_unique()`` and the db.indexes task rather than the first
+        # time the collection is used.  This lets the validators find the
+        # duplicates.
+        'auto_create_index': False,
     }
 
     def __unicode__(self):
@@ -324,7 +597,7 @@ class Contest(TimestampMixin, DynamicDocument):
 
     @property
     def key(self):
-        return (self.election_id, self.slug)
+        return tuple(getattr(self, name) for name in self.KEY_FIELDS)
 
     @classmethod
     def make_slug(cls, **kwargs):
@@ -387,8 +660,20 @@ class Candidate(TimestampMixin, DynamicDocument):
                       help_text="Flags to unambiguously identify candidate "
                           "records that represent special non-person candidates."))
 
+    KEY_FIELDS = ('election_id', 'contest_slug', 'slug')
+    """Fields that uniquely identify a candidate"""
+
     meta = {
-        'indexes': ['election_id',],
+        'indexes': [
+            # Supports the state and election ID prefix filters used when
+            # baking
+            ('state', 'election_id'),
+            # Transforms and validators look up candidates by election,
+            # contest and slug.  This also prevents duplicate candidates.
+            {'fields': KEY_FIELDS, 'unique': True},
+        ],
+        # See Contest
+        'auto_create_index': False,
     }
 
     def __unicode__(self):
@@ -412,7 +697,7 @@ class Candidate(TimestampMixin, DynamicDocument):
 
     @property
     def key(self):
-        return (self.election_id, self.contest_slug, self.slug)
+        return tuple(getattr(self, name) for name in self.KEY_FIELDS)
 
     @classmethod
     def post_init(cls, sender, document, **kwargs):
@@ -469,7 +754,15 @@ class Result(TimestampMixin, DynamicDocument):
         
 
     meta = {
-        'indexes': ['election_id',],
+        'indexes': [
+            # Results don't have a start date, so baking filters on a prefix
+            # of the election ID instead.
+            ('state', 'election_id', 'reporting_level'),
+            # Transforms and validators filter results for an election by
+            # reporting level, contest and candidate
+            ('election_id', 'reporting_level', 'contest_slug',
+                'candidate_slug'),
+        ],
     }
 
     def __unicode__(self):
@@ -505,3 +798,64 @@ class Result(TimestampMixin, DynamicDocument):
 
 signals.pre_save.connect(TimestampMixin.update_timestamp, sender=Result)
 signals.post_init.connect(Result.post_init, sender=Result)
+
+
+# Per-state collections
+
+STATE_COLLECTION_DOCUMENTS = (RawResult, Result)
+"""
+Documents that can be stored in a separate collection for each state.
+"""
+
+
+def state_collection_name(document, state):
+    """
+    Returns the name of the collection that holds a state's documents, for
+    example "raw_result_md".
+    """
+    return "%s_%s" % (document._meta['collection'], state.lower())
+
+
+class state_collections(object):
+    """
+    Context manager that reads and writes documents in per-state collections.
+
+    Instead of sharing the ``raw_result`` and ``result`` collections with
+    every other state, a state's documents are kept in collections like
+    ``raw_result_md``.  Indexes on these collections only cover a single
+    state and a state's results can be removed by dropping its collections.
+
+    Example::
+
+        with state_collections('md'):
+            RawResult.objects.filter(reporting_level='county').count()
+
+    """
+
+    def __init__(self, state, documents=STATE_COLLECTION_DOCUMENTS):
+        self.state = state
+        self.documents = documents
+        self._switches = []
+
+    def __enter__(self):
+        for document in self.documents:
+            switch = switch_collection(document,
+                state_collection_name(document, self.state))
+            switch.__enter__()
+            self._switches.append(switch)
+        return self
+
+    def __exit__(self, t, value, traceback):
+        while self._switches:
+            self._switches.pop().__exit__(t, value, traceback)
+
+
+def drop_state_collections(state, documents=STATE_COLLECTION_DOCUMENTS):
+    """
+    Drop a state's per-state collections.
+
+    This is much faster than deleting a state's documents one at a time.
+    """
+    with state_collections(state, documents):
+        for document in documents:
+            document.drop_collection()
@@ -0,0 +1,133 @@
+"""
+Storage backends.
+
+The operations the loading pipeline performs on the data store, like
+inserting raw results or deleting the results loaded from a file, go through
+a backend so they can run against something other than MongoDB.  Two
+backends are included:
+
+* mongo - MongoDB, through the MongoEngine connection.  This is the default.
+* sqlite - An embedded SQLite database.  Doesn't need a running server,
+  which makes it handy for loading a single state.
+
+The backend is selected with ``STORAGE_BACKEND`` in ``openelex/settings.py``.
+The SQLite database's path is set with ``SQLITE_PATH``.
+
+The SQLite backend is load-only.  Only loading raw results goes through the
+backend, so the transform, validate, bake, db and load_metadata tasks, as
+well as compact raw results and per-state collections, still need MongoDB.
+Those tasks exit with an error when another backend is configured rather
+than silently reading and writing MongoDB.
+
+Backends work with documents as dictionaries shaped like the SON returned by
+``Document.to_mongo()``.  Filters are keyword arguments in the style of
+MongoEngine's ``QuerySet.filter()``, for example
+``source='20121106__md__general__precinct.csv'`` or
+``election_id__startswith='md-2012'``.  The supported operators are an
+exact match, ``in`` and ``startswith``.
+
+"""
+from contextlib import contextmanager
+import os
+
+BACKENDS = {
+    'mongo': 'openelex.storage.mongo.MongoBackend',
+    'sqlite': 'openelex.storage.sqlite.SQLiteBackend',
+}
+"""Map of backend names to the dotted path of their class"""
+
+OPERATORS = ('in', 'startswith')
+"""Filter operators, besides an exact match, that backends support"""
+
+
+def split_filter(name):
+    """
+    Split a filter keyword argument name into a field name and operator.
+
+    The operator is None for an exact match.
+    """
+    parts = name.rsplit('__', 1)
+    if len(parts) == 2 and parts[1] in OPERATORS:
+        return parts[0], parts[1]
+    return name, None
+
+
+class Backend(object):
+    """
+    Base class for storage backends.
+
+    All methods take a MongoEngine Document class, which determines the
+    collection or table that is used.
+    """
+
+    def insert(self, document, docs, **options):
+        """
+        Store a list of dictionaries.
+
+        Documents without an ``_id`` are given one.  Options, such as a write
+        concern, are passed to the MongoDB driver and ignored by backends
+        that don't support them.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def defer_indexes(self, document, keep=()):
+        """
+        Context manager that drops a document's secondary indexes while a
+        bulk write runs and rebuilds them afterwards.
+
+        ``keep`` lists the names of indexes, in MongoDB's format, for
+        example "source_1", that shouldn't be dropped.  Yields a list of the
+        names of the dropped indexes.  By default, indexes are left alone.
+        """
+        yield []
+
+    def count(self, document, **filters):
+        """Returns the number of documents matching the filters"""
+        raise NotImplementedError
+
+    def delete(self, document, **filters):
+        """
+        Delete the documents matching the filters.
+
+        Returns the number of deleted documents, or None if the backend
+        doesn't report it.
+        """
+        raise NotImplementedError
+
+
+_backend = None
+_pid = None
+
+
+def _import_class(path):
+    module_name, cls_name = path.rsplit('.', 1)
+    module = __import__(module_name, fromlist=[cls_name])
+    return getattr(module, cls_name)
+
+
+def backend_name():
+    """Returns the name of the storage backend configured in settings"""
+    from openelex import settings
+    return getattr(settings, 'STORAGE_BACKEND', 'mongo')
+
+
+def get_backend():
+    """
+    Returns the storage backend configured in settings.
+
+    Each process gets its own backend instance because connections can't be
+    shared across a fork.
+    """
+    global _backend, _pid
+
+    if _backend is None or _pid != os.getpid():
+        name = backend_name()
+        try:
+            path = BACKENDS[name]
+        except KeyError:
+            raise ValueError("Unknown storage backend %s.  Choose one of %s" %
+                (name, ", ".join(sorted(BACKENDS))))
+        _backend = _import_class(path)()
+        _pid = os.getpid()
+    return _backend
@@ -0,0 +1,33 @@
+from openelex.lib.indexes import deferred_indexes
+from openelex.storage import Backend
+
+
+class MongoBackend(Backend):
+    """
+    Store documents in MongoDB using the MongoEngine connection.
+
+    Filters are translated to MongoDB queries by MongoEngine, so any filter
+    that works with ``QuerySet.filter()`` works here too.
+    """
+
+    def _query(self, document, filters):
+        return document.objects.filter(**filters)._query
+
+    def insert(self, document, docs, **options):
+        if docs:
+            document._get_collection().insert(docs, **options)
+
+    def defer_indexes(self, document, keep=()):
+        return deferred_indexes(document, keep)
+
+    def count(self, document, **filters):
+        return document._get_collection().find(
+            self._query(document, filters)).count()
+
+    def delete(self, document, **filters):
+        result = document._get_collection().remove(
+            self._query(document, filters))
+        # Unacknowledged writes don't return a result
+        if result:
+            return result['n']
+        return None
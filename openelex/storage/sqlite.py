@@ -0,0 +1,253 @@
+"""
+Embedded SQLite storage backend.
+
+Each collection is stored in a table with a column for the document's ``_id``,
+a column for each field used in an index declared in the document's meta and
+a column holding the whole document as JSON.  The indexes are built on the
+columns, so filters on indexed fields are answered by SQLite.  Filters on
+other fields are applied after decoding the documents.
+
+"""
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import sqlite3
+
+from bson import ObjectId
+
+from openelex.storage import Backend, split_filter
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {'$date': value.strftime(DATETIME_FORMAT)}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+def _object_hook(obj):
+    if len(obj) == 1:
+        if '$date' in obj:
+            return datetime.strptime(obj['$date'], DATETIME_FORMAT)
+        if '$oid' in obj:
+            return ObjectId(obj['$oid'])
+    return obj
+
+
+def encode(doc):
+    """Returns the JSON representation of a document"""
+    return json.dumps(doc, default=_default, separators=(',', ':'))
+
+
+def decode(data):
+    """Returns the document represented by a JSON string"""
+    return json.loads(data, object_hook=_object_hook)
+
+
+def column_value(value):
+    """
+    Convert a field value to a value that can be stored in a column.
+
+    Values are converted so they compare and sort the same way in SQLite as
+    in MongoDB.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (list, dict)):
+        return encode(value)
+    return value
+
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+class Table(object):
+    """A document's table and the fields that have their own column"""
+
+    def __init__(self, document):
+        self.name = document._get_collection_name()
+        self.columns = []
+        self.indexes = []
+        for spec in document._meta['index_specs']:
+            fields = [field for field, direction in spec['fields']]
+            for field in fields:
+                if field != '_id' and field not in self.columns:
+                    self.columns.append(field)
+            # Name indexes the way MongoDB does, e.g. "election_id_1_slug_1"
+            name = '_'.join('%s_%s' % (field, direction)
+                            for field, direction in spec['fields'])
+            self.indexes.append((name, fields, spec.get('unique', False)))
+
+    def index_name(self, name):
+        return '%s__%s' % (self.name, name)
+
+    def create(self, conn):
+        columns = ['_id TEXT PRIMARY KEY']
+        columns.extend(_quote(column) for column in self.columns)
+        columns.append('doc TEXT NOT NULL')
+        conn.execute('CREATE TABLE IF NOT EXISTS %s (%s)' %
+            (_quote(self.name), ', '.join(columns)))
+        self.create_indexes(conn)
+
+    def create_indexes(self, conn):
+        for name, fields, unique in self.indexes:
+            conn.execute('CREATE %sINDEX IF NOT EXISTS %s ON %s (%s)' % (
+                'UNIQUE ' if unique else '', _quote(self.index_name(name)),
+                _quote(self.name), ', '.join(_quote(f) for f in fields)))
+
+    def row(self, doc):
+        return ([column_value(doc['_id'])] +
+                [column_value(doc.get(column)) for column in self.columns] +
+                [encode(doc)])
+
+
+class SQLiteBackend(Backend):
+    """
+    Store documents in an embedded SQLite database.
+
+    The database is opened in write-ahead logging mode so readers don't block
+    the writer.
+    """
+
+    def __init__(self, path=None):
+        """
+        Arguments:
+
+        * path - Path to the database file.  Defaults to ``SQLITE_PATH``
+          in settings, or "openelex.sqlite3".  Use ":memory:" for a
+          temporary database.
+
+        """
+        if path is None:
+            from openelex import settings
+            path = getattr(settings, 'SQLITE_PATH', 'openelex.sqlite3')
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._tables = {}
+
+    def table(self, document):
+        """Returns the Table for a document, creating it if needed"""
+        name = document._get_collection_name()
+        try:
+            return self._tables[name]
+        except KeyError:
+            pass
+
+        table = Table(document)
+        with self.conn:
+            table.create(self.conn)
+        self._tables[name] = table
+        return table
+
+    def _where(self, document, table, filters):
+        """
+        Split filters into an SQL WHERE clause, its parameters and a list of
+        predicates for filters on fields that don't have a column.
+        """
+        clauses = []
+        params = []
+        predicates = []
+        for key, value in filters.items():
+            name, op = split_filter(key)
+            if name in ('id', 'pk'):
+                field = '_id'
+            elif name in document._fields:
+                field = document._fields[name].db_field
+            else:
+                field = name
+
+            if field == '_id' or field in table.columns:
+                column = _quote(field)
+                if op == 'in':
+                    values = [column_value(v) for v in value]
+                    clauses.append('%s IN (%s)' %
+                        (column, ', '.join('?' * len(values))))
+                    params.extend(values)
+                elif op == 'startswith':
+                    # substr() rather than LIKE, which is case-insensitive
+                    clauses.append('substr(%s, 1, ?) = ?' % column)
+                    params.extend([len(value), value])
+                else:
+                    clauses.append('%s = ?' % column)
+                    params.append(column_value(value))
+            else:
+                predicates.append(self._predicate(field, op, value))
+
+        where = ''
+        if clauses:
+            where = ' WHERE ' + ' AND '.join(clauses)
+        return where, params, predicates
+
+    def _predicate(self, field, op, value):
+        if op == 'in':
+            value = list(value)
+            return lambda doc: doc.get(field) in value
+        if op == 'startswith':
+            return lambda doc: (doc.get(field) or '').startswith(value)
+        return lambda doc: doc.get(field) == value
+
+    def _iter_docs(self, document, filters):
+        table = self.table(document)
+        where, params, predicates = self._where(document, table, filters)
+        cursor = self.conn.execute('SELECT _id, doc FROM %s%s' %
+            (_quote(table.name), where), params)
+        for _id, data in cursor:
+            doc = decode(data)
+            if all(predicate(doc) for predicate in predicates):
+                yield _id, doc
+
+    def insert(self, document, docs, **options):
+        table = self.table(document)
+        for doc in docs:
+            if '_id' not in doc:
+                doc['_id'] = ObjectId()
+        placeholders = ', '.join('?' * (len(table.columns) + 2))
+        with self.conn:
+            self.conn.executemany('INSERT INTO %s VALUES (%s)' %
+                (_quote(table.name), placeholders),
+                (table.row(doc) for doc in docs))
+
+    @contextmanager
+    def defer_indexes(self, document, keep=()):
+        table = self.table(document)
+        dropped = [name for name, fields, unique in table.indexes
+                   if name not in keep]
+        with self.conn:
+            for name in dropped:
+                self.conn.execute('DROP INDEX IF EXISTS %s' %
+                    _quote(table.index_name(name)))
+        try:
+            yield dropped
+        finally:
+            with self.conn:
+                table.create_indexes(self.conn)
+
+    def count(self, document, **filters):
+        table = self.table(document)
+        where, params, predicates = self._where(document, table, filters)
+        if predicates:
+            return sum(1 for doc in self._iter_docs(document, filters))
+        return self.conn.execute('SELECT COUNT(*) FROM %s%s' %
+            (_quote(table.name), where), params).fetchone()[0]
+
+    def delete(self, document, **filters):
+        table = self.table(document)
+        where, params, predicates = self._where(document, table, filters)
+        with self.conn:
+            if not predicates:
+                return self.conn.execute('DELETE FROM %s%s' %
+                    (_quote(table.name), where), params).rowcount
+
+            ids = [_id for _id, doc in self._iter_docs(document, filters)]
+            for _id in ids:
+                self.conn.execute('DELETE FROM %s WHERE _id = ?' %
+                    _quote(table.name), [_id])
+            return len(ids)
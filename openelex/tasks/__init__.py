@@ -1,11 +1,10 @@
 from invoke import Collection
-from mongoengine import ConnectionError
 
-from openelex.settings import init_db
+from openelex.db import init_db
 from fetch import fetch
 from shell import shell
 
-import archive, cache, datasource, load, load_metadata, transform, validate, bake
+import archive, cache, datasource, load, load_metadata, transform, validate, bake, db
 
 
 # Build tasks namespace
@@ -19,10 +18,8 @@ ns.add_collection(load_metadata)
 ns.add_collection(transform)
 ns.add_collection(validate)
 ns.add_collection(bake)
+ns.add_collection(db)
 ns.add_task(shell)
 
-# Initialize prod Mongo connection
-try:
-    init_db()
-except ConnectionError:
-    pass
+# Configure the prod Mongo connection.  It's opened when it's first used.
+init_db(lazy=True)
@@ -1,21 +1,39 @@
 from datetime import datetime
+from multiprocessing import Pool
 import re
 import sys
 
 from invoke import task
 
 from openelex.base.bake import Baker, RawBaker
-from .utils import load_module
+from openelex.db import reconnect
+from .utils import collection_layout, load_module, require_mongo
 
 BASE_HELP = {
     'state': "Two-letter state-abbreviation, e.g. NY",
-    'fmt': "Format of output files.  Can be 'csv' or 'json'. Defaults is 'csv'.",
+    'fmt': ("Format of output files.  Can be 'csv', 'json' or 'jsonl' "
+        "(newline-delimited JSON), or a comma-separated list of formats, "
+        "e.g. 'csv,json', to write all of them with a single query. "
+        "Defaults is 'csv'."),
     'outputdir': ("Directory where output files will be written.  Defaults to "
         "'openelections/us/bakery'"),
     'electiontype': ("Only bake results for election of this type. "
         "Can be 'primary' or 'general'. Default is to bake results for all "
         "types of election"),
     'raw': "Bake raw results.  Default is to bake cleaned/standardized results",
+    'stream': ("Write results as they are read from the database instead of "
+        "reading all results into memory first.  Use this for large bakes."),
+    'join': ("How results are joined with their contests and candidates. "
+        "Can be 'memory' or 'aggregate'.  'aggregate' does the join in the "
+        "database and requires MongoDB 3.2 or greater.  Default is 'memory'."),
+    'incremental': ("Skip baking results when the data hasn't changed since "
+        "the previous bake and its output file still exists."),
+    'partition': ("Split results into a file for each value of a field, "
+        "e.g. 'reporting_level', 'jurisdiction', 'election_id' or "
+        "'ocd_id:county' for the county part of the OCD ID.  All files are "
+        "written with a single query.  Default is to write a single file."),
+    'per_state': ("Read raw results and results from the state's own "
+        "collections instead of the collections shared by all states."),
 }
 
 STATE_FILE_HELP = BASE_HELP.copy()
@@ -30,14 +48,16 @@ STATE_FILE_HELP.update({
 
 @task(help=STATE_FILE_HELP)
 def state_file(state, fmt='csv', outputdir=None, datefilter=None,
-    electiontype=None, level=None, raw=False):
+    electiontype=None, level=None, raw=False, stream=False, join=None,
+    incremental=False, partition=None, per_state=False):
     """
     Writes election and candidate data, along with a manifest to structured
     files.
 
     Args:
         state: Required. Postal code for a state.  For example, "md".
-        fmt: Format of output files.  This can be "csv" or "json".  Defaults
+        fmt: Format of output files.  This can be "csv", "json" or "jsonl",
+          or a comma-separated list of formats, like "csv,json".  Defaults
           to "csv".
         outputdir: Directory where output files will be written. Defaults to 
             "openelections/us/bakery"
@@ -48,6 +68,15 @@ def state_file(state, fmt='csv', outputdir=None, datefilter=None,
             "county", "precinct", etc. Value must be one of the options
             specified in openelex.models.Result.REPORTING_LEVEL_CHOICES.
         raw: Bake RawResult records instead of cleaned and transformed results.
+        stream: Write results as they're read from the database instead of
+            reading all the results into memory first.
+        join: How results are joined with related contests and candidates.
+            Either "memory" or "aggregate".  Defaults to "memory".
+        incremental: Don't bake results if the matching data hasn't changed
+            since the last bake and the previously baked file still exists.
+        partition: Write a file for each value of this partition key, for
+            example "reporting_level" or "ocd_id:county".
+        per_state: Read results from the state's own collections.
 
     """
     # TODO: Decide if datefilter should be required due to performance
@@ -58,6 +87,7 @@ def state_file(state, fmt='csv', outputdir=None, datefilter=None,
 
     # TODO: Filtering by election type and level
 
+    require_mongo("bake.state_file")
     timestamp = datetime.now()
 
     filter_kwargs = {}
@@ -72,9 +102,15 @@ def state_file(state, fmt='csv', outputdir=None, datefilter=None,
     else:
         baker = Baker(state=state, datefilter=datefilter, **filter_kwargs)
 
-    baker.collect_items() \
-         .write(fmt, outputdir=outputdir, timestamp=timestamp) \
-         .write_manifest(outputdir=outputdir, timestamp=timestamp)
+    with collection_layout(state, per_state):
+        if incremental and baker.is_up_to_date(fmt, outputdir, partition):
+            sys.stdout.write("Results are up to date, skipping bake\n")
+            return
+
+        baker.collect_items(stream=stream, join=join) \
+             .write(fmt, outputdir=outputdir, timestamp=timestamp,
+                    partition=partition) \
+             .write_manifest(outputdir=outputdir, timestamp=timestamp)
 
 def get_elections(state, datefilter=None):
     """Get all election dates and types for a state"""
@@ -101,14 +137,50 @@ ELECTION_FILE_HELP.update({
     'datefilter': ("Day or year, specified in YYYYMMDD format. "
         "Results will only be baked for elections with a start date matching "
         "the date string.  Default is to bake results for all elections."),
+    'workers': ("Number of processes used to bake elections in parallel. "
+        "Default is 1, which bakes elections one after another."),
 })
 
+def bake_election(args):
+    """
+    Bake the results for a single election.
+
+    Takes a single tuple of arguments so it can be mapped over by a
+    multiprocessing pool.
+
+    Returns:
+        A tuple of the date and type of the election and a boolean that is
+        True if the results were baked or False if they were skipped because
+        the previous bake was up to date.
+
+    """
+    (baker_cls, state, election_date, election_type, fmt, outputdir,
+        timestamp, stream, join, incremental, partition, per_state) = args
+    baker = baker_cls(state=state, datefilter=election_date,
+                      election_type=election_type)
+    with collection_layout(state, per_state):
+        if incremental and baker.is_up_to_date(fmt, outputdir, partition):
+            return election_date, election_type, False
+
+        baker.collect_items(stream=stream, join=join) \
+             .write(fmt, outputdir=outputdir, timestamp=timestamp,
+                    partition=partition) \
+             .write_manifest(outputdir=outputdir, timestamp=timestamp)
+    return election_date, election_type, True
+
 @task(help=ELECTION_FILE_HELP)
 def election_file(state, fmt='csv', outputdir=None, datefilter=None,
-                  electiontype=None, raw=False):
+                  electiontype=None, raw=False, stream=False, join=None,
+                  workers=1, incremental=False, partition=None,
+                  per_state=False):
     """
     Write election and candidate data with one election per file.
+
+    Elections are baked in parallel when ``workers`` is greater than 1.
+    Each worker process opens its own database connection.  All files
+    share a single timestamp.
     """
+    require_mongo("bake.election_file")
     timestamp = datetime.now()
 
     if raw:
@@ -127,13 +199,30 @@ def election_file(state, fmt='csv', outputdir=None, datefilter=None,
             sys.exit(msg)
         elections = [(datefilter, electiontype)]
 
-    for election_date, election_type in elections:
-        msg = "Baking results for {} election on {}\n".format(
-            election_type, election_date)
+    jobs = [(baker_cls, state, election_date, election_type, fmt, outputdir,
+             timestamp, stream, join, incremental, partition, per_state)
+            for election_date, election_type in elections]
+
+    if workers > 1:
+        pool = Pool(workers, initializer=reconnect)
+        try:
+            for election_date, election_type, baked in pool.imap_unordered(
+                    bake_election, jobs):
+                if baked:
+                    msg = "Baked results for {} election on {}\n"
+                else:
+                    msg = "Results for {} election on {} are up to date\n"
+                sys.stdout.write(msg.format(election_type, election_date))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return
+
+    for job in jobs:
+        msg = "Baking results for {} election on {}\n".format(job[3], job[2])
         sys.stdout.write(msg)
-        baker = baker_cls(state=state, datefilter=election_date,
-                          election_type=election_type)
-
-        baker.collect_items() \
-             .write(fmt, outputdir=outputdir, timestamp=timestamp) \
-             .write_manifest(outputdir=outputdir, timestamp=timestamp)
+        if not bake_election(job)[2]:
+            sys.stdout.write("Results are up to date, skipped\n")
@@ -0,0 +1,121 @@
+import sys
+
+from invoke import task
+from pymongo.errors import OperationFailure
+
+from openelex.lib.indexes import audit as audit_queries
+from openelex.lib.indexes import (BUILD_FAILURE_HELP, DOCUMENTS,
+    ensure_indexes, raw_collection, undeclared_indexes)
+from openelex.models import (STATE_COLLECTION_DOCUMENTS, RawResult,
+    drop_state_collections, state_collection_name)
+from .utils import collection_layout, require_mongo
+
+
+@task(help={
+    'audit': 'Explain known query patterns and report queries that don\'t '
+             'use an index',
+    'drop': 'Drop indexes that are no longer declared on the models',
+    'state': 'Manage the indexes of the per-state collections for this '
+             'state, e.g. MD',
+})
+def indexes(audit=False, drop=False, state=None):
+    """
+    Build the indexes declared on the models.
+
+    Optionally explain the queries issued when loading, transforming,
+    validating and baking results and report collection scans, queries that
+    use an unexpected index and queries that examine many more documents
+    than they return.
+    """
+    require_mongo("db.indexes")
+    with collection_layout(state, state is not None):
+        _indexes(audit, drop)
+
+
+def _indexes(audit, drop):
+    # Drop stale indexes first so declared indexes whose options changed
+    # can be rebuilt.
+    for doc, names in undeclared_indexes().items():
+        collection = doc._get_collection_name()
+        for name in names:
+            if drop:
+                raw_collection(doc).drop_index(name)
+                print "Dropped undeclared index %s.%s" % (collection, name)
+            else:
+                print "Undeclared index %s.%s" % (collection, name)
+
+    # Build each document's indexes separately so one failure doesn't stop
+    # the others from being built
+    failed = []
+    for doc in DOCUMENTS:
+        try:
+            info = ensure_indexes([doc])
+        except OperationFailure as e:
+            # Also raised for duplicate keys
+            print "Couldn't build the indexes on %s: %s" % (
+                doc._get_collection_name(), e)
+            failed.append(doc._get_collection_name())
+            continue
+
+        for collection, index_info in info.items():
+            print "%s: %s" % (collection, ", ".join(sorted(index_info.keys())))
+
+    if failed:
+        sys.exit("Couldn't build the indexes on %s. %s" % (
+            ", ".join(failed), BUILD_FAILURE_HELP))
+
+    if not audit:
+        return
+
+    num_problems = 0
+    print "\nQuery audit:\n"
+    for query, plan, problems in audit_queries():
+        status = "FAIL" if problems else "ok"
+        print "\t%s %s (%s, examined %d, returned %d)" % (status,
+            query.name, ", ".join(plan['indexes']) or "no index",
+            plan['examined'], plan['returned'])
+        for problem in problems:
+            print "\t\t%s" % problem
+        num_problems += len(problems)
+
+    print "\n%d problem(s) found" % num_problems
+
+
+@task(help={
+    'state': 'Two-letter state-abbreviation, e.g. MD',
+})
+def drop_state(state):
+    """
+    Drop the per-state raw result and result collections for a state.
+
+    This is the fast way to remove all of a state's results before reloading
+    them into per-state collections.
+    """
+    require_mongo("db.drop_state")
+    drop_state_collections(state)
+    for doc in STATE_COLLECTION_DOCUMENTS:
+        print "Dropped %s" % state_collection_name(doc, state)
+
+
+@task(help={
+    'state': 'Only update raw results for this state, e.g. MD',
+    'per_state': "Use the state's own raw result collection.  Requires "
+                 "state",
+})
+def backfill_slugs(state=None, per_state=False):
+    """
+    Store contest and candidate slugs on raw results loaded without them.
+
+    ``per_state`` requires ``state``.
+    """
+    require_mongo("db.backfill_slugs")
+    if per_state and not state:
+        sys.exit("The per_state option requires a state")
+
+    filters = {}
+    if state:
+        filters['state'] = state.upper()
+
+    with collection_layout(state, per_state):
+        count = RawResult.backfill_slugs(**filters)
+    print "Updated slugs for %d raw results" % count
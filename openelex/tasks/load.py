@@ -1,24 +1,186 @@
+from multiprocessing import Pool
 import os
+import sys
+import time
 
 from invoke import task
 
 from openelex.base.load import BaseLoader
-from .utils import load_module
+from openelex.db import reconnect
+from openelex.models import RawResult, drop_state_collections
+from openelex.storage import get_backend
+from .utils import collection_layout, load_module, require_mongo
 
 @task(help={
     'state':'Two-letter state-abbreviation, e.g. NY',
     'datefilter': 'Any portion of a YYYYMMDD date, e.g. YYYY, YYYYMM, etc.',
+    'compact': 'Store election metadata once per election instead of on '
+               'every raw result',
+    'per_state': 'Store raw results in a collection for just this state. '
+                 'When loading all files, the collection is dropped and '
+                 'rebuilt instead of deleting results one file at a time.',
+    'bulk': 'Drop the raw result indexes while loading and rebuild them '
+            'at the end, insert with the "bulk_load" write concern and '
+            'check the number of stored results for each file afterwards',
+    'workers': 'Number of processes used to load files in parallel. '
+               'Default is 1, which loads files one after another.',
 })
-def run(state, datefilter=''):
+def run(state, datefilter='', compact=False, per_state=False, bulk=False,
+        workers=1):
     """
     Load cached data files into MongoDB.
 
     State is required. Optionally provide 'datefilter' to limit files that are loaded.
+
+    Bulk mode is meant for loading a state from scratch.  The indexes are
+    rebuilt over the whole raw result collection, so it isn't worth using
+    for a handful of files.
+
+    Files are loaded in parallel when ``workers`` is greater than 1.  Each
+    worker process opens its own database connection.  The outcome, number
+    of results and time taken are reported for each file, and loading
+    continues when a file fails.
     """
-    state_mod = load_module(state, ['datasource', 'load'])
+    # Election records and per-state collections are only implemented
+    # with MongoEngine
+    for option, enabled in (('compact', compact), ('per_state', per_state)):
+        if enabled:
+            require_mongo("The %s option" % option)
+
+    state_mod = load_module(state, ['datasource'])
     datasrc = state_mod.datasource.Datasource()
+    loader = get_loader(state, compact, bulk)
+
+    if per_state and not datefilter:
+        # Reloading the whole state, so start with an empty collection
+        drop_state_collections(state, [RawResult])
+
+    with collection_layout(state, per_state):
+        if bulk:
+            # Loaders look up previously loaded results by source
+            backend = get_backend()
+            with backend.defer_indexes(RawResult, keep=['source_1']) as dropped:
+                if dropped:
+                    print("Dropped indexes %s" % ", ".join(dropped))
+                loaded, failed = _load(state, loader, datasrc, datefilter,
+                    workers, compact, bulk)
+            print("Rebuilt raw result indexes")
+            check_counts(loaded)
+        else:
+            loaded, failed = _load(state, loader, datasrc, datefilter,
+                workers, compact, bulk)
+
+    if failed:
+        sys.exit("Failed to load %d file(s):\n%s" % (len(failed),
+            "\n".join("\t%s" % source for source in sorted(failed))))
+
+
+def get_loader(state, compact=False, bulk=False):
+    """Returns a state's LoadResults instance, configured for a load run"""
+    state_mod = load_module(state, ['load'])
     loader = state_mod.load.LoadResults()
+    loader.compact = compact
+    loader.bulk = bulk
+    return loader
 
+
+def _load(state, loader, datasrc, datefilter, workers, compact, bulk):
+    if workers > 1:
+        return load_files_parallel(state, datasrc, datefilter, workers,
+            compact, bulk)
+    return load_files(loader, datasrc, datefilter), []
+
+
+def load_files(loader, datasrc, datefilter):
+    """
+    Load the data files matching a date filter.
+
+    Returns a dictionary mapping each file's name to the number of results
+    the loader inserted from it.
+    """
+    loaded = {}
     #TODO: Notify user if there's a mismatch between expected files and cache.diff
     for mapping in datasrc.mappings(datefilter):
-        loader.run(mapping)
+        file_loader = loader.run(mapping)
+        loaded[file_loader.source] = file_loader.inserted
+    return loaded
+
+
+def load_file(args):
+    """
+    Load a single data file.
+
+    Takes a single tuple of arguments so it can be mapped over by a
+    multiprocessing pool.
+
+    Returns:
+        A tuple of the file's name, the number of results inserted, the
+        number of seconds it took and an error message, which is None if
+        the file was loaded.
+
+    """
+    state, mapping, compact, bulk = args
+    source = mapping['generated_filename']
+    start = time.time()
+    try:
+        file_loader = get_loader(state, compact, bulk).run(mapping)
+    except Exception as e:
+        return source, 0, time.time() - start, "%s: %s" % (
+            e.__class__.__name__, e)
+    return file_loader.source, file_loader.inserted, time.time() - start, None
+
+
+def load_files_parallel(state, datasrc, datefilter, workers, compact=False,
+        bulk=False):
+    """
+    Load the data files matching a date filter in a pool of worker
+    processes.
+
+    Each file is loaded independently, so a file that fails to load doesn't
+    stop the others.
+
+    Returns a tuple of a dictionary mapping the name of each loaded file to
+    the number of results inserted from it and a list of the names of the
+    files that failed to load.
+    """
+    jobs = [(state, mapping, compact, bulk)
+            for mapping in datasrc.mappings(datefilter)]
+    loaded = {}
+    failed = []
+    pool = Pool(workers, initializer=reconnect)
+    try:
+        for source, inserted, elapsed, error in pool.imap_unordered(
+                load_file, jobs):
+            if error is None:
+                loaded[source] = inserted
+                msg = "Loaded {}: {} raw results in {:.1f} seconds\n".format(
+                    source, inserted, elapsed)
+            else:
+                failed.append(source)
+                msg = "Failed to load {} after {:.1f} seconds: {}\n".format(
+                    source, elapsed, error)
+            sys.stdout.write(msg)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return loaded, failed
+
+
+def check_counts(loaded):
+    """
+    Check that the data store has as many raw results for each file as were
+    loaded.  Exit with an error message if any of the counts differ.
+    """
+    mismatches = []
+    for source, expected in sorted(loaded.items()):
+        count = get_backend().count(RawResult, source=source)
+        if count != expected:
+            mismatches.append("\t%s: loaded %d raw results, found %d" %
+                (source, expected, count))
+
+    if mismatches:
+        sys.exit("Raw result counts don't match:\n" + "\n".join(mismatches))
+    print("Verified raw result counts for %d file(s)" % len(loaded))
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 import os
 from csv import DictReader
 
@@ -5,6 +6,7 @@ from invoke import task
 
 from openelex import models
 from openelex import COUNTRY_DIR
+from .utils import require_mongo
 
 FIXTURE_DIR = os.path.join(COUNTRY_DIR, 'fixtures')
 COLLECTIONS = ['office', 'party',]
@@ -31,14 +33,13 @@ def run(collection, filename=None, database='openelex', clear=False):
     Populate metadata in MongoDB from fixture files.
 
     """
+    require_mongo("load_metadata.run")
     if collection not in COLLECTIONS:
         raise ValueError("Unknown collection '%s'." % (collection))
 
     fmt = 'csv'
     if filename is None:
         filename = _get_fixture_filename(collection, fmt)
-    num_created = 0
-    count = 0
 
     doc_cls = _get_document_class(collection)
 
@@ -50,17 +51,85 @@ def run(collection, filename=None, database='openelex', clear=False):
             doc_cls.objects.delete()
 
         reader = DictReader(f)
-        for row in reader:
-            # This might not be the most efficient way to do an upsert based
-            # on natural keys, but its the clearest and probably fast enough.
-            o, created = doc_cls.objects.get_or_create(**row)
-            
-            count += 1
-            if created:
-                num_created += 1
+        num_created, num_updated, num_unchanged = _upsert(doc_cls, reader,
+            UPSERT_FIELDS[collection])
 
     msg = "Imported %d records.\n" % (num_created)
-    if (num_created < count):
-        msg = msg + "%d records already in database.\n" % (count - num_created)
+    if num_updated:
+        msg = msg + "%d records updated.\n" % (num_updated)
+    if num_unchanged:
+        msg = msg + "%d records already in database.\n" % (num_unchanged)
 
     print msg
+
+def _upsert(doc_cls, rows, key_fields, batch_size=1000):
+    """
+    Create or update documents from fixture rows, matching existing
+    documents on their natural key.
+
+    Rows are handled in batches.  For each batch, the existing documents
+    with the batch's keys are read in a single query and the new ones are
+    created with a single batch insert.  Only documents whose fields changed
+    are updated, one at a time, since older versions of pymongo don't
+    support bulk writes.
+
+    Returns a tuple of the number of created, updated and unchanged
+    documents.
+    """
+    num_created = num_updated = num_unchanged = 0
+    for batch in _batches(rows, batch_size):
+        created, updated, unchanged = _upsert_batch(doc_cls, batch,
+            key_fields)
+        num_created += created
+        num_updated += updated
+        num_unchanged += unchanged
+
+    return num_created, num_updated, num_unchanged
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+def _upsert_batch(doc_cls, rows, key_fields):
+    collection = doc_cls._get_collection()
+    key = lambda doc: tuple(doc.get(f) for f in key_fields)
+
+    docs = OrderedDict()
+    for row in rows:
+        obj = doc_cls(**row)
+        obj.validate()
+        doc = obj.to_mongo()
+        # Later rows win when a fixture file repeats a key
+        docs.setdefault(key(doc), {}).update(doc)
+
+    # A missing field matches a key value of None
+    existing = {}
+    for doc in collection.find({'$or': [dict(zip(key_fields, doc_key))
+            for doc_key in docs]}):
+        existing.setdefault(key(doc), doc)
+
+    new = []
+    updates = []
+    num_unchanged = 0
+    for doc_key, doc in docs.items():
+        current = existing.get(doc_key)
+        if current is None:
+            new.append(doc)
+        elif any(current.get(name) != value for name, value in doc.items()):
+            updates.append((current['_id'], doc))
+        else:
+            num_unchanged += 1
+
+    if new:
+        collection.insert(new)
+    for _id, doc in updates:
+        collection.update({'_id': _id}, {'$set': doc})
+
+    return len(new), len(updates), num_unchanged
@@ -2,7 +2,8 @@ import sys
 
 from invoke import task
 
-from .utils import load_module, split_args
+from .utils import (collection_layout, load_module, require_mongo,
+    split_args)
 from validate import run_validation
 
 @task(help={
@@ -71,47 +72,53 @@ def _select_transforms(state, include=None, exclude=None):
     'include': 'Transforms to run (comma-separated list)',
     'exclude': 'Transforms to skip (comma-separated list)',
     'no_reverse': "Don't reverse before running this transform, even if it is set to auto-reverse", 
+    'per_state': "Use the state's own raw result and result collections",
 })
-def run(state, include=None, exclude=None, no_reverse=False):
+def run(state, include=None, exclude=None, no_reverse=False, per_state=False):
     """
     Run transformations on data loaded in MongoDB.
 
     State is required. Optionally provide to limit transforms that are performed.
     """
+    require_mongo("transform.run")
     try:
         run_transforms = _select_transforms(state, include, exclude)
     except IncludeExcludeError as e:
         sys.exit(e)
 
-    for transform in run_transforms:
-        if not no_reverse and transform.auto_reverse:
-            # Reverse the transform if it's been run previously
-            transform.reverse()
+    with collection_layout(state, per_state):
+        for transform in run_transforms:
+            if not no_reverse and transform.auto_reverse:
+                # Reverse the transform if it's been run previously
+                transform.reverse()
 
-        print 'Executing %s' % transform 
-        transform()
+            print 'Executing %s' % transform 
+            transform()
 
-        validators = transform.validators.values()
-        if validators:
-            print "Executing validation"
-            run_validation(state, validators)
+            validators = transform.validators.values()
+            if validators:
+                print "Executing validation"
+                run_validation(state, validators)
 
 
 @task(help={
     'state': 'Two-letter state-abbreviation, e.g. NY',
     'include': 'Transforms to reverse (comma-separated list)',
     'exclude': 'Transforms to skip (comma-separated list)',
+    'per_state': "Use the state's own raw result and result collections",
 })
-def reverse(state, include=None, exclude=None):
+def reverse(state, include=None, exclude=None, per_state=False):
     """
     Reverse a previously run transformation.
 
     State is required. Optionally provide to limit transforms that are performed.
     """
+    require_mongo("transform.reverse")
     try:
         run_transforms = _select_transforms(state, include, exclude)
     except IncludeExcludeError as e:
         sys.exit(e)
 
-    for transform in run_transforms:
-        transform.reverse()
+    with collection_layout(state, per_state):
+        for transform in run_transforms:
+            transform.reverse()
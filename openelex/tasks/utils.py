@@ -1,3 +1,10 @@
+from contextlib import contextmanager
+import sys
+
+from openelex.models import state_collections
+from openelex.storage import backend_name
+
+
 def load_module(state, mod_list=[]):
     """Dynamically load modules for states
 
@@ -9,6 +16,31 @@ def load_module(state, mod_list=[]):
     """
     return __import__('openelex.us.%s' % state.lower(), fromlist=mod_list)
 
+@contextmanager
+def collection_layout(state, per_state=False):
+    """
+    Context manager that stores a state's raw results and results in
+    per-state collections if ``per_state`` is True, or in the shared
+    collections otherwise.
+    """
+    if not per_state:
+        yield
+        return
+
+    with state_collections(state):
+        yield
+
+def require_mongo(name):
+    """
+    Exit if the storage backend isn't MongoDB.
+
+    Only loading raw results goes through the storage backend.  Everything
+    else reads and writes MongoDB directly.
+    """
+    if backend_name() != 'mongo':
+        sys.exit("%s needs the mongo storage backend, but STORAGE_BACKEND "
+            "is '%s'" % (name, backend_name()))
+
 def help_text(extra):
     default = {
         'state':'Two-letter state-abbreviation, e.g. NY',
@@ -4,7 +4,8 @@ from collections import OrderedDict
 
 from invoke import task
 
-from .utils import load_module, split_args
+from .utils import (collection_layout, load_module, require_mongo,
+    split_args)
 
 
 @task(help={
@@ -29,13 +30,15 @@ def list(state):
     'state':'Two-letter state-abbreviation, e.g. NY',
     'include': 'Validations to run (comma-separated list)',
     'exclude': 'Validations to skip (comma-separated list)',
+    'per_state': "Use the state's own raw result and result collections",
 })
-def run(state, include=None, exclude=None):
+def run(state, include=None, exclude=None, per_state=False):
     """
     Run data validations for state.
 
     State is required. Optionally filter validations using include/exclude flags.
     """
+    require_mongo("validate.run")
     if include and exclude:
         sys.exit("ERROR: You can not use both include and exclude flags!")
 
@@ -60,7 +63,8 @@ def run(state, include=None, exclude=None):
                 validations.pop(val)
 
     # Run remaining validations
-    run_validation(state, validations.values()) 
+    with collection_layout(state, per_state):
+        run_validation(state, validations.values())
 
 
 def run_validation(state, validators):
@@ -1,17 +1,25 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
 from datetime import date, datetime
 from unittest import TestCase
 
+from bson import json_util
+from mock import patch
 from mongoengine import Q
+from pymongo.errors import OperationFailure
 
 from openelex.exceptions import UnsupportedFormatError
+from openelex.lib.indexes import check_plan, summarize_plan
 from openelex.tests.mongo_test_case import MongoTestCase
 from openelex.tests.factories import (ContestFactory, CandidateFactory,
     OfficeFactory, RawResultFactory, ResultFactory)
 
-from openelex.models import Candidate, RawResult, Result
+from openelex.models import Candidate, Contest, Election, RawResult, Result
 from openelex.base.bake import (FlattenFieldTransform, RawResultRoller, ResultRoller,
-    Baker, RawBaker)
+    Baker, RawBaker, json_default, partition_key, prefix_query)
 
 
 class FieldTransformTestCase(TestCase):
@@ -126,6 +134,33 @@ class TestResultRoller(RollerTestCase):
         # Test that a ValueError is raised for an unsupported date format
         self.assertRaises(ValueError, self.roller.build_date_filters, "201200")
 
+    def _assert_uses_index(self, qs):
+        plan = str(qs.explain())
+        # Older servers report a BasicCursor and newer ones a COLLSCAN stage
+        # when a query doesn't use an index
+        self.assertNotIn('BasicCursor', plan)
+        self.assertNotIn('COLLSCAN', plan)
+
+    def test_filters_use_indexes(self):
+        Result.ensure_indexes()
+        Contest.ensure_indexes()
+        Candidate.ensure_indexes()
+        filters = self.roller.build_filters(state='md', datefilter='2012',
+            reporting_level='precinct')
+        for coll in self.roller.collections:
+            q = filters[coll._meta['collection']]
+            self._assert_uses_index(coll.objects(q))
+
+    def test_election_type_filter_uses_index(self):
+        Result.ensure_indexes()
+        filters = self.roller.build_filters(state='md', datefilter='2012',
+            election_type='general', reporting_level='precinct')
+        qs = Result.objects(filters['result'])
+        self._assert_uses_index(qs)
+        plan = summarize_plan(qs.explain())
+        self.assertEqual(check_plan(plan,
+            'state_1_election_id_1_reporting_level_1'), [])
+
     def test_get_list_no_results(self):
         data = self.roller.get_list(state='tx')
         self.assertEqual(len(data), 0)
@@ -159,6 +194,81 @@ class TestResultRoller(RollerTestCase):
         self.assertEqual(len(data),
             Result.objects(state="MD", reporting_level=level).count())
 
+    def test_iter_items(self):
+        items = self.roller.iter_items(state='md', datefilter='20121106')
+        self.assertFalse(isinstance(items, list))
+        data = list(items)
+        self.assertEqual(len(data),
+            Result.objects(election_id__contains='md-2012-11-06').count())
+        row = data[0]
+        for field in self.OUTPUT_FIELDS:
+            self.assertIn(field, row)
+
+    def test_iter_items_shared_related(self):
+        # Add another result for the same candidate and make sure the
+        # candidate's fields are output for both results.
+        candidate = Candidate.objects()[0]
+        ResultFactory(candidate=candidate, contest=candidate.contest)
+        data = list(self.roller.iter_items(state='md',
+            datefilter=candidate.contest.start_date.strftime("%Y%m%d")))
+        self.assertEqual(len(data), 2)
+        for row in data:
+            self.assertEqual(row['last_name'], candidate.family_name)
+
+    def test_iter_items_aggregate(self):
+        try:
+            data = list(ResultRoller(join='aggregate').iter_items(state='md'))
+        except OperationFailure:
+            self.skipTest("MongoDB server doesn't support $lookup")
+
+        expected = self.roller.get_list(state='md')
+        self.assertEqual(len(data), len(expected))
+        key = lambda row: (row['id'], row['last_name'])
+        for row, expected_row in zip(sorted(data, key=key),
+                sorted(expected, key=key)):
+            for field in self.OUTPUT_FIELDS:
+                self.assertEqual(row[field], expected_row[field])
+
+    def test_iter_items_related_filters(self):
+        # A result whose contest is excluded by the contest's date filter,
+        # even though the result's own election ID matches
+        contest = ContestFactory(start_date=datetime(2012, 4, 3))
+        candidate = CandidateFactory(contest=contest)
+        ResultFactory(candidate=candidate, contest=contest,
+            election_id='md-2012-11-06-general')
+
+        filter_kwargs = dict(state='md', datefilter='20121106')
+        try:
+            data = list(ResultRoller(join='aggregate').iter_items(
+                **filter_kwargs))
+        except OperationFailure:
+            self.skipTest("MongoDB server doesn't support $lookup")
+
+        expected = list(self.roller.iter_items(**filter_kwargs))
+        rows = list(ResultRoller().iter_rows(**filter_kwargs))
+        self.assertEqual(len(expected), 1)
+        self.assertEqual(len(data), len(expected))
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(data[0]['id'], expected[0]['id'])
+
+    def test_fingerprint(self):
+        fingerprint = self.roller.fingerprint(state='md', datefilter='20121106')
+        self.assertEqual(fingerprint['filters'],
+            {'state': 'md', 'datefilter': '20121106'})
+        self.assertEqual(fingerprint['collections']['result']['count'], 1)
+
+        # Adding a result changes the fingerprint
+        candidate = Candidate.objects(
+            election_id__contains='2012-11-06')[0]
+        ResultFactory(candidate=candidate, contest=candidate.contest)
+        self.assertNotEqual(
+            self.roller.fingerprint(state='md', datefilter='20121106'),
+            fingerprint)
+        # But not the fingerprint of another election
+        self.assertEqual(
+            self.roller.fingerprint(state='md', datefilter='20120403')['collections']['result']['count'],
+            1)
+
     def test_get_fields_no_data(self):
         """Test the list of output fields when no data has been fetched"""
         fields = set(self.roller.get_fields())
@@ -166,6 +276,209 @@ class TestResultRoller(RollerTestCase):
             self.assertIn(field, fields)
 
 
+class TestRollerFilters(TestCase):
+    """
+    Tests for building query filters that don't need the database.
+    """
+    def test_parse_datefilter(self):
+        self.assertEqual(ResultRoller.parse_datefilter('2012'),
+            (datetime(2012, 1, 1), datetime(2013, 1, 1), '2012'))
+        self.assertEqual(ResultRoller.parse_datefilter('201212'),
+            (datetime(2012, 12, 1), datetime(2013, 1, 1), '2012-12'))
+        self.assertEqual(ResultRoller.parse_datefilter('2012-11-06'),
+            (datetime(2012, 11, 6), datetime(2012, 11, 7), '2012-11-06'))
+        self.assertRaises(ValueError, ResultRoller.parse_datefilter, '201200')
+
+    def test_build_date_filters_start_date(self):
+        q = ResultRoller.build_date_filters('201211', state='md',
+            collection=Contest)
+        self.assertEqual(q.to_query(Contest), {
+            'start_date': {
+                '$gte': datetime(2012, 11, 1),
+                '$lt': datetime(2012, 12, 1),
+            },
+        })
+
+    def test_build_date_filters_election_id_prefix(self):
+        q = ResultRoller.build_date_filters('201211', state='md',
+            collection=Result)
+        regex = q.to_query(Result)['election_id']
+        # The regex is anchored so it can use an index
+        self.assertTrue(regex.pattern.startswith('^'))
+        self.assertIsNotNone(regex.match('md-2012-11-06-general'))
+        self.assertIsNone(regex.match('va-2012-11-06-general'))
+
+    def test_build_election_type_filter(self):
+        q = ResultRoller.build_election_type_filter('general', 'md')
+        regexes = [c['election_id'] for c in q.to_query(Result)['$and']]
+        # One of the regexes is anchored so it can use an index
+        self.assertTrue(any(r.pattern.startswith('^') for r in regexes))
+        for election_id, matches in (('md-2012-11-06-general', True),
+                                     ('md-2008-06-17-special-general', True),
+                                     ('md-2012-04-03-primary', False),
+                                     ('va-2012-11-06-general', False)):
+            self.assertEqual(all(r.search(election_id) for r in regexes),
+                matches)
+
+    def test_build_date_filters_raw_result(self):
+        start_date = {
+            '$gte': datetime(2012, 11, 1),
+            '$lt': datetime(2012, 12, 1),
+        }
+        with patch.object(RawResultRoller, 'compact_election_ids',
+                return_value=[]):
+            q = RawResultRoller.build_date_filters('201211', state='md',
+                collection=RawResult)
+        self.assertEqual(q.to_query(RawResult), {'start_date': start_date})
+
+        # Compact raw results don't have a start date, so the raw results
+        # of elections with an Election record are also matched by ID
+        with patch.object(RawResultRoller, 'compact_election_ids',
+                return_value=['md-2012-11-06-general']) as election_ids:
+            q = RawResultRoller.build_date_filters('201211', state='md',
+                collection=RawResult)
+        election_ids.assert_called_with('201211', 'md')
+        self.assertEqual(q.to_query(RawResult), {'$or': [
+            {'state': 'MD', 'start_date': start_date},
+            {'election_id': {'$in': ['md-2012-11-06-general']}},
+        ]})
+
+
+class TestResultRollerPipeline(TestCase):
+    """
+    Tests for building the aggregation pipeline used by the ResultRoller.
+    """
+    def setUp(self):
+        self.roller = ResultRoller(join='aggregate')
+
+    def test_invalid_join(self):
+        self.assertRaises(ValueError, ResultRoller, join='nested_loop')
+
+    def test_build_pipeline(self):
+        pipeline = self.roller.build_pipeline(state='md',
+            reporting_level='precinct')
+        stages = [list(stage.keys())[0] for stage in pipeline]
+        self.assertEqual(stages, ['$match', '$lookup', '$unwind', '$match',
+            '$lookup', '$unwind', '$match', '$project'])
+        self.assertEqual(pipeline[0]['$match'],
+            {'state': 'MD', 'reporting_level': 'precinct'})
+        # The related collections' filters are applied to the joined
+        # documents
+        for i in (1, 4):
+            related_field = pipeline[i]['$lookup']['as']
+            self.assertEqual(pipeline[i + 2]['$match'],
+                {related_field + '.state': 'MD'})
+
+        project = pipeline[-1]['$project']
+        self.assertEqual(project['_id'], 0)
+        # Renamed fields
+        self.assertEqual(project['first_name'],
+            {'$ifNull': ['$candidate.given_name', None]})
+        self.assertEqual(project['division'], {'$ifNull': ['$ocd_id', None]})
+        # Unrenamed fields
+        self.assertEqual(project['jurisdiction'], '$jurisdiction')
+        self.assertEqual(project['start_date'], '$contest.start_date')
+        # Excluded fields
+        self.assertNotIn('slug', project)
+        self.assertNotIn('raw_result', project)
+        self.assertNotIn('contest', project)
+
+    def test_prefix_query(self):
+        query = {'state': 'MD', '$and': [{'election_id': 'x'},
+            {'start_date': {'$gte': 1}}]}
+        self.assertEqual(prefix_query(query, 'contest'), {
+            'contest.state': 'MD',
+            '$and': [{'contest.election_id': 'x'},
+                     {'contest.start_date': {'$gte': 1}}],
+        })
+
+    def test_build_pipeline_raw_result(self):
+        pipeline = RawResultRoller(join='aggregate').build_pipeline(
+            state='md')
+        stages = [list(stage.keys())[0] for stage in pipeline]
+        self.assertEqual(stages, ['$match', '$lookup', '$unwind',
+            '$project'])
+        self.assertEqual(pipeline[1]['$lookup']['from'], 'election')
+        project = pipeline[-1]['$project']
+        # Metadata is filled in for compact raw results
+        self.assertEqual(project['start_date'],
+            {'$ifNull': ['$start_date', '$_election.start_date']})
+        self.assertEqual(project['office'], '$office')
+
+
+class TestRowPlan(TestCase):
+    """
+    Tests for building rows with a precompiled RowPlan.
+    """
+    def _flatten_and_plan(self, roller, primary, **related):
+        fields = roller.get_fields()
+        plan = roller.compile_row_plan(fields)
+        row = plan.row(primary, [related[fname]
+                                 for fname, coll in plan.relationships])
+        flat = roller.flatten(primary.copy(),
+            **dict((k, v.copy()) for k, v in related.items()))
+        return fields, row, flat
+
+    def test_row(self):
+        start_date = datetime(2012, 11, 6)
+        contest = {
+            '_id': 1,
+            'start_date': start_date,
+            'election_type': 'general',
+            'updated': datetime(2014, 1, 1),
+        }
+        candidate = {
+            '_id': 2,
+            'given_name': 'Barack',
+            'family_name': 'Obama',
+            'updated': datetime(2014, 1, 2),
+        }
+        result = {
+            '_id': 3,
+            'contest': 1,
+            'candidate': 2,
+            'election_id': 'md-2012-11-06-general',
+            'ocd_id': 'ocd-division/country:us/state:md',
+            'total_votes': 10,
+            'reporting_level': 'state',
+        }
+        fields, row, flat = self._flatten_and_plan(ResultRoller(), result,
+            contest=contest, candidate=candidate)
+        self.assertEqual(row, tuple(flat.get(f) for f in fields))
+        row = dict(zip(fields, row))
+        self.assertEqual(row['id'], 'md-2012-11-06-general')
+        self.assertEqual(row['first_name'], 'Barack')
+        self.assertEqual(row['votes'], 10)
+        self.assertEqual(row['year'], 2012)
+        self.assertEqual(row['updated_at'], datetime(2014, 1, 1))
+        self.assertEqual(row['updated'], datetime(2014, 1, 2))
+        self.assertIsNone(row['middle_name'])
+        # The raw documents aren't modified
+        self.assertIn('_id', result)
+        self.assertIn('given_name', candidate)
+
+    def test_row_flattened_fields(self):
+        raw_result = {
+            '_id': 1,
+            'election_id': 'md-2012-11-06-general',
+            'start_date': datetime(2012, 11, 6),
+            'full_name': 'Barack Obama',
+            'vote_breakdowns': {
+                'election_night_total': 15,
+                'absentee_total': 2,
+            },
+        }
+        roller = RawResultRoller()
+        fields = roller.get_fields() + ['election_night_total',
+            'absentee_total']
+        plan = roller.compile_row_plan(fields)
+        row = dict(zip(fields, plan.row(raw_result, [])))
+        self.assertEqual(row['name_raw'], 'Barack Obama')
+        self.assertEqual(row['election_night_total'], 15)
+        self.assertEqual(row['absentee_total'], 2)
+        self.assertNotIn('vote_breakdowns', row)
+
+
 class TestRawResultRoller(RollerTestCase):
     def setUp(self):
         # Call super to select the test database
@@ -191,6 +504,46 @@ class TestRawResultRoller(RollerTestCase):
         self.assertIn('provisional_total', row)
         self.assertIn('second_absentee_total', row)
 
+    def test_scan_fields(self):
+        fields = self.roller.scan_fields(state='md', datefilter='20000307')
+        self.assertNotIn('vote_breakdowns', fields)
+        self.assertIn('election_night_total', fields)
+        self.assertIn('second_absentee_total', fields)
+        for field in self.OUTPUT_FIELDS:
+            self.assertIn(field, fields)
+
+        # Iterating through the items shouldn't find any new fields
+        data = list(self.roller.iter_items(state='md', datefilter='20000307'))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(self.roller.get_fields(), fields)
+
+    def test_filters_use_index(self):
+        RawResult.ensure_indexes()
+        filters = self.roller.build_filters(state='md', datefilter='20000307',
+            reporting_level='precinct')
+        plan = summarize_plan(RawResult.objects(filters['raw_result'])
+            .explain())
+        self.assertEqual(check_plan(plan,
+            'state_1_start_date_1_reporting_level_1'), [])
+
+    def test_compact_raw_results(self):
+        # A compact raw result, stored without its election metadata
+        election = Election(election_id='md-2000-03-07-special',
+            state='MD', start_date=datetime(2000, 3, 7),
+            end_date=datetime(2000, 3, 7), election_type='special',
+            result_type='certified')
+        election.save()
+        rr = RawResultFactory.build(state='MD',
+            start_date=datetime(2000, 3, 7), election_type='special',
+            election_id=election.election_id)
+        RawResult._get_collection().insert(rr.to_compact_mongo())
+
+        self.addCleanup(Election.clear_cache)
+
+        data = list(self.roller.iter_items(state='md', datefilter='20000307'))
+        self.assertEqual(len(data), 2)
+        self.assertIn('special', [row['election_type'] for row in data])
+
     def test_get_fields_has_fields(self):
         data = self.roller.get_list(state='md', datefilter='20000307')
         fields = self.roller.get_fields()
@@ -211,11 +564,16 @@ class TestBaker(TestCase):
         filename = baker.filename(fmt=fmt, timestamp=ts)
         self.assertEqual(filename, 'md_20140211T105615.json')
 
+        baker = Baker(state='md', datefilter='2012-11-06',
+            election_type='general')
+        filename = baker.filename(fmt=fmt, timestamp=ts)
+        self.assertEqual(filename, 'md_20121106_general_20140211T105615.json')
+
     def test_manifest_filename(self):
         baker = Baker(state='md')
         ts = datetime(2014, 2, 11, 10, 56, 15)
         filename = baker.manifest_filename(timestamp=ts)
-        self.assertEqual(filename, 'md_20140211T105615_manifest.txt')
+        self.assertEqual(filename, 'md_20140211T105615_manifest.json')
 
     def test_write_unsupported_format(self):
         baker = Baker(state='md')
@@ -227,6 +585,213 @@ class TestBaker(TestCase):
         outputdir = baker.default_outputdir()
         self.assertTrue(outputdir.endswith(path))
 
+    def test_json_default(self):
+        for dt in (datetime(2012, 11, 6), datetime(2014, 2, 11, 10, 56, 15, 1500),
+                datetime(1969, 12, 31, 23, 59, 59, 500000)):
+            self.assertEqual(json_default(dt), json_util.default(dt))
+
+    def _write_items(self, fmt, items, fields=None):
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        ts = datetime(2014, 2, 11, 10, 56, 15)
+        baker = Baker(state='md')
+        baker._items = iter(items)
+        baker._fields = fields or ['id', 'votes', 'updated_at']
+        baker.write(fmt, outputdir=outputdir, timestamp=ts)
+        with open(os.path.join(outputdir, baker.filename(fmt, ts))) as f:
+            return f.read()
+
+    def test_write_json(self):
+        items = [
+            {'id': 'md-2012-11-06-general', 'votes': 10,
+             'updated_at': datetime(2014, 2, 11, 10, 56, 15)},
+            {'id': u'md-2012-11-06-general', 'votes': None,
+             'updated_at': datetime(2014, 2, 12)},
+        ]
+        self.assertEqual(self._write_items('json', items),
+            json.dumps(items, default=json_util.default))
+        self.assertEqual(self._write_items('json', []), json.dumps([]))
+
+    def test_write_jsonl(self):
+        items = [
+            {'id': 'md-2012-11-06-general', 'votes': 10,
+             'updated_at': datetime(2014, 2, 11, 10, 56, 15)},
+            {'id': 'md-2012-11-06-general', 'votes': 5,
+             'updated_at': datetime(2014, 2, 12)},
+        ]
+        lines = self._write_items('jsonl', items).splitlines()
+        self.assertEqual(len(lines), 2)
+        for line, item in zip(lines, items):
+            self.assertEqual(line, json.dumps(item, default=json_util.default))
+
+    def test_write_multiple_formats(self):
+        items = [
+            {'id': 'md-2012-11-06-general', 'votes': 10,
+             'updated_at': datetime(2014, 2, 11, 10, 56, 15)},
+            {'id': u'md-2012-11-06-general', 'votes': None,
+             'updated_at': datetime(2014, 2, 12)},
+        ]
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        ts = datetime(2014, 2, 11, 10, 56, 15)
+        baker = Baker(state='md')
+        # Items can only be read once, like when they're streamed
+        baker._items = iter(items)
+        baker._fields = ['id', 'votes', 'updated_at']
+        baker.write('csv,json,jsonl', outputdir=outputdir, timestamp=ts)
+        for fmt in ('csv', 'json', 'jsonl'):
+            with open(os.path.join(outputdir, baker.filename(fmt, ts))) as f:
+                self.assertEqual(f.read(), self._write_items(fmt, items))
+
+        self.assertRaises(UnsupportedFormatError, baker.write, 'csv,xml')
+
+    def test_write_manifest(self):
+        items = [
+            {'id': 'md-2012-11-06-general', 'votes': 10,
+             'updated_at': datetime(2014, 2, 11, 10, 56, 15)},
+            {'id': 'md-2012-11-06-general', 'votes': 5,
+             'updated_at': datetime(2014, 2, 12)},
+            {'id': 'md-2012-11-06-general', 'votes': None,
+             'updated_at': datetime(2014, 2, 12)},
+        ]
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        ts = datetime(2014, 2, 11, 10, 56, 15)
+        baker = Baker(state='md')
+        baker._items = items
+        baker._fields = ['id', 'votes', 'updated_at']
+        baker.write('csv', outputdir=outputdir, timestamp=ts)
+        baker.write('json,jsonl', outputdir=outputdir, timestamp=ts)
+        baker.write_manifest(outputdir=outputdir, timestamp=ts)
+
+        with open(os.path.join(outputdir, baker.manifest_filename(ts))) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['filters'], {'state': 'md'})
+        self.assertEqual([o['format'] for o in manifest['files']],
+            ['csv', 'json', 'jsonl'])
+        for output in manifest['files']:
+            with open(os.path.join(outputdir, output['filename'])) as f:
+                data = f.read()
+            self.assertEqual(output['rows'], 3)
+            self.assertEqual(output['votes'], 15)
+            self.assertEqual(output['bytes'], len(data))
+            self.assertEqual(output['sha256'], hashlib.sha256(data).hexdigest())
+            self.assertEqual(output['fields'], baker._fields)
+            self.assertEqual(set(output['timings']),
+                set(['query', 'flatten', 'serialize', 'write']))
+
+    def test_partition_key(self):
+        item = {
+            'id': 'md-2012-11-06-general',
+            'reporting_level': 'precinct',
+            'division': 'ocd-division/country:us/state:md/county:baltimore/precinct:1',
+        }
+        self.assertEqual(partition_key('reporting_level')(item), 'precinct')
+        self.assertEqual(partition_key('election_id')(item),
+            'md-2012-11-06-general')
+        self.assertEqual(partition_key('ocd_id:county')(item),
+            'county:baltimore')
+        self.assertIsNone(partition_key('ocd_id:place')(item))
+
+    def test_write_partitioned(self):
+        items = []
+        for i in range(12):
+            items.append({
+                'id': 'md-2012-11-06-general',
+                'jurisdiction': "County %d" % (i % 4),
+                'votes': i,
+                'updated_at': datetime(2014, 2, 11, 10, 56, 15),
+            })
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        ts = datetime(2014, 2, 11, 10, 56, 15)
+        baker = Baker(state='md')
+        # Make sure files get closed and reopened
+        baker.max_open_files = 3
+        baker._items = iter(items)
+        baker._fields = ['id', 'jurisdiction', 'votes', 'updated_at']
+        baker.write('csv,json', outputdir=outputdir, timestamp=ts,
+            partition='jurisdiction')
+
+        self.assertEqual(len(baker._outputs), 8)
+        for output in baker._outputs:
+            partition_items = [item for item in items
+                               if item['jurisdiction'] == output['partition']]
+            with open(os.path.join(outputdir, output['filename'])) as f:
+                data = f.read()
+            self.assertEqual(data, self._write_items(output['format'],
+                partition_items, baker._fields))
+            self.assertEqual(output['rows'], 3)
+            self.assertEqual(output['votes'],
+                sum(item['votes'] for item in partition_items))
+            self.assertEqual(output['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertEqual(baker._outputs[0]['filename'],
+            'md_20140211T105615_county-0.csv')
+
+    def test_is_up_to_date(self):
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        fingerprint = {
+            'filters': {'state': 'md', 'datefilter': '20121106'},
+            'collections': {
+                'result': {'count': 2, 'updated': '2014-02-11T10:56:15'},
+            },
+        }
+        baker = Baker(state='md', datefilter='20121106')
+        baker._fingerprint = fingerprint
+        self.assertFalse(baker.is_up_to_date('csv', outputdir))
+
+        baker._items = []
+        baker._fields = ['id']
+        baker.write('csv', outputdir=outputdir)
+        self.assertTrue(baker.is_up_to_date('csv', outputdir))
+        self.assertFalse(baker.is_up_to_date('json', outputdir))
+
+        # A new bake with changed data isn't up to date
+        baker = Baker(state='md', datefilter='20121106')
+        baker._fingerprint = dict(fingerprint, collections={
+            'result': {'count': 3, 'updated': '2014-02-12T10:56:15'},
+        })
+        self.assertFalse(baker.is_up_to_date('csv', outputdir))
+
+    def test_is_up_to_date_bake_key(self):
+        outputdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outputdir)
+        ts = datetime(2014, 2, 11, 10, 56, 15)
+        items = [
+            {'id': 1, 'reporting_level': 'county', 'votes': 1},
+            {'id': 2, 'reporting_level': 'precinct', 'votes': 2},
+        ]
+
+        def bake(level=None, partition=None, timestamp=ts):
+            filter_kwargs = {'state': 'md', 'datefilter': '20121106'}
+            if level:
+                filter_kwargs['reporting_level'] = level
+            baker = Baker(**filter_kwargs)
+            baker._fingerprint = {'filters': filter_kwargs}
+            self.assertFalse(baker.is_up_to_date('csv', outputdir, partition))
+            baker._items = items
+            baker._fields = ['id', 'reporting_level', 'votes']
+            baker.write('csv', outputdir=outputdir, timestamp=timestamp,
+                partition=partition)
+            self.assertTrue(baker.is_up_to_date('csv', outputdir, partition))
+            return baker
+
+        # Bakes of different levels and layouts share a fingerprint file
+        # without overwriting each other's record
+        county = bake('county')
+        precinct = bake('precinct', timestamp=datetime(2014, 2, 12))
+        partitioned = bake(partition='reporting_level')
+        self.assertTrue(county.is_up_to_date('csv', outputdir))
+        self.assertTrue(precinct.is_up_to_date('csv', outputdir))
+        self.assertFalse(partitioned.is_up_to_date('csv', outputdir))
+        self.assertEqual(len(os.listdir(outputdir)), 5)
+
+        # Every partition's file has to exist
+        os.remove(os.path.join(outputdir, partitioned._outputs[0]['filename']))
+        self.assertFalse(partitioned.is_up_to_date('csv', outputdir,
+            'reporting_level'))
+
 
 class TestRawBaker(MongoTestCase):
     def test_filename(self):
@@ -251,3 +816,15 @@ class TestRawBaker(MongoTestCase):
             RawResult.objects.filter(start_date=start_date).count())
         # TODO: Test dates of filtered items
         # BOOKMARK
+
+    def test_collect_items_stream(self):
+        state = 'MD'
+        start_date = date(2000, 3, 7)
+        RawResultFactory(state=state, start_date=start_date)
+        RawResultFactory(state=state, start_date=start_date)
+        baker = RawBaker(state=state, datefilter=start_date.strftime("%Y%m%d"))
+        baker.collect_items(stream=True)
+        self.assertIn('election_night_total', baker.get_fields())
+        items = list(baker.get_items())
+        self.assertEqual(len(items),
+            RawResult.objects.filter(start_date=start_date).count())
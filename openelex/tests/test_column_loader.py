@@ -0,0 +1,113 @@
+from datetime import datetime
+from io import BytesIO
+from unittest import TestCase
+
+from mock import PropertyMock, patch
+
+from openelex.base.load import Column, LoadContext
+from openelex.models import RawResult
+from openelex.storage.sqlite import SQLiteBackend
+from openelex.us.wv.load import WVLoader
+
+WV_FILE = (
+    "OfficeDescription,District,PartyName,Name,Precinct,Votes\r\n"
+    "U.S. Senate,,Democratic,Joe Manchin,1,120\r\n"
+    "County Commission,,Democratic,Jane Doe,1,50\r\n"
+    "\r\n"
+    "House of Delegates, 12 ,Republican, John Smith ,2,n/a\r\n"
+    "State Senate,5,Republican,Short Row\r\n"
+)
+
+
+class TestColumn(TestCase):
+    def test_position(self):
+        column = Column('full_name', ('Candidate Name', 'Candidate'))
+        self.assertEqual(column.position({'Candidate': 3}), 3)
+        self.assertEqual(column.position(
+            {'Candidate': 3, 'Candidate Name': 1}), 1)
+        self.assertRaises(ValueError, column.position, {'Votes': 0})
+
+        column = Column('winner', 'Winner', required=False)
+        self.assertEqual(column.position({'Votes': 0}), None)
+
+
+class TestColumnLoader(TestCase):
+    def setUp(self):
+        self.loader = WVLoader()
+        self.loader.mapping = {
+            'generated_filename': '20121106__wv__general__precinct.csv',
+            'election': 'wv-2012-11-06-general',
+            'ocd_id': 'ocd-division/country:us/state:wv/county:barbour',
+        }
+        self.loader.context = LoadContext(self.loader.mapping, 'wv',
+            datetime.now(), {'election_type': 'general', 'primary_type': ''})
+
+    def _load(self, data):
+        with patch.object(WVLoader, '_file_handle',
+                new_callable=PropertyMock) as file_handle:
+            file_handle.return_value = BytesIO(data)
+            return list(self.loader.iter_results())
+
+    def test_iter_results(self):
+        results = self._load(WV_FILE)
+        self.assertEqual(len(results), 3)
+
+        result = results[0]
+        self.assertEqual(result['office'], 'U.S. Senate')
+        self.assertEqual(result['full_name'], 'Joe Manchin')
+        self.assertEqual(result['name_slug'], 'joe-manchin')
+        self.assertEqual(result['party'], 'Democratic')
+        self.assertEqual(result['primary_party'], 'Democratic')
+        self.assertEqual(result['jurisdiction'], '1')
+        self.assertEqual(result['votes'], 120)
+        self.assertEqual(result['reporting_level'], 'precinct')
+        self.assertEqual(result['county_ocd_id'],
+            self.loader.mapping['ocd_id'])
+        self.assertEqual(result['election_id'], 'wv-2012-11-06-general')
+        self.assertEqual(result['state'], 'WV')
+
+        result = results[1]
+        self.assertEqual(result['district'], '12')
+        self.assertEqual(result['full_name'], 'John Smith')
+        self.assertEqual(result['votes'], 0)
+
+        # Missing trailing values are empty
+        result = results[2]
+        self.assertEqual(result['jurisdiction'], '')
+        self.assertEqual(result['votes'], 0)
+
+    def test_missing_column(self):
+        data = "OfficeDescription,District,PartyName,Precinct,Votes\r\n"
+        self.assertRaises(ValueError, self._load, data)
+
+    def test_empty_file(self):
+        self.assertEqual(self._load(""), [])
+
+    def test_load_skips_invalid_results(self):
+        self.loader.context = LoadContext(self.loader.mapping, 'wv',
+            datetime.now(), {
+                'start_date': datetime(2012, 11, 6),
+                'end_date': datetime(2012, 11, 6),
+                'election_type': 'general',
+                'primary_type': '',
+                'result_type': 'certified',
+                'special': False,
+            })
+        self.loader.source = self.loader.mapping['generated_filename']
+        self.loader.inserted = 0
+        self.loader.invalid = 0
+        self.loader.batch_size = 2
+        # The third result's name is too long, after the first batch of two
+        # results has been inserted
+        data = WV_FILE.replace("Short Row", "x" * 301)
+        backend = SQLiteBackend(':memory:')
+        with patch('openelex.base.load.get_backend', return_value=backend), \
+                patch.object(WVLoader, '_file_handle',
+                    new_callable=PropertyMock) as file_handle:
+            file_handle.return_value = BytesIO(data)
+            self.loader.load()
+
+        self.assertEqual(self.loader.invalid, 1)
+        self.assertEqual(self.loader.inserted, 2)
+        self.assertEqual(backend.count(RawResult,
+            source=self.loader.source), 2)
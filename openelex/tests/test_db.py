@@ -0,0 +1,57 @@
+from multiprocessing import Pool
+from unittest import TestCase
+
+from mock import patch
+from mongoengine import connection
+
+from openelex import db, settings
+from openelex.models import RawResult
+
+
+def _connection_names():
+    return sorted(connection._connections.keys())
+
+
+class TestDb(TestCase):
+    def test_connection_settings(self):
+        mongo = {'openelex_test': {'host': '127.0.0.1', 'port': 27017,
+            'maxPoolSize': 4, 'socketTimeoutMS': 1000}}
+        with patch.object(settings, 'MONGO', mongo, create=True):
+            conn_settings = db.connection_settings('openelex_test')
+        self.assertEqual(conn_settings['max_pool_size'], 4)
+        self.assertNotIn('maxPoolSize', conn_settings)
+        self.assertEqual(conn_settings['socketTimeoutMS'], 1000)
+        # The settings themselves are left alone
+        self.assertEqual(mongo['openelex_test']['maxPoolSize'], 4)
+
+    def test_write_concern(self):
+        concerns = {'load': {'w': 0}}
+        with patch.object(settings, 'MONGO_WRITE_CONCERNS', concerns,
+                create=True):
+            self.assertEqual(db.write_concern('load'), {'w': 0})
+            self.assertEqual(db.write_concern('transform'), {})
+
+    def test_get_db_reconnects_after_fork(self):
+        connection._connections['fake'] = object()
+        RawResult._collection = object()
+        with patch.object(db, '_pid', -1), \
+                patch.object(connection, 'get_db') as get_db:
+            db.get_db()
+            self.assertTrue(get_db.called)
+        self.assertNotIn('fake', connection._connections)
+        self.assertIsNone(RawResult._collection)
+
+    def test_multiprocessing_children_reconnect(self):
+        connection._connections['fake'] = object()
+        try:
+            # No initializer, the after-fork hook should clear the
+            # inherited connections
+            pool = Pool(1)
+            try:
+                names = pool.apply(_connection_names)
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            connection._connections.pop('fake', None)
+        self.assertNotIn('fake', names)
@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+from mock import patch
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from openelex.lib.indexes import BUILD_FAILURE_HELP
+from openelex.models import Candidate, Contest
+from openelex.tasks import db
+
+
+class TestIndexes(TestCase):
+    @patch('openelex.tasks.db.undeclared_indexes', return_value={})
+    @patch('openelex.tasks.db.ensure_indexes')
+    def test_build_failure(self, ensure_indexes, undeclared_indexes):
+        def build(documents):
+            doc = documents[0]
+            if doc is Contest:
+                raise OperationFailure("Index with name: election_id_1_slug_1 "
+                    "already exists with different options")
+            if doc is Candidate:
+                raise DuplicateKeyError("E11000 duplicate key error")
+            return {doc._get_collection_name(): {'_id_': {}}}
+
+        ensure_indexes.side_effect = build
+        try:
+            db._indexes(audit=False, drop=False)
+        except SystemExit as e:
+            self.assertIn("contest, candidate", str(e))
+            self.assertIn(BUILD_FAILURE_HELP, str(e))
+        else:
+            self.fail("SystemExit not raised")
+
+        # The indexes of the other documents were still built
+        self.assertEqual(ensure_indexes.call_count, len(db.DOCUMENTS))
@@ -1,7 +1,12 @@
 from datetime import datetime
 from unittest import TestCase
 
-from openelex.models import Contest, Office, Party
+from mock import patch
+from mongoengine import ValidationError
+from pymongo.errors import DuplicateKeyError
+
+from openelex.models import (Contest, Election, Office, Party, RawResult,
+    Result, drop_state_collections, state_collection_name, state_collections)
 from openelex.tests.mongo_test_case import MongoTestCase
 
         
@@ -56,3 +61,189 @@ class TestContest(MongoTestCase):
         updated = contest.updated
         contest.save()
         self.assertGreater(contest.updated, updated)
+
+
+class TestRawResult(TestCase):
+    def setUp(self):
+        Election._metadata_cache['md-2012-11-06-general'] = {
+            'start_date': datetime(2012, 11, 6),
+            'end_date': datetime(2012, 11, 6),
+            'election_type': 'general',
+            'result_type': 'certified',
+            'special': False,
+        }
+
+    def tearDown(self):
+        Election.clear_cache()
+
+    def test_to_compact_mongo(self):
+        rr = RawResult(election_id='md-2012-11-06-general', state='MD',
+            start_date=datetime(2012, 11, 6), election_type='general',
+            office="President", jurisdiction="Allegany", votes=1)
+        son = rr.to_compact_mongo()
+        for name in Election.METADATA_FIELDS:
+            self.assertNotIn(name, son)
+        self.assertEqual(son['election_id'], 'md-2012-11-06-general')
+        self.assertEqual(son['office'], "President")
+
+    def test_rehydrate(self):
+        son = {
+            'election_id': 'md-2012-11-06-general',
+            'state': 'MD',
+            'office': "President",
+        }
+        rr = RawResult._from_son(son)
+        self.assertEqual(rr.start_date, datetime(2012, 11, 6))
+        self.assertEqual(rr.election_type, 'general')
+        # Rehydrated fields aren't saved back to the data store
+        self.assertNotIn('start_date', rr._get_changed_fields())
+
+    def test_slugs(self):
+        rr = RawResult(office="U.S. House of Representatives", district="01",
+            primary_party="DEM", family_name="Gore", given_name="Al")
+        self.assertEqual(rr.contest_slug, "us_house_of_representatives-1-dem")
+        self.assertEqual(rr.candidate_slug, "gore_al")
+
+        # Slugs are computed for raw results stored without them
+        rr = RawResult._from_son({
+            'office': "President",
+            'full_name': "Al Gore",
+        })
+        self.assertEqual(rr.contest_slug, "president")
+        self.assertEqual(rr.candidate_slug, "al_gore")
+
+        self.assertEqual(RawResult.make_slugs(office="President"),
+            ("president", None))
+
+    def test_build_son(self):
+        values = {
+            'source': '20121106__md__general__county.csv',
+            'election_id': 'md-2012-11-06-general',
+            'state': 'MD',
+            'start_date': datetime(2012, 11, 6),
+            'end_date': datetime(2012, 11, 6),
+            'result_type': 'certified',
+            'primary_type': '',
+            'office': "President - Vice Pres",
+            'full_name': "Barack Obama",
+            'reporting_level': 'county',
+            'jurisdiction': "Allegany",
+            'votes': '10',
+            'contest_winner': 'Winner',
+            'name_slug': 'barack-obama',
+        }
+        expected = RawResult(**values).to_mongo()
+        son = RawResult.build_son(values)
+        for name in ('created', 'updated'):
+            self.assertIsInstance(son.pop(name), datetime)
+            expected.pop(name)
+        self.assertEqual(dict(son), dict(expected))
+        self.assertEqual(son['votes'], 10)
+        self.assertEqual(son['candidate_slug'], "barack_obama")
+
+        values.update(state='XX', votes='ten', full_name='x' * 301)
+        values.pop('jurisdiction')
+        try:
+            RawResult.build_son(values)
+        except ValidationError as e:
+            self.assertEqual(sorted(e.errors.keys()),
+                ['full_name', 'jurisdiction', 'state', 'votes'])
+        else:
+            self.fail("ValidationError not raised")
+
+    def test_state_collection_name(self):
+        self.assertEqual(state_collection_name(RawResult, 'MD'),
+            'raw_result_md')
+        self.assertEqual(state_collection_name(Result, 'md'), 'result_md')
+
+
+class TestElection(MongoTestCase):
+    def tearDown(self):
+        Election.clear_cache()
+        super(TestElection, self).tearDown()
+
+    def test_metadata(self):
+        election_id = 'md-2012-11-06-general'
+        self.assertEqual(Election.metadata(election_id), {})
+
+        # Missing elections aren't cached, so an Election saved later, for
+        # example by another process, is found
+        Election(election_id=election_id, state='MD',
+            start_date=datetime(2012, 11, 6), end_date=datetime(2012, 11, 6),
+            election_type='general', result_type='certified').save()
+        metadata = Election.metadata(election_id)
+        self.assertEqual(metadata['start_date'], datetime(2012, 11, 6))
+        self.assertEqual(metadata['election_type'], 'general')
+
+
+    def test_upsert(self):
+        election = Election(election_id='md-2012-11-06-general', state='MD',
+            start_date=datetime(2012, 11, 6), end_date=datetime(2012, 11, 6),
+            election_type='general', result_type='unofficial')
+        election.upsert()
+        election.result_type = 'certified'
+        election.upsert()
+        self.assertEqual(Election.objects.count(), 1)
+        self.assertEqual(Election.objects.get().result_type, 'certified')
+
+
+class TestElectionUpsert(TestCase):
+    @patch.object(Election, '_get_collection')
+    def test_upsert_race(self, get_collection):
+        # Another process inserts the election after this upsert finds no
+        # match
+        collection = get_collection.return_value
+        collection.update.side_effect = [DuplicateKeyError("E11000"), None]
+        Election(election_id='md-2012-11-06-general', state='MD',
+            start_date=datetime(2012, 11, 6), end_date=datetime(2012, 11, 6),
+            result_type='certified').upsert()
+        self.assertEqual(collection.update.call_count, 2)
+        spec, son = collection.update.call_args[0]
+        self.assertEqual(spec, {'_id': 'md-2012-11-06-general'})
+        self.assertEqual(son['result_type'], 'certified')
+
+
+class TestStateCollections(MongoTestCase):
+    def test_state_collections(self):
+        rr = RawResult(election_id='md-2012-11-06-general', state='MD',
+            source='test.csv', start_date=datetime(2012, 11, 6),
+            end_date=datetime(2012, 11, 6), result_type='certified',
+            office="President", reporting_level='county',
+            jurisdiction="Allegany", votes=1)
+        with state_collections('md'):
+            self.assertEqual(RawResult._get_collection_name(),
+                'raw_result_md')
+            rr.save()
+            self.assertEqual(RawResult.objects.count(), 1)
+        self.assertEqual(RawResult._get_collection_name(), 'raw_result')
+        self.assertEqual(RawResult.objects.count(), 0)
+
+        drop_state_collections('md')
+        with state_collections('md'):
+            self.assertEqual(RawResult.objects.count(), 0)
+
+
+class TestBackfillSlugs(MongoTestCase):
+    def test_backfill_slugs(self):
+        collection = RawResult._get_collection()
+        for state, full_name in (('MD', "Al Gore"), ('MD', "George Bush"),
+                ('VA', "Al Gore")):
+            collection.insert({
+                'election_id': 'md-2000-11-07-general',
+                'state': state,
+                'office': "President",
+                'full_name': full_name,
+            })
+
+        self.assertEqual(RawResult.backfill_slugs(batch_size=1,
+            state='MD'), 2)
+        docs = list(collection.find({'state': 'MD'}))
+        self.assertEqual(sorted(doc['candidate_slug'] for doc in docs),
+            ['al_gore', 'george_bush'])
+        for doc in docs:
+            self.assertEqual(doc['contest_slug'], "president")
+        self.assertNotIn('contest_slug', collection.find_one({'state': 'VA'}))
+
+        # Only raw results without slugs are updated
+        self.assertEqual(RawResult.backfill_slugs(), 1)
+        self.assertEqual(RawResult.backfill_slugs(), 0)
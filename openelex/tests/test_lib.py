@@ -1,6 +1,17 @@
+from datetime import date
 from unittest import TestCase
 
+from pymongo.errors import OperationFailure
+
+from openelex.models import Contest, RawResult
+from openelex.tests.factories import RawResultFactory
+from openelex.tests.mongo_test_case import MongoTestCase
+
 from openelex.lib import standardized_filename 
+from openelex.lib.indexes import (QUERIES, check_plan, declared_indexes,
+    deferred_indexes, raw_collection, summarize_plan, undeclared_indexes)
+from openelex.lib.insertbuffer import BulkInsertBuffer, insert_unique
+from openelex.lib.records import get_record, iter_records, record_type
 from openelex.lib.text import ocd_type_id, election_slug
 
 class TestText(TestCase):
@@ -84,3 +95,171 @@ class TestLib(TestCase):
         expected = "20120403__md.csv"
         filename = standardized_filename(**kwargs)
         self.assertEqual(filename, expected)
+
+
+class TestIndexes(TestCase):
+    def test_summarize_plan_legacy(self):
+        plan = summarize_plan({
+            'cursor': "BtreeCursor election_id_1_slug_1",
+            'n': 1,
+            'nscannedObjects': 1,
+            'nscanned': 1,
+        })
+        self.assertFalse(plan['collscan'])
+        self.assertEqual(plan['indexes'], ["election_id_1_slug_1"])
+        self.assertEqual(check_plan(plan, "election_id_1_slug_1"), [])
+
+        plan = summarize_plan({
+            'cursor': "BasicCursor",
+            'n': 1,
+            'nscannedObjects': 5000,
+            'nscanned': 5000,
+        })
+        self.assertTrue(plan['collscan'])
+        self.assertEqual(len(check_plan(plan)), 2)
+
+    def test_summarize_plan(self):
+        explain = {
+            'queryPlanner': {
+                'winningPlan': {
+                    'stage': 'FETCH',
+                    'inputStage': {
+                        'stage': 'IXSCAN',
+                        'indexName': "state_1_start_date_1",
+                    },
+                },
+            },
+            'executionStats': {
+                'nReturned': 10,
+                'totalDocsExamined': 500,
+            },
+        }
+        plan = summarize_plan(explain)
+        self.assertFalse(plan['collscan'])
+        self.assertEqual(plan['indexes'], ["state_1_start_date_1"])
+        problems = check_plan(plan, "election_id_1_slug_1")
+        self.assertEqual(len(problems), 2)
+
+        explain['queryPlanner']['winningPlan'] = {'stage': 'COLLSCAN'}
+        plan = summarize_plan(explain)
+        self.assertTrue(plan['collscan'])
+        self.assertEqual(plan['indexes'], [])
+
+    def test_audited_indexes_are_declared(self):
+        # The index each audited query should use has to be declared on its
+        # document, so the bake filters and the models agree on one set of
+        # indexes
+        for query in QUERIES:
+            if query.index:
+                self.assertIn(query.index, declared_indexes(query.document),
+                    query.name)
+
+        self.assertEqual(declared_indexes(Contest)['election_id_1_slug_1'],
+            True)
+
+
+class TestRecordType(TestCase):
+    def test_record_type(self):
+        cls = record_type(RawResult, ('id', 'jurisdiction', 'votes'))
+        self.assertIs(record_type(RawResult, ['id', 'jurisdiction', 'votes']),
+            cls)
+        record = cls._make([1, 'Allegany', 5])
+        self.assertEqual(record.jurisdiction, 'Allegany')
+        self.assertEqual(record.votes, 5)
+
+
+class TestRecords(MongoTestCase):
+    def setUp(self):
+        super(TestRecords, self).setUp()
+        RawResultFactory(start_date=date(2012, 11, 6), jurisdiction='Allegany',
+            votes=10)
+        RawResultFactory(start_date=date(2012, 11, 6), jurisdiction='Garrett',
+            votes=20)
+
+    def test_iter_records(self):
+        qs = RawResult.objects.order_by('-votes')
+        records = list(iter_records(qs, 'id', 'jurisdiction', 'votes'))
+        self.assertEqual([(r.jurisdiction, r.votes) for r in records],
+            [('Garrett', 20), ('Allegany', 10)])
+        self.assertEqual(records[0].id, qs[0].id)
+
+    def test_get_record(self):
+        record = get_record(RawResult.objects, 'votes', jurisdiction='Garrett')
+        self.assertEqual(record.votes, 20)
+        self.assertRaises(RawResult.DoesNotExist, get_record,
+            RawResult.objects, 'votes', jurisdiction='Kent')
+        self.assertRaises(RawResult.MultipleObjectsReturned, get_record,
+            RawResult.objects, 'votes')
+
+
+class TestBulkInsertBuffer(TestCase):
+    def test_insert(self):
+        batches = []
+        buf = BulkInsertBuffer(RawResult, 2, insert=batches.append)
+        for i in range(5):
+            buf.append(i)
+        self.assertEqual(len(buf), 1)
+        buf.flush()
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(buf.count(), 5)
+
+
+class TestInsertUnique(MongoTestCase):
+    def _contest(self, slug):
+        return Contest(election_id='md-2012-11-06-general', state='MD',
+            slug=slug, source='test.csv', result_type='certified')
+
+    def test_insert_unique(self):
+        Contest.ensure_indexes()
+        existing = self._contest('president')
+        self.assertEqual(insert_unique(Contest, [existing]), [])
+
+        new = self._contest('comptroller')
+        dupe = self._contest('comptroller')
+        duplicates = insert_unique(Contest, [self._contest('president'), new,
+            dupe])
+        self.assertEqual([d.key for d in duplicates],
+            [('md-2012-11-06-general', 'president'),
+             ('md-2012-11-06-general', 'comptroller')])
+        self.assertEqual(Contest.objects.count(), 2)
+
+
+class TestUndeclaredIndexes(MongoTestCase):
+    def test_upgrade_unique_index(self):
+        # A database from before the contest key index was unique, with a
+        # duplicate contest
+        collection = raw_collection(Contest)
+        collection.ensure_index([('election_id', 1), ('slug', 1)])
+        for i in range(2):
+            collection.insert({'election_id': 'md-2012-11-06-general',
+                'slug': 'president', 'state': 'MD'})
+
+        # The duplicates can still be read
+        self.assertEqual(Contest.objects.filter(slug='president').count(), 2)
+        self.assertEqual(undeclared_indexes([Contest]),
+            {Contest: ['election_id_1_slug_1']})
+        self.assertRaises(OperationFailure, insert_unique, Contest,
+            [Contest(election_id='md-2012-11-06-general', state='MD',
+                slug='comptroller', source='test.csv',
+                result_type='certified')])
+
+        collection.drop_index('election_id_1_slug_1')
+        collection.remove(collection.find_one({'slug': 'president'})['_id'])
+        Contest.ensure_indexes()
+        self.assertEqual(undeclared_indexes([Contest]), {})
+        self.assertTrue(collection.index_information()
+            ['election_id_1_slug_1']['unique'])
+
+
+class TestDeferredIndexes(MongoTestCase):
+    def test_deferred_indexes(self):
+        RawResult.ensure_indexes()
+        collection = RawResult._get_collection()
+        with deferred_indexes(RawResult, keep=['source_1']) as dropped:
+            self.assertIn('election_id_1', dropped)
+            self.assertNotIn('source_1', dropped)
+            self.assertEqual(sorted(collection.index_information().keys()),
+                ['_id_', 'source_1'])
+        for name in dropped:
+            self.assertIn(name, collection.index_information())
+        self.assertTrue(RawResult._meta.get('auto_create_index', True))
@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from bson import ObjectId
+from mock import patch
+
+from openelex.models import Party
+from openelex.tasks import load_metadata
+
+
+class TestUpsert(TestCase):
+    def setUp(self):
+        self.existing = [
+            {'_id': ObjectId(), 'name': "Democratic", 'state': 'US',
+             'abbrev': 'DEM'},
+            {'_id': ObjectId(), 'name': "Republican", 'state': 'US',
+             'abbrev': 'REP'},
+        ]
+        patcher = patch.object(Party, '_get_collection')
+        self.collection = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+        def find(query):
+            keys = [clause['abbrev'] for clause in query['$or']]
+            return [doc for doc in self.existing if doc['abbrev'] in keys]
+
+        self.collection.find.side_effect = find
+
+    def test_upsert(self):
+        rows = [
+            # Unchanged
+            {'name': "Democratic", 'state': 'US', 'abbrev': 'DEM'},
+            # Updated
+            {'name': "Republican Party", 'state': 'US', 'abbrev': 'REP'},
+            # Created, with a repeated key whose later row wins
+            {'name': "Green", 'state': 'US', 'abbrev': 'GRN'},
+            {'name': "Libertarian", 'state': 'US', 'abbrev': 'LIB'},
+            {'name': "Green Party", 'state': 'US', 'abbrev': 'GRN'},
+        ]
+        counts = load_metadata._upsert(Party, rows, ('abbrev',))
+        self.assertEqual(counts, (2, 1, 1))
+
+        # The existing documents were only read for the rows' keys
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual([clause['abbrev'] for clause in query['$or']],
+            ['DEM', 'REP', 'GRN', 'LIB'])
+
+        inserted = self.collection.insert.call_args[0][0]
+        self.assertEqual([(d['abbrev'], d['name']) for d in inserted],
+            [('GRN', "Green Party"), ('LIB', "Libertarian")])
+
+        self.collection.update.assert_called_once_with(
+            {'_id': self.existing[1]['_id']},
+            {'$set': {'name': "Republican Party", 'state': 'US',
+                      'abbrev': 'REP'}})
+
+    def test_upsert_repeated_existing_key(self):
+        # Rows repeating an existing key are counted once
+        rows = [
+            {'name': "Democrats", 'state': 'US', 'abbrev': 'DEM'},
+            {'name': "Democratic", 'state': 'US', 'abbrev': 'DEM'},
+        ]
+        counts = load_metadata._upsert(Party, rows, ('abbrev',))
+        self.assertEqual(counts, (0, 0, 1))
+        self.assertFalse(self.collection.update.called)
+
+    def test_upsert_batches(self):
+        rows = [{'name': "Party %d" % i, 'state': 'US', 'abbrev': 'P%d' % i}
+                for i in range(5)]
+        counts = load_metadata._upsert(Party, rows, ('abbrev',),
+            batch_size=2)
+        self.assertEqual(counts, (5, 0, 0))
+        self.assertEqual(self.collection.find.call_count, 3)
+        self.assertEqual(self.collection.insert.call_count, 3)
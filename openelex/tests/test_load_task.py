@@ -0,0 +1,58 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from openelex import settings
+from openelex.tasks import bake, db, load, transform, validate
+
+
+class TestLoadFile(TestCase):
+    def setUp(self):
+        self.mapping = {
+            'generated_filename': '20121106__md__general__allegany.csv',
+            'election': 'md-2012-11-06-general',
+        }
+
+    @patch('openelex.tasks.load.get_loader')
+    def test_load_file(self, get_loader):
+        file_loader = Mock(source=self.mapping['generated_filename'],
+            inserted=42)
+        get_loader.return_value.run.return_value = file_loader
+        source, inserted, elapsed, error = load.load_file(
+            ('md', self.mapping, True, False))
+        get_loader.assert_called_with('md', True, False)
+        self.assertEqual(source, self.mapping['generated_filename'])
+        self.assertEqual(inserted, 42)
+        self.assertTrue(elapsed >= 0)
+        self.assertEqual(error, None)
+
+    @patch('openelex.tasks.load.get_loader')
+    def test_load_file_error(self, get_loader):
+        get_loader.return_value.run.side_effect = ValueError("bad row")
+        source, inserted, elapsed, error = load.load_file(
+            ('md', self.mapping, False, False))
+        self.assertEqual(source, self.mapping['generated_filename'])
+        self.assertEqual(inserted, 0)
+        self.assertEqual(error, "ValueError: bad row")
+
+
+class TestRun(TestCase):
+    @patch('openelex.tasks.load.load_module')
+    def test_mongo_only_options(self, load_module):
+        with patch.object(settings, 'STORAGE_BACKEND', 'sqlite',
+                create=True):
+            self.assertRaises(SystemExit, load.run, 'md', compact=True)
+            self.assertRaises(SystemExit, load.run, 'md', per_state=True)
+        self.assertFalse(load_module.called)
+
+
+class TestMongoOnlyTasks(TestCase):
+    def test_require_mongo(self):
+        with patch.object(settings, 'STORAGE_BACKEND', 'sqlite',
+                create=True):
+            for task, args in ((transform.run, ('md',)),
+                    (transform.reverse, ('md',)), (validate.run, ('md',)),
+                    (bake.state_file, ('md',)),
+                    (bake.election_file, ('md',)), (db.indexes, ()),
+                    (db.drop_state, ('md',)), (db.backfill_slugs, ())):
+                self.assertRaises(SystemExit, task, *args)
@@ -0,0 +1,95 @@
+from datetime import datetime
+from unittest import TestCase
+
+from bson import ObjectId
+
+from openelex.models import Contest, RawResult
+from openelex.storage import split_filter
+from openelex.storage.mongo import MongoBackend
+from openelex.storage.sqlite import SQLiteBackend, decode, encode
+from openelex.tests.mongo_test_case import MongoTestCase
+
+
+def raw_result(**kwargs):
+    doc = {
+        'election_id': 'md-2012-11-06-general',
+        'state': 'MD',
+        'start_date': datetime(2012, 11, 6),
+        'source': '20121106__md__general__county.csv',
+        'reporting_level': 'county',
+        'office': 'President - Vice Pres',
+        'votes': 1,
+    }
+    doc.update(kwargs)
+    return doc
+
+
+class BackendTests(object):
+    """Tests run against each backend"""
+
+    def setUp(self):
+        super(BackendTests, self).setUp()
+        self.backend = self.make_backend()
+        self.backend.insert(RawResult, [
+            raw_result(jurisdiction='Allegany', votes=10),
+            raw_result(jurisdiction='Garrett', votes=20),
+            raw_result(election_id='md-2012-04-03-primary',
+                source='20120403__md__primary__county.csv',
+                jurisdiction='Allegany', votes=5),
+        ])
+
+    def test_count(self):
+        self.assertEqual(self.backend.count(RawResult), 3)
+        self.assertEqual(self.backend.count(RawResult,
+            source='20121106__md__general__county.csv'), 2)
+        self.assertEqual(self.backend.count(RawResult,
+            election_id__startswith='md-2012-11'), 2)
+        # jurisdiction isn't indexed
+        self.assertEqual(self.backend.count(RawResult, jurisdiction='Allegany',
+            election_id__in=['md-2012-04-03-primary']), 1)
+
+    def test_delete(self):
+        self.backend.delete(RawResult,
+            source='20121106__md__general__county.csv')
+        self.assertEqual(self.backend.count(RawResult), 1)
+        self.backend.delete(RawResult, jurisdiction='Allegany')
+        self.assertEqual(self.backend.count(RawResult), 0)
+
+
+class TestSQLiteBackend(BackendTests, TestCase):
+    def make_backend(self):
+        return SQLiteBackend(':memory:')
+
+    def test_indexes(self):
+        names = [row[0] for row in self.backend.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND "
+            "tbl_name = 'raw_result'")]
+        self.assertIn('raw_result__source_1', names)
+
+        with self.backend.defer_indexes(RawResult, keep=['source_1']) as dropped:
+            self.assertIn('election_id_1', dropped)
+            self.assertNotIn('source_1', dropped)
+        self.assertEqual(self.backend.count(RawResult,
+            election_id='md-2012-11-06-general'), 2)
+
+    def test_unique_index(self):
+        contest = {'election_id': 'md-2012-11-06-general',
+                   'slug': 'president'}
+        self.backend.insert(Contest, [dict(contest)])
+        self.assertRaises(Exception, self.backend.insert, Contest,
+            [dict(contest)])
+
+    def test_encode(self):
+        doc = {'_id': ObjectId(), 'start_date': datetime(2012, 11, 6, 1, 2),
+               'votes': 5, 'ocd_id': [u'a', u'b']}
+        self.assertEqual(decode(encode(doc)), doc)
+
+    def test_split_filter(self):
+        self.assertEqual(split_filter('election_id__startswith'),
+            ('election_id', 'startswith'))
+        self.assertEqual(split_filter('election_id'), ('election_id', None))
+
+
+class TestMongoBackend(BackendTests, MongoTestCase):
+    def make_backend(self):
+        return MongoBackend()
@@ -1,13 +1,12 @@
 import logging
-import unicodecsv
 
-from openelex.base.load import BaseLoader
+from openelex.base.load import Column, ColumnLoader
 from openelex.lib.text import slugify
 from openelex.models import RawResult
 
 from .datasource import Datasource
 
-class LoadResults(BaseLoader):
+class LoadResults(ColumnLoader):
     """
     Loads Florida election results.
 
@@ -65,98 +64,76 @@ class LoadResults(BaseLoader):
         "State Senator",
     ])
 
-    def load(self):
-        with self._file_handle as csvfile:
-            results = []
-            seen = set()
-            self._common_kwargs = self._build_common_election_kwargs()
-            reader = unicodecsv.DictReader(csvfile, delimiter='\t',
-                encoding='latin-1')
-            for row in reader:
-                # Skip non-target offices
-                if self._skip_row(row): 
-                    office_name = row['OfficeDesc'].strip()
-                    # Log skipped office names in case we forgot to add them
-                    # to our list of target offices.  Ignore long office names
-                    # because these are probably ballot initiatives that we
-                    # definitely want to ignore
-                    if len(office_name) < 100:
-                        logging.info("Skipping result for office '%s'" %
-                            office_name)
-                    continue
-
-                result = self._prep_result(row)
-                # Only add non-duplicate results.  This is needed because
-                # there are duplicate results in some data files, e.g.
-                # 20120814__fl__primary.tsv
-                key = self._key(result)
-                if not key in seen:
-                    results.append(result)
-                    seen.add(key)
-
-            RawResult.objects.insert(results)
-
-    def _skip_row(self, row):
-        return row['OfficeDesc'].strip() not in self.target_offices
-
-    def _prep_result(self, row):
-        """
-        Creates a RawResult model instance for a row of data.
-        """
-        # Copy fields that are common to this source file
-        result_kwargs = self._common_kwargs.copy()
-        # Extract remaining fields from the row of data
-        result_kwargs.update(self._build_contest_kwargs(row))
-        result_kwargs.update(self._build_candidate_kwargs(row)) 
-        result_kwargs.update(self._build_result_kwargs(row))
-        return RawResult(**result_kwargs)
-
-    def _build_contest_kwargs(self, row):
-        kwargs = {
-            'office': row['OfficeDesc'].strip(),
-        }
-        if kwargs['office'] in self.district_offices:
-            kwargs['district'] = row['Juris1num'].strip()
-        return kwargs
-
-    def _build_candidate_kwargs(self, row):
+    target_field = 'office'
+
+    delimiter = '\t'
+
+    columns = [
+        Column('office', 'OfficeDesc'),
+        # Only kept for district offices, see ``prepare_result()``
+        Column('district', 'Juris1num'),
         # TODO: Figure out how/if suffix is stored
-        return {
-            'family_name': row['CanNameLast'].strip(),
-            'given_name': row['CanNameFirst'].strip(),
-            'additional_name': row['CanNameMiddle'].strip(),
-        }
-
-    def _build_result_kwargs(self, row):
-        kwargs = {
-            'party': row['PartyName'].strip(),
-            'jurisdiction': row['CountyName'].strip(),
-            'votes': row['CanVotes'].strip()
-        }
-        if row['OfficeDesc'].strip() == "U.S. President by Congressional District":
+        Column('family_name', 'CanNameLast'),
+        Column('given_name', 'CanNameFirst'),
+        Column('additional_name', 'CanNameMiddle'),
+        Column('party', 'PartyName'),
+        Column('jurisdiction', 'CountyName'),
+        Column('votes', 'CanVotes'),
+    ]
+
+    def iter_results(self):
+        seen = set()
+        for result in super(LoadResults, self).iter_results():
+            # Only add non-duplicate results.  This is needed because
+            # there are duplicate results in some data files, e.g.
+            # 20120814__fl__primary.tsv
+            key = self._key(result)
+            if not key in seen:
+                yield result
+                seen.add(key)
+
+    def skip_result(self, result):
+        if super(LoadResults, self).skip_result(result):
+            office_name = result['office']
+            # Log skipped office names in case we forgot to add them
+            # to our list of target offices.  Ignore long office names
+            # because these are probably ballot initiatives that we
+            # definitely want to ignore
+            if len(office_name) < 100:
+                logging.info("Skipping result for office '%s'" %
+                    office_name)
+            return True
+        return False
+
+    def prepare_result(self, result):
+        office = result['office']
+        if office == "U.S. President by Congressional District":
             # Primary results for some contests provide the results
             # by congressional district in each county
-            kwargs['reporting_level'] = 'congressional_district_by_county' 
-            kwargs['reporting_district'] = row['Juris1num'].strip()
+            result['reporting_level'] = 'congressional_district_by_county'
+            result['reporting_district'] = result['district']
         else:
-            kwargs['reporting_level'] = 'county'
+            result['reporting_level'] = 'county'
+
+        if office not in self.district_offices:
+            del result['district']
 
-        return kwargs
+        result['contest_slug'], result['candidate_slug'] = \
+            RawResult.make_slugs(**result)
+        return result
 
     def _key(self, rawresult):
         """
         Returns a string that uniquely identifies a raw result from a particular
         source.
         """
-        bits = [rawresult.contest_slug, rawresult.candidate_slug,
-                slugify(rawresult.jurisdiction)]
+        bits = [rawresult['contest_slug'], rawresult['candidate_slug'],
+                slugify(rawresult['jurisdiction'])]
 
-        if rawresult.district:
-            bits.append(rawresult.district)
+        if rawresult.get('district'):
+            bits.append(rawresult['district'])
 
-        try:
-            bits.append(rawresult.reporting_district)
-        except AttributeError:
-            pass
+        if 'reporting_district' in rawresult:
+            bits.append(rawresult['reporting_district'])
 
         return '-'.join(bits)
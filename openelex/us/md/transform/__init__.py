@@ -6,7 +6,8 @@ from nameparser import HumanName
 from openelex.base.transform import Transform, registry
 from openelex.models import Candidate, Contest, Office, Party, RawResult, Result
 from openelex.lib.text import ocd_type_id
-from openelex.lib.insertbuffer import BulkInsertBuffer
+from openelex.lib.insertbuffer import BulkInsertBuffer, insert_unique
+from openelex.lib.records import iter_records
 from ..validate import (validate_precinct_names_normalized,
     validate_no_baltimore_city_comptroller,
     validate_uncommitted_primary_state_legislative_results)
@@ -235,8 +236,10 @@ class CreateContestsTransform(BaseTransform):
                 contests.append(contest)
                 seen.add(key)
 
-        Contest.objects.insert(contests, load_bulk=False)
-        print "Created %d contests." % len(contests)
+        duplicates = insert_unique(Contest, contests)
+        for contest in duplicates:
+            logging.warn("Skipped duplicate contest %s-%s" % contest.key)
+        print "Created %d contests." % (len(contests) - len(duplicates))
 
     def reverse(self):
         old = Contest.objects.filter(state='MD')
@@ -276,8 +279,11 @@ class CreateCandidatesTransform(BaseTransform):
                 candidates.append(candidate)
                 seen.add(key)
 
-        Candidate.objects.insert(candidates, load_bulk=False)
-        print "Created %d candidates." % len(candidates) 
+        duplicates = insert_unique(Candidate, candidates)
+        for candidate in duplicates:
+            logging.warn("Skipped duplicate candidate %s-%s-%s" %
+                candidate.key)
+        print "Created %d candidates." % (len(candidates) - len(duplicates))
 
 
     def reverse(self):
@@ -600,23 +606,24 @@ class NormalizePrecinctTransform(BaseTransform):
         ocd_id_bits.append(ocd_type_id("precinct:%s" % jurisdiction))
         return '/'.join(ocd_id_bits)
 
-    def __call__(self):
-        for result in self.get_results():
+    def update_results(self, normalize_precinct):
+        # Only the jurisdiction and OCD ID change, so read lightweight
+        # records and update those fields instead of saving whole documents.
+        now = datetime.now()
+        for result in iter_records(self.get_results(), 'id', 'jurisdiction',
+                'ocd_id'):
             district, precinct = result.jurisdiction.split('-')
-            result.jurisdiction = "%s-%s" % (district,
-                    precinct.zfill(3))
-            result.ocd_id = self.update_ocd_id(result.ocd_id,
-                result.jurisdiction)
-            result.save()
+            jurisdiction = "%s-%s" % (district, normalize_precinct(precinct))
+            Result.objects(id=result.id).update_one(
+                set__jurisdiction=jurisdiction,
+                set__ocd_id=self.update_ocd_id(result.ocd_id, jurisdiction),
+                set__updated=now)
+
+    def __call__(self):
+        self.update_results(lambda precinct: precinct.zfill(3))
 
     def reverse(self):
-        for result in self.get_results():
-            district, precinct = result.jurisdiction.split('-')
-            result.jurisdiction = "%s-%s" % (district,
-                    precinct.lstrip('0'))
-            result.ocd_id = self.update_ocd_id(result.ocd_id,
-                result.jurisdiction)
-            result.save()
+        self.update_results(lambda precinct: precinct.lstrip('0'))
 
 
 class RemoveBaltimoreCityComptroller(BaseTransform):
@@ -663,15 +670,14 @@ class CombineUncommittedPresStateLegislativeResults(BaseTransform):
         assert len(districts) == 65
         for district in districts:
             district_results = results.filter(jurisdiction=district)
-            assert district_results.count() == 24 
-            total_votes = 0
-            # Save the first result.  We'll use this for the combined results
-            first_result = district_results[0]
-            for result in district_results:
-                total_votes += result.votes
+            records = list(iter_records(district_results, 'id', 'votes'))
+            assert len(records) == 24 
+            # Keep the first result.  We'll use this for the combined results
+            first_result = records[0]
+            total_votes = sum(r.votes for r in records)
             assert total_votes != 0
-            first_result.votes = total_votes
-            first_result.save()
+            Result.objects(id=first_result.id).update_one(
+                set__votes=total_votes, set__updated=datetime.now())
             district_results.filter(id__ne=first_result.id).delete()
 
 
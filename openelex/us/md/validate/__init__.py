@@ -1,5 +1,8 @@
 import re
 
+from openelex.lib.aggregate import iter_aggregate
+from openelex.lib.indexes import raw_collection
+from openelex.lib.records import iter_records
 from openelex.models import Contest, Candidate, Office, Result
 from .election import (Election2000Primary, Election2000General,
     Election2002Primary, Election2002General,
@@ -21,6 +24,21 @@ def _validate_candidate_votes(election_id, reporting_level, contest_slug,
     assert votes == expected_votes, msg.format(expected_votes, contest_slug,
             candidate_slug, votes)
 
+def _find_duplicates(doc_cls):
+    """
+    Returns a list of the keys shared by more than one document, using a
+    single aggregation query.
+    """
+    pipeline = [
+        {'$group': {
+            '_id': dict((name, '$' + name) for name in doc_cls.KEY_FIELDS),
+            'count': {'$sum': 1},
+        }},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    return [tuple(doc['_id'][name] for name in doc_cls.KEY_FIELDS)
+            for doc in iter_aggregate(raw_collection(doc_cls), pipeline)]
+
 def _validate_many_candidate_votes(election_id, reporting_level,
         candidates):
     """
@@ -294,16 +312,29 @@ def validate_results_2008_special():
         },
     }
 
+    results = Result.objects.filter(election_id='md-2008-06-17-special-general')
+    # Only fetch the results that are checked, so, like looking each one up
+    # with get(), there has to be exactly one result for each of them.
+    checked = results.filter(candidate_slug__in=list(candidates),
+        jurisdiction__in=["Montgomery County", "Prince George's County"])
+    votes = {}
+    for result in iter_records(checked, 'candidate_slug', 'jurisdiction',
+            'votes'):
+        key = (result.candidate_slug, result.jurisdiction)
+        assert key not in votes, "Multiple results found for %s in %s" % key
+        votes[key] = result.votes
+
     for candidate, props in candidates.items():
-        result = Result.objects.get(election_id='md-2008-06-17-special-general',
-            candidate_slug=candidate, jurisdiction="Montgomery County")
-        assert result.votes == props['votes_montgomery']
-        result = Result.objects.get(election_id='md-2008-06-17-special-general',
-            candidate_slug=candidate, jurisdiction="Prince George's County")
-        assert result.votes == props['votes_prince_georges']
-
-    for result in Result.objects.filter(election_id='md-2008-06-17-special-general',
-            candidate_slug__in=['adrian_petrus', 'steve-shulin', 'other_writeins']):
+        for jurisdiction, expected in (
+                ("Montgomery County", props['votes_montgomery']),
+                ("Prince George's County", props['votes_prince_georges'])):
+            key = (candidate, jurisdiction)
+            assert key in votes, "No result found for %s in %s" % key
+            assert votes[key] == expected
+
+    for result in iter_records(results.filter(
+            candidate_slug__in=['adrian_petrus', 'steve-shulin', 'other_writeins']),
+            'write_in'):
         assert result.write_in
 
 def validate_result_count_2008_general():
@@ -520,30 +551,18 @@ def validate_precinct_names_normalized():
 
 def validate_unique_contests():
     """Should have a unique set of contests for all elections"""
-    # Get all election ids
-    election_ids = list(Contest.objects.distinct('election_id'))
-    for elec_id in election_ids:
-        contests = Contest.objects.filter(election_id=elec_id)
-        # compare the number of contest records to unique set of contests for that election
-        count = contests.count()
-        expected = len(list(contests.distinct('slug')))
-        try:
-            assert expected == count
-        except AssertionError:
-            raise AssertionError("%s contests expected for elec_id '%s', but %s found" % (expected, elec_id, count))
+    # Contests are inserted with a unique index on their key, so this only
+    # finds duplicates loaded before the index existed.
+    duplicates = _find_duplicates(Contest)
+    assert not duplicates, ("Duplicate contests found for (election_id, slug): %s" %
+        duplicates)
     print "PASS: unique contests counts found for all elections"
 
 def validate_unique_candidates():
     """Should have a unique set of candidates for all contests"""
-    msg = "%s candidates expected for election {} and contest {}, but {} found"
-    for contest in Contest.objects.all():
-        election_id = contest.election_id
-        candidates = Candidate.objects.filter(election_id=election_id,
-            contest_slug=contest.slug)
-        expected = len(candidates.distinct('slug'))
-        count = candidates.count()
-        assert count == expected, msg.format(expected, election_id,
-            contest.slug, count) 
+    duplicates = _find_duplicates(Candidate)
+    assert not duplicates, ("Duplicate candidates found for (election_id, "
+        "contest_slug, slug): %s" % duplicates)
     print "PASS: unique candidates found for all elections"
 
 def validate_no_baltimore_city_comptroller():
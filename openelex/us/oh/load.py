@@ -6,7 +6,6 @@ import xlrd
 from bs4 import BeautifulSoup
 
 from openelex.base.load import BaseLoader
-from openelex.models import RawResult
 from openelex.lib.text import slugify
 from .datasource import Datasource
 
@@ -15,7 +14,11 @@ class LoadResults(object):
 
     Determines appropriate loader for file and triggers load process.
 
+    The ``compact`` and ``bulk`` options are passed on to the loader.
+
     """
+    compact = False
+    bulk = False
 
     def run(self, mapping):
         election_id = mapping['election']
@@ -27,7 +30,9 @@ class LoadResults(object):
             loader = OHLoader2008Special()
         else:
             loader = OHHTMLoader()
-        loader.run(mapping)
+        loader.compact = self.compact
+        loader.bulk = self.bulk
+        return loader.run(mapping)
 
 
 class OHBaseLoader(BaseLoader):
@@ -68,9 +73,8 @@ class OH2012PrecinctLoader(OHBaseLoader):
     """
     Parse Ohio election results for 2012 precinct-level results files.
     """
-    def load(self):
+    def iter_results(self):
         with self._file_handle as xlsfile:
-            results = []
             workbook = xlrd.open_workbook(xlsfile)
             worksheet = workbook.sheet_by_name('AllCounties')
             headers = worksheet.row(1)
@@ -80,12 +84,12 @@ class OH2012PrecinctLoader(OHBaseLoader):
                 if self._skip_row(row): 
                     continue
                 elif 'state_legislative' in self.source:
-                    results.extend(self._prep_state_leg_results(row))
+                    for result in self._prep_state_leg_results(row):
+                        yield result
                 elif 'precinct' in self.source:
-                    results.append(self._prep_precinct_result(row))
+                    yield self._prep_precinct_result(row)
                 else:
-                    results.append(self._prep_county_result(row))
-            RawResult.objects.insert(results)
+                    yield self._prep_county_result(row)
 
            
 
@@ -94,9 +98,8 @@ class OH2010PrecinctLoader(OHBaseLoader):
     Parse Ohio election results for 2010 precinct-level results (general
     and primary) contained in xlsx/xls files.
     """
-    def load(self):
+    def iter_results(self):
         with self._file_handle as xlsfile:
-            results = []
             workbook = xlrd.open_workbook(xlsfile)
             worksheet = workbook.sheet_by_name('AllCounties')
             headers = worksheet.row(1)
@@ -106,12 +109,12 @@ class OH2010PrecinctLoader(OHBaseLoader):
                 if self._skip_row(row): 
                     continue
                 elif 'state_legislative' in self.source:
-                    results.extend(self._prep_state_leg_results(row))
+                    for result in self._prep_state_leg_results(row):
+                        yield result
                 elif 'precinct' in self.source:
-                    results.append(self._prep_precinct_result(row))
+                    yield self._prep_precinct_result(row)
                 else:
-                    results.append(self._prep_county_result(row))
-            RawResult.objects.insert(results)
+                    yield self._prep_county_result(row)
 
     def _skip_row(self, row):
         return row['Office Name'].strip() not in self.target_offices
@@ -143,8 +146,7 @@ class OH2010PrecinctLoader(OHBaseLoader):
 
     def _base_kwargs(self, row):
         "Build base set of kwargs for RawResult"
-        # TODO: Can this just be called once?
-        kwargs = self._build_common_election_kwargs()
+        kwargs = self.context.result_kwargs()
         contest_kwargs = self._build_contest_kwargs(row, kwargs['primary_type'])
         candidate_kwargs = self._build_candidate_kwargs(row)
         kwargs.update(contest_kwargs)
@@ -173,7 +175,7 @@ class OH2010PrecinctLoader(OHBaseLoader):
                 'jurisdiction': clean_field,
                 'votes': self._votes(val),
             })
-            results.append(RawResult(**kwargs))
+            results.append(kwargs.copy())
         return results
 
     def _prep_county_result(self, row):
@@ -202,7 +204,7 @@ class OH2010PrecinctLoader(OHBaseLoader):
             kwargs['reporting_district'] = kwargs['district']
             del kwargs['district']
 
-        return RawResult(**kwargs)
+        return kwargs
 
     def _prep_precinct_result(self, row):
         kwargs = self._base_kwargs(row)
@@ -226,7 +228,7 @@ class OH2010PrecinctLoader(OHBaseLoader):
             'write_in': self._writein(row),
             'vote_breakdowns': vote_breakdowns,
         })
-        return RawResult(**kwargs)
+        return kwargs
 
     def _votes(self, val):
         """
@@ -285,7 +287,7 @@ class MDLoader2002(MDBaseLoader):
 
     """
 
-    def load(self):
+    def iter_results(self):
         headers = [
             'office',
             'district',
@@ -299,10 +301,8 @@ class MDLoader2002(MDBaseLoader):
             'votes',
             'fill2'
         ]
-        self._common_kwargs = self._build_common_election_kwargs()
-        self._common_kwargs['reporting_level'] = 'county'
-        # Store result instances for bulk loading
-        results = []
+        self._common_kwargs = self.context.result_kwargs(
+            reporting_level='county')
 
         with self._file_handle as csvfile:
             reader = unicodecsv.DictReader(csvfile, fieldnames = headers, delimiter='|', encoding='latin-1')
@@ -322,8 +322,7 @@ class MDLoader2002(MDBaseLoader):
                     'district': row['district'].strip(),
                     'votes': int(row['votes'].strip()),
                 })
-                results.append(RawResult(**rr_kwargs))
-        RawResult.objects.insert(results)
+                yield rr_kwargs
 
     def _skip_row(self, row):
         return row['office'].strip() not in self.target_offices
@@ -355,13 +354,12 @@ class MDLoader2000Primary(MDBaseLoader):
         "Delegates to the Republican National Convention",
     ]
 
-    def load(self):
+    def iter_results(self):
         candidates = {}
-        results = []
         last_office = None
         last_party = None
         last_district = None
-        common_kwargs = self._build_common_election_kwargs()
+        common_kwargs = self.context.result_kwargs()
 
         with self._file_handle as csvfile:
             reader = csv.reader(csvfile)
@@ -390,9 +388,9 @@ class MDLoader2000Primary(MDBaseLoader):
                     new_results = self._parse_results(row, last_office,
                         last_party, last_district,
                         candidates, winner_name, common_kwargs)
-                    results.extend(new_results)
+                    for result in new_results:
+                        yield result
         
-        RawResult.objects.insert(results)
 
     def _parse_header(self, row):
         """
@@ -483,7 +481,7 @@ class MDLoader2000Primary(MDBaseLoader):
             if result_kwargs['reporting_level'] == 'congressional_district_by_county':
                 result_kwargs['reporting_district'] = district
 
-            results.append(RawResult(**result_kwargs))
+            results.append(result_kwargs)
 
         return results
 
@@ -506,14 +504,14 @@ class OHHTMLLoader(BaseLoader):
     """
     datasource = Datasource()
 
-    def load(self):
+    def iter_results(self):
         table = self._get_html_table()
         rows = self._parse_html_table(table)
         winner_name = self._parse_winner_name(rows[0])
         candidate_attrs = self._parse_candidates_and_parties(rows[0],
             winner_name)
-        results = self._parse_results(rows[1:88], candidate_attrs)
-        RawResult.objects.insert(results)
+        for result in self._parse_results(rows[1:88], candidate_attrs):
+            yield result
 
     def _get_html_table(self):
         soup = BeautifulSoup(self._file_handle)
@@ -576,7 +574,7 @@ class OHHTMLLoader(BaseLoader):
 
     def _parse_results(self, rows, candidate_attrs):
         # These raw result attributes will be the same for every result.
-        common_kwargs = self._build_common_election_kwargs()
+        common_kwargs = self.context.result_kwargs()
         common_kwargs.update({
             'office': "Representative in Congress",
             'district': '4', 
@@ -591,7 +589,7 @@ class OHHTMLLoader(BaseLoader):
                 kwargs.update(candidate_attrs[i-1])
                 kwargs['jurisdiction'] = county
                 kwargs['votes'] = self._parse_votes(row[i]) 
-                results.append(RawResult(**kwargs))
+                results.append(kwargs)
         return results
 
     def _parse_votes(self, s):
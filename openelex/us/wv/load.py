@@ -2,8 +2,7 @@ import re
 import csv
 import unicodecsv
 
-from openelex.base.load import BaseLoader
-from openelex.models import RawResult
+from openelex.base.load import BaseLoader, Column, ColumnLoader
 from openelex.lib.text import slugify
 from .datasource import Datasource
 
@@ -13,12 +12,30 @@ counties, and includes all contests in that county. Prior to 2008, county-level
 https://github.com/openelections/openelections-data-wv repository.
 """
 
+def clean_votes(val):
+    """
+    Returns cleaned version of votes or 0 if it's a non-numeric value.
+    """
+    if val.strip() == '':
+        return 0
+
+    try:
+        return int(float(val))
+    except ValueError:
+        # Count'y convert value from string   
+        return 0
+
+
 class LoadResults(object):
     """Entry point for data loading.
 
     Determines appropriate loader for file and triggers load process.
 
+    The ``compact`` and ``bulk`` options are passed on to the loader.
+
     """
+    compact = False
+    bulk = False
 
     def run(self, mapping):
         election_id = mapping['election']
@@ -26,7 +43,9 @@ class LoadResults(object):
             loader = WVLoader()
         else:
             loader = WVLoaderPre2008()
-        loader.run(mapping)
+        loader.compact = self.compact
+        loader.bulk = self.bulk
+        return loader.run(mapping)
 
 
 class WVBaseLoader(BaseLoader):
@@ -61,60 +80,26 @@ class WVBaseLoader(BaseLoader):
         return False
 
 
-class WVLoader(WVBaseLoader):
+class WVLoader(WVBaseLoader, ColumnLoader):
     """
     Parse West Virginia election results for all elections after 2006.
 
     """
-    def load(self):
-        with self._file_handle as csvfile:
-            results = []
-            reader = unicodecsv.DictReader(csvfile, encoding='latin-1')
-            for row in reader:
-                # Skip non-target offices
-                if self._skip_row(row): 
-                    continue
-                else:
-                    results.append(self._prep_precinct_result(row))
-            RawResult.objects.insert(results)
-
-    def _skip_row(self, row):
-        return row['OfficeDescription'].strip() not in self.target_offices
-
-    def _build_contest_kwargs(self, row, primary_type):
-        kwargs = {
-            'office': row['OfficeDescription'].strip(),
-            'district': row['District'].strip(),
-            'primary_party': row['PartyName'].strip()
-        }
-        return kwargs
-
-    def _build_candidate_kwargs(self, row):
-        full_name = row['Name'].strip()
-        slug = slugify(full_name, substitute='-')
-        kwargs = {
-            'full_name': full_name,
-            #TODO: QUESTION: Do we need this? if so, needs a matching model field on RawResult
-            'name_slug': slug,
-        }
-        return kwargs
-
-    def _base_kwargs(self, row):
-        "Build base set of kwargs for RawResult"
-        # TODO: Can this just be called once?
-        kwargs = self._build_common_election_kwargs()
-        contest_kwargs = self._build_contest_kwargs(row, kwargs['primary_type'])
-        candidate_kwargs = self._build_candidate_kwargs(row)
-        kwargs.update(contest_kwargs)
-        kwargs.update(candidate_kwargs)
-        return kwargs
-
-    def _prep_precinct_result(self, row):
-        kwargs = self._base_kwargs(row)
-        precinct = str(row['Precinct'])
-        kwargs.update({
+    target_field = 'office'
+
+    columns = [
+        Column('office', 'OfficeDescription'),
+        Column('district', 'District'),
+        Column('primary_party', 'PartyName'),
+        Column('party', 'PartyName'),
+        Column('full_name', 'Name'),
+        Column('jurisdiction', 'Precinct', clean=None),
+        Column('votes', 'Votes', clean=clean_votes),
+    ]
+
+    def file_kwargs(self):
+        return {
             'reporting_level': 'precinct',
-            'jurisdiction': precinct,
             # In West Virginia, precincts are nested below counties.
             #
             # The mapping ocd_id will be for the precinct's county.
@@ -122,32 +107,13 @@ class WVLoader(WVBaseLoader):
             # we won't have an easy way of looking up the county in the 
             # transforms.
             'county_ocd_id': self.mapping['ocd_id'],
-            'party': row['PartyName'].strip(),
-            'votes': self._votes(row['Votes']),
-            'vote_breakdowns': {},
-        })
-        return RawResult(**kwargs)
-
-    def _votes(self, val):
-        """
-        Returns cleaned version of votes or 0 if it's a non-numeric value.
-        """
-        if val.strip() == '':
-            return 0
-
-        try:
-            return int(float(val))
-        except ValueError:
-            # Count'y convert value from string   
-            return 0
+        }
 
-    def _writein(self, row):
-        # sometimes write-in field not present
-        try:
-            write_in = row['Write-In?'].strip()
-        except KeyError:
-            write_in = None
-        return write_in
+    def prepare_result(self, result):
+        #TODO: QUESTION: Do we need this? if so, needs a matching model field on RawResult
+        result['name_slug'] = slugify(result['full_name'], substitute='-')
+        result['vote_breakdowns'] = {}
+        return result
 
 
 class WVLoaderPre2008(WVBaseLoader):
@@ -161,7 +127,7 @@ class WVLoaderPre2008(WVBaseLoader):
     do not contain districts.
     """
 
-    def load(self):
+    def iter_results(self):
         headers = [
             'year',
             'election',
@@ -173,10 +139,8 @@ class WVLoaderPre2008(WVBaseLoader):
             'votes',
             'winner'
         ]
-        self._common_kwargs = self._build_common_election_kwargs()
-        self._common_kwargs['reporting_level'] = 'county'
-        # Store result instances for bulk loading
-        results = []
+        self._common_kwargs = self.context.result_kwargs(
+            reporting_level='county')
 
         with self._file_handle as csvfile:
             reader = unicodecsv.DictReader(csvfile, fieldnames = headers, encoding='latin-1')
@@ -201,8 +165,7 @@ class WVLoaderPre2008(WVBaseLoader):
                         'total_votes': total_votes,
                         'contest_winner': contest_winner
                     })
-                    results.append(RawResult(**rr_kwargs))
-        RawResult.objects.insert(results)
+                    yield rr_kwargs
 
     def _skip_row(self, row):
         return row['office'].strip() not in self.target_offices